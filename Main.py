@@ -1,9 +1,13 @@
 import streamlit as st
 import pandas as pd
-import os
-from io import BytesIO
-import plotly.express as px
-import plotly.graph_objects as go
+from heritage.charts import cached_figure, count_bar, count_pie, frame_bar, frame_line, snf_histogram
+from heritage.hierarchy import LEVEL_LABELS, LEVELS, get_hierarchy
+from heritage.exports import cached_csv_export, csv_export, deferred_export
+from heritage.metrics import span
+from heritage.queries import select
+from heritage.rollups import get_rollups
+from heritage.storage import open_store
+from heritage.timeseries import FREQUENCIES, get_activity_series
 
 st.set_page_config(
     page_title="Heritage Dairy Management System",
@@ -29,28 +33,37 @@ st.sidebar.write("Version: 1.0.0")
 st.header("📊 Progress Overview")
 st.markdown("Here you can see real-time insights into your survey and training activities.")
 
-SNF_RESPONSES_FILE = "responses.csv"
-TRAINING_SUBMISSIONS_FILE = "submissions.csv"
+SNF_DATASET = "snf"
+TRAINING_DATASET = "training"
 
-@st.cache_data
-def load_data(file_path):
+def load_data(dataset, columns):
     """
-    Loads data from a CSV file. Handles cases where the file
-    doesn't exist or is empty. Includes basic column cleaning.
+    Loads only the given columns of a dataset from the shared submission
+    store. Counts and sums come from the rollups, so the dashboard reads
+    just the raw values it plots.
     """
-    if os.path.exists(file_path):
-        try:
-            df = pd.read_csv(file_path)
-            # Clean column names by stripping whitespace
-            df.columns = df.columns.str.strip()
-            return df
-        except pd.errors.EmptyDataError:
-            st.warning(f"The file {os.path.basename(file_path)} is empty. No data to display.")
-            return pd.DataFrame()
-        except Exception as e:
-            st.error(f"Error loading {os.path.basename(file_path)}: {e}")
-            return pd.DataFrame()
-    return pd.DataFrame()
+    try:
+        with span("load_data", dataset=dataset):
+            return select(dataset, columns)
+    except Exception as e:
+        st.error(f"Error loading {dataset} data: {e}")
+        return pd.DataFrame(columns=columns)
+
+def load_numbers(dataset, column):
+    values = load_data(dataset, [column])[column]
+    if not pd.api.types.is_numeric_dtype(values):
+        values = pd.to_numeric(values.astype(str).str.replace('%', ''), errors='coerce')
+    return values.dropna()
+
+def csv_download(dataset, label, file_name, key):
+    """A download button for the dataset's CSV export, built on request and cached per data version."""
+    store = open_store(dataset)
+    csv_path = cached_csv_export(store)
+    if csv_path is None and st.button(f"Prepare {label}", key=f"prepare_{key}"):
+        with st.spinner("Preparing CSV file..."):
+            csv_path = csv_export(store)
+    if csv_path:
+        st.download_button(label=label, data=deferred_export(csv_export, store), file_name=file_name, mime="text/csv", key=key)
 
 progress_data = {}
 
@@ -58,108 +71,91 @@ col1, col2 = st.columns(2)
 
 with col1:
     st.subheader("SNF Follow-up Survey Progress")
-    snf_df = load_data(SNF_RESPONSES_FILE)
+    snf_store = open_store(SNF_DATASET)
+    # Figures are cached per data version; read it before the data drawn into them.
+    snf_version = snf_store.data_version()
+    snf_columns = snf_store.manifest()["columns"]
+    snf_rollup = get_rollups(SNF_DATASET)
 
-    if not snf_df.empty:
-        snf_total = len(snf_df)
-        progress_data['SNF'] = snf_df
+    if snf_rollup['rows']:
+        snf_total = snf_rollup['rows']
+        progress_data['SNF'] = snf_total
         
         st.write(f"**Total Surveys Completed:** `{snf_total}`")
 
-        if 'Surveyor Name' in snf_df.columns:
-            snf_by_surveyor = snf_df['Surveyor Name'].value_counts()
+        if snf_rollup['counts']['surveyor']:
+            snf_by_surveyor = pd.Series(snf_rollup['counts']['surveyor']).sort_values(ascending=False)
             st.markdown("##### Surveys by Surveyor")
-            fig_surveyor_snf = px.bar(
-                snf_by_surveyor,
-                x=snf_by_surveyor.index,
-                y=snf_by_surveyor.values,
-                labels={'x': 'Surveyor', 'y': 'Number of Surveys'},
-                title="Number of SNF Surveys per Surveyor",
-                color=snf_by_surveyor.index,
-                template="streamlit"
-            )
-            st.plotly_chart(fig_surveyor_snf, use_container_width=True)
+            with span("plot", chart="snf_by_surveyor"):
+                fig_surveyor_snf = cached_figure("snf_by_surveyor", snf_version, lambda: count_bar(
+                    snf_by_surveyor, 'Surveyor', 'Number of Surveys', "Number of SNF Surveys per Surveyor"
+                ))
+                st.plotly_chart(fig_surveyor_snf, use_container_width=True)
             st.dataframe(snf_by_surveyor.rename_axis('Surveyor').reset_index(name='Surveys Completed'), use_container_width=True)
         
         # Check for both "SNF in the list" and "SNF in the list (%)"
         snf_col = None
-        if 'SNF in the list' in snf_df.columns:
+        if 'SNF in the list' in snf_columns:
             snf_col = 'SNF in the list'
-        elif 'SNF in the list (%)' in snf_df.columns:
+        elif 'SNF in the list (%)' in snf_columns:
             snf_col = 'SNF in the list (%)'
             
         if snf_col:
-            snf_values = pd.to_numeric(snf_df[snf_col].astype(str).str.replace('%', ''), errors='coerce').dropna()
-            
-            if not snf_values.empty:
+            # Binned server-side; only the bin counts are sent to the browser.
+            with span("plot", chart="snf_distribution"):
+                fig_snf_dist = cached_figure("snf_distribution", (snf_version, snf_col), lambda: snf_histogram(
+                    load_numbers(SNF_DATASET, snf_col), "Distribution of SNF in Farmer List"
+                ))
+            if fig_snf_dist is not None:
                 st.markdown("##### SNF Distribution (in List)")
-                fig_snf_dist = px.histogram(
-                    snf_values,
-                    nbins=15,
-                    title="Distribution of SNF in Farmer List",
-                    labels={'value': 'SNF Value (%)', 'count': 'Number of Entries'},
-                    template="streamlit"
-                )
                 st.plotly_chart(fig_snf_dist, use_container_width=True)
             else:
                 st.info("No valid numeric SNF values found for distribution.")
         
-        st.download_button(
-            label="Download SNF Survey Data (CSV)",
-            data=snf_df.to_csv(index=False).encode('utf-8'),
-            file_name="snf_follow_up_data.csv",
-            mime="text/csv",
-            key="download_snf_csv"
-        )
+        csv_download(SNF_DATASET, "Download SNF Survey Data (CSV)", "snf_follow_up_data.csv", "download_snf_csv")
     else:
-        st.info(f"SNF Follow-up survey data not found or is empty ({SNF_RESPONSES_FILE}).")
+        st.info("SNF Follow-up survey data not found or is empty.")
 
 with col2:
     st.subheader("Training Tracker Progress")
-    training_df = load_data(TRAINING_SUBMISSIONS_FILE)
+    training_store = open_store(TRAINING_DATASET)
+    training_version = training_store.data_version()
+    training_columns = training_store.manifest()["columns"]
+    training_rollup = get_rollups(TRAINING_DATASET)
 
-    if not training_df.empty:
-        training_total = len(training_df)
-        progress_data['Training'] = training_df
+    if training_rollup['rows']:
+        training_total = training_rollup['rows']
+        progress_data['Training'] = training_total
         
         st.write(f"**Total Trainings Logged:** `{training_total}`")
 
-        if 'trainer' in training_df.columns:
-            training_by_trainer = training_df['trainer'].value_counts()
+        if training_rollup['counts']['trainer']:
+            training_by_trainer = pd.Series(training_rollup['counts']['trainer']).sort_values(ascending=False)
             st.markdown("##### Trainings by Trainer")
-            fig_trainer_training = px.bar(
-                training_by_trainer,
-                x=training_by_trainer.index,
-                y=training_by_trainer.values,
-                labels={'x': 'Trainer', 'y': 'Number of Trainings'},
-                title="Number of Trainings Conducted per Trainer",
-                color=training_by_trainer.index,
-                template="streamlit"
-            )
-            st.plotly_chart(fig_trainer_training, use_container_width=True)
+            with span("plot", chart="trainings_by_trainer"):
+                fig_trainer_training = cached_figure("trainings_by_trainer", training_version, lambda: count_bar(
+                    training_by_trainer, 'Trainer', 'Number of Trainings', "Number of Trainings Conducted per Trainer"
+                ))
+                st.plotly_chart(fig_trainer_training, use_container_width=True)
             st.dataframe(training_by_trainer.rename_axis('Trainer').reset_index(name='Trainings Conducted'), use_container_width=True)
 
-        if 'topic' in training_df.columns:
-            topics_list = training_df['topic'].str.split(', ').explode()
-            training_by_topic = topics_list.value_counts()
+        if 'topic' in training_columns:
+            training_by_topic = pd.Series(training_rollup['counts']['topic'], dtype='int64').sort_values(ascending=False)
             if not training_by_topic.empty:
                 st.markdown("##### Trainings by Topic")
-                fig_topic_pie = px.pie(
-                    training_by_topic,
-                    values=training_by_topic.values,
-                    names=training_by_topic.index,
-                    title="Distribution of Training Topics",
-                    template="streamlit"
-                )
-                st.plotly_chart(fig_topic_pie, use_container_width=True)
+                with span("plot", chart="training_topics"):
+                    fig_topic_pie = cached_figure("training_topics", training_version, lambda: count_pie(
+                        training_by_topic, "Distribution of Training Topics"
+                    ))
+                    st.plotly_chart(fig_topic_pie, use_container_width=True)
             else:
                 st.info("No training topics found for distribution.")
 
-        if 'pourers_attended' in training_df.columns and 'pourers_total' in training_df.columns:
+        if 'pourers_attended' in training_columns and 'pourers_total' in training_columns:
             st.markdown("##### Training Attendance Rate")
             
-            total_pourers = pd.to_numeric(training_df['pourers_total'], errors='coerce').sum()
-            attended_pourers = pd.to_numeric(training_df['pourers_attended'], errors='coerce').sum()
+            total_pourers = training_rollup['sums']['pourers_total']
+            attended_pourers = training_rollup['sums']['pourers_attended']
 
             if total_pourers > 0:
                 attendance_rate = (attended_pourers / total_pourers) * 100
@@ -167,15 +163,9 @@ with col2:
             else:
                 st.info("No valid 'Pourers Total' data to calculate attendance rate.")
 
-        st.download_button(
-            label="Download Training Tracker Data (CSV)",
-            data=training_df.to_csv(index=False).encode('utf-8'),
-            file_name="training_tracker_data.csv",
-            mime="text/csv",
-            key="download_training_csv"
-        )
+        csv_download(TRAINING_DATASET, "Download Training Tracker Data (CSV)", "training_tracker_data.csv", "download_training_csv")
     else:
-        st.info(f"Training tracker data not found or is empty ({TRAINING_SUBMISSIONS_FILE}).")
+        st.info("Training tracker data not found or is empty.")
 
 st.markdown("---")
 
@@ -183,23 +173,23 @@ st.subheader("Combined Progress Summary")
 
 if 'SNF' in progress_data or 'Training' in progress_data:
     combined_counts = {
-        'SNF Surveys': len(progress_data.get('SNF', pd.DataFrame())),
-        'Trainings': len(progress_data.get('Training', pd.DataFrame()))
+        'SNF Surveys': progress_data.get('SNF', 0),
+        'Trainings': progress_data.get('Training', 0)
     }
     
     summary_df = pd.DataFrame([combined_counts])
     st.write("Summary Table:")
     st.dataframe(summary_df, use_container_width=True)
 
-    fig_combined = px.bar(
-        summary_df.melt(var_name="Category", value_name="Count"),
-        x="Category",
-        y="Count",
-        title="Combined Activity Counts",
-        color="Category",
-        template="streamlit"
-    )
-    st.plotly_chart(fig_combined, use_container_width=True)
+    with span("plot", chart="combined"):
+        fig_combined = frame_bar(
+            summary_df.melt(var_name="Category", value_name="Count"),
+            "Category",
+            "Count",
+            "Combined Activity Counts",
+            color="Category"
+        )
+        st.plotly_chart(fig_combined, use_container_width=True)
 
     st.download_button(
         label="Download Combined Progress Summary (CSV)",
@@ -220,3 +210,67 @@ if 'SNF' in progress_data or 'Training' in progress_data:
         st.warning("Set an 'overall_target' variable (e.g., `overall_target = 100`) to see the combined progress bar.")
 else:
     st.info("No survey or training data available to generate combined progress. Please submit some entries in the respective modules to see the dashboard come alive!")
+
+st.markdown("---")
+
+st.subheader("Progress by HPC Hierarchy")
+st.markdown("Drill down from plant to chilling centre, route and HPC.")
+
+hierarchy_source = st.radio("Data", ["SNF Follow-up Survey", "Training Tracker"], horizontal=True, key="hierarchy_source")
+hierarchy = get_hierarchy(SNF_DATASET if hierarchy_source == "SNF Follow-up Survey" else TRAINING_DATASET)
+
+if hierarchy.rows:
+    parent = ()
+    level = LEVELS[0]
+    drill_cols = st.columns(len(LEVELS) - 1)
+    for depth, drill_level in enumerate(LEVELS[:-1]):
+        level = drill_level
+        choices = hierarchy.children(drill_level, parent)
+        with drill_cols[depth]:
+            choice = st.selectbox(LEVEL_LABELS[drill_level], ["(All)"] + choices, key=f"hierarchy_{drill_level}")
+        if choice == "(All)":
+            break
+        parent = parent + (choice,)
+        level = LEVELS[depth + 1]
+
+    level_df = hierarchy.table(level, parent)
+    st.dataframe(level_df, use_container_width=True)
+    with span("plot", chart="hierarchy"):
+        fig_hierarchy = frame_bar(level_df, LEVEL_LABELS[level], "Responses", f"Entries per {LEVEL_LABELS[level]}")
+        st.plotly_chart(fig_hierarchy, use_container_width=True)
+else:
+    st.info("No entries to break down by HPC yet.")
+
+st.markdown("---")
+
+st.subheader("Throughput Over Time")
+st.markdown("Entries per day, week or month, overall or per surveyor, trainer or HPC.")
+
+trend_source = st.radio("Data", ["SNF Follow-up Survey", "Training Tracker"], horizontal=True, key="trend_source")
+if trend_source == "SNF Follow-up Survey":
+    activity = get_activity_series(SNF_DATASET)
+    trend_groups = {"All": None, "Surveyor": "surveyor", "HPC": "hpc"}
+else:
+    activity = get_activity_series(TRAINING_DATASET)
+    trend_groups = {"All": None, "Trainer": "trainer", "HPC": "hpc"}
+
+if activity.first_day is not None:
+    trend_cols = st.columns(3)
+    with trend_cols[0]:
+        trend_frequency = st.selectbox("Interval", list(FREQUENCIES), index=1, key="trend_frequency")
+    with trend_cols[1]:
+        trend_group = st.selectbox("Split by", list(trend_groups), key="trend_group")
+    with trend_cols[2]:
+        trend_window = st.slider("Rolling average (intervals)", 1, 12, 1, key="trend_window")
+    trend_df = activity.series(trend_groups[trend_group], FREQUENCIES[trend_frequency], trend_window, top=10)
+    with span("plot", chart="throughput"):
+        fig_trend = frame_line(
+            trend_df,
+            {"value": "Entries", "variable": trend_group},
+            f"{trend_frequency} Entries" + (f" ({trend_window}-interval rolling average)" if trend_window > 1 else "")
+        )
+        st.plotly_chart(fig_trend, use_container_width=True)
+    if trend_groups[trend_group] == "hpc":
+        st.caption("Showing the 10 busiest HPCs.")
+else:
+    st.info("No dated entries to chart yet.")
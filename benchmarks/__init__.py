@@ -0,0 +1 @@
+"""Synthetic-data benchmarks for the survey and dashboard hot paths; see benchmarks.run."""
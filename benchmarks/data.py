@@ -0,0 +1,168 @@
+"""
+Deterministic synthetic data for the benchmarks.
+
+Every generator takes a row count and a seed and returns the same frame for
+the same arguments. The frames have the columns the pages write: SNF
+responses keyed by the FORM_FIELDS_MAP labels, training rows in
+TRAINING_COLUMNS order and survey master rows with the app.py form keys.
+write_legacy_layout() lays them out as the legacy CSVs and photo
+directories, so the benchmark exercises the same first-open import the app
+runs in production.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+from heritage.forms import FORM_FIELDS_MAP, TRAINERS, TRAINING_COLUMNS, TRAINING_FIELDS_MAP, TRAINING_TOPICS
+from heritage.storage import DATASETS
+
+HPC_COUNT = 400
+FARMERS_PER_HPC = 250
+START_DATE = pd.Timestamp("2024-01-01")
+DATE_SPAN_DAYS = 730
+
+SURVEYORS = ["Guru", "Balaji", "Nilesh", "Aniket"]
+SURVEY_OPTIONS = {
+    "Cattle Breed": ["Jersey", "HF", "Gir", "Sahiwal", "Crossbred"],
+    "Green Fodder": ["Yes", "No"], "Dry Fodder": ["Yes", "No"],
+    "Concentrated Feed": ["Yes", "No"], "Mineral Mixture": ["Yes", "No"],
+    "Any Disease Outbreak": ["Yes", "No"], "Veterinary Visit": ["Yes", "No"],
+    "AI/Services": ["Yes", "No"], "Manure Management": ["Yes", "No"],
+    "Shed Type": ["Pukka", "Kutcha", "No Shed"], "Water Source": ["Borewell", "River", "Tap Water", "Other"],
+}
+SURVEY_NUMERIC = {
+    "Milk Yield (LPD)": (2, 40), "Total Cows": (1, 30), "Cows in Milk": (0, 20), "Dry Cows": (0, 10),
+    "Heifers": (0, 10), "Calves": (0, 10), "Fat (%)": (3, 6), "SNF (%)": (7, 9.5),
+    "Protein (%)": (2.8, 3.8), "TDS (%)": (11, 14),
+}
+
+
+def _dates(rng, n, date_format):
+    days = rng.integers(0, DATE_SPAN_DAYS, n)
+    return (START_DATE + pd.to_timedelta(days, unit="D")).strftime(date_format)
+
+
+def _numbers(rng, n, low, high, decimals=1):
+    return np.round(rng.uniform(low, high, n), decimals).astype(str)
+
+
+def _choice(rng, values, n):
+    return np.asarray(values, dtype=object)[rng.integers(0, len(values), n)]
+
+
+def _codes(rng, n):
+    hpc = rng.integers(0, HPC_COUNT, n)
+    farmer = hpc * FARMERS_PER_HPC + rng.integers(0, FARMERS_PER_HPC, n)
+    return hpc, farmer
+
+
+def _code_strings(prefix, values, width):
+    return pd.Series(values).astype(str).str.zfill(width).radd(prefix).to_numpy()
+
+
+def generate_snf(n, seed=0):
+    """SNF follow-up responses, one column per FORM_FIELDS_MAP label."""
+    rng = np.random.default_rng(seed)
+    hpc, farmer = _codes(rng, n)
+    columns = {}
+    for key, details in FORM_FIELDS_MAP.items():
+        if details.get("options"):
+            columns[key] = _choice(rng, details["options"], n)
+        elif details.get("validation") == "numeric":
+            columns[key] = _numbers(rng, n, 0, 40)
+        elif details.get("validation") == "date":
+            columns[key] = _dates(rng, n, "%d-%m-%Y")
+        else:
+            columns[key] = np.full(n, "", dtype=object)
+    columns["hpc_code"] = _code_strings("HPC", hpc, 4)
+    columns["hpc_name"] = _code_strings("Centre ", hpc, 4)
+    columns["farmer_code"] = _code_strings("F", farmer, 6)
+    columns["farmer_name"] = _code_strings("Farmer ", farmer, 6)
+    for key, details in FORM_FIELDS_MAP.items():
+        condition = details.get("conditional_required_if")
+        if condition and details.get("validation") != "numeric":
+            columns[key] = np.where(columns[condition["field"]] == condition["value"], "Local", "")
+    columns["key_insights"] = _choice(rng, ["", "Good yield", "Needs feed advice"], n)
+    df = pd.DataFrame(columns)
+    df.columns = [FORM_FIELDS_MAP[key]["label"] for key in df.columns]
+    df["Photo Filename"] = ""
+    return df
+
+
+def generate_training(n, seed=0):
+    """Training Tracker submissions in TRAINING_COLUMNS order."""
+    rng = np.random.default_rng(seed + 1)
+    hpc, _ = _codes(rng, n)
+    columns = {}
+    for key, details in TRAINING_FIELDS_MAP.items():
+        if details.get("options"):
+            columns[key] = _choice(rng, details["options"], n)
+        elif details.get("validation") == "numeric":
+            columns[key] = _numbers(rng, n, 0, 100, decimals=0)
+        else:
+            columns[key] = np.full(n, "", dtype=object)
+    columns["date"] = _dates(rng, n, "%Y-%m-%d")
+    columns["timestamp"] = columns["date"] + "T10:00:00"
+    columns["hpc_code"] = _code_strings("HPC", hpc, 4)
+    columns["hpc_name"] = _code_strings("Centre ", hpc, 4)
+    columns["trainer"] = _choice(rng, TRAINERS, n)
+    columns["topic"] = _choice(rng, TRAINING_TOPICS, n)
+    columns["pourers_attended"] = (columns["pourers_total"].astype(float) * rng.uniform(0, 1, n)).round().astype(int).astype(str)
+    columns["email"] = "surveyor@example.org"
+    columns["photo_filename"] = ""
+    return pd.DataFrame(columns)[TRAINING_COLUMNS]
+
+
+def generate_survey(n, seed=0):
+    """Rows of the app.py survey master file."""
+    rng = np.random.default_rng(seed + 2)
+    hpc, farmer = _codes(rng, n)
+    columns = {
+        "Surveyor": _choice(rng, SURVEYORS, n),
+        "Date": _dates(rng, n, "%Y-%m-%d"),
+        "HPC Code": _code_strings("HPC", hpc, 4),
+        "HPC Name": _code_strings("Centre ", hpc, 4),
+        "Farmer Code": _code_strings("F", farmer, 6),
+        "Farmer Name": _code_strings("Farmer ", farmer, 6),
+        "Mobile Number": (9_000_000_000 + farmer).astype(str),
+    }
+    for key, (low, high) in SURVEY_NUMERIC.items():
+        columns[key] = _numbers(rng, n, low, high)
+    for key, values in SURVEY_OPTIONS.items():
+        columns[key] = _choice(rng, values, n)
+    columns["Last Calving Date"] = _dates(rng, n, "%Y-%m-%d")
+    columns["Photos"] = ""
+    columns["Key Insights"] = ""
+    return pd.DataFrame(columns)
+
+
+def generate_photos(m, directory, seed=0, size=(1600, 1200)):
+    """Writes m smooth, phone-sized JPEGs to directory and returns their paths."""
+    rng = np.random.default_rng(seed + 3)
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i in range(m):
+        # A coarse random grid scaled up compresses like a photo, not like noise.
+        grid = rng.integers(0, 255, (12, 16, 3), dtype=np.uint8)
+        img = Image.fromarray(grid).resize(size, Image.BICUBIC)
+        path = os.path.join(directory, f"photo_{i:05d}.jpg")
+        img.save(path, "JPEG", quality=92)
+        paths.append(path)
+    return paths
+
+
+def write_legacy_layout(root, rows, photos, seed=0):
+    """Writes the legacy CSVs and photo directories of a deployment under root."""
+    frames = {
+        "snf": generate_snf(rows, seed),
+        "training": generate_training(rows, seed),
+        "survey": generate_survey(rows, seed),
+    }
+    for dataset, df in frames.items():
+        path = os.path.join(root, DATASETS[dataset])
+        os.makedirs(os.path.dirname(path) or root, exist_ok=True)
+        df.to_csv(path, index=False)
+    generate_photos(photos, os.path.join(root, "photos"), seed)
+    generate_photos(photos, os.path.join(root, "survey_responses", "final_images"), seed + 10)
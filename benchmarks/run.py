@@ -0,0 +1,252 @@
+"""
+Times the app's hot paths against synthetic data of increasing size.
+
+    python -m benchmarks.run --output results.json
+
+By default it runs at 1k, 100k and 1M rows; pass --rows to pick other sizes
+(e.g. --rows 1000 for a quick check).
+
+Each row count runs in a fresh subprocess inside its own scratch directory,
+so the process-wide store, rollup and blob caches start cold exactly as they
+would after a deploy. Results are printed (and optionally written) as JSON,
+one entry per row count, so runs can be diffed across releases.
+
+The startup step renders each page in a fresh interpreter, once cold and
+once after heritage.warmup.warm_up(), to track time-to-first-render for a
+newly started server.
+"""
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_ROWS = [1000, 100_000, 1_000_000]
+PAGES = [
+    "Main.py", "app.py", os.path.join("pages", "SNF-Follow-up.py"), os.path.join("pages", "Training Tracker.py"),
+    os.path.join("pages", "Bulk Import.py"), os.path.join("pages", "Performance.py"),
+]
+STEPS = ["load", "validate", "rollups", "pages_store", "exports", "startup", "apptest"]
+
+
+@contextlib.contextmanager
+def timed(seconds, name):
+    start = time.perf_counter()
+    yield
+    seconds[name] = round(time.perf_counter() - start, 4)
+
+
+def run_size(rows, photos, seed, skip):
+    """Runs every step for one row count in the current directory."""
+    from benchmarks.data import write_legacy_layout
+    from heritage.archive import get_archive
+    from heritage.exports import csv_export, excel_export
+    from heritage.forms import SNF_PLAN, SURVEY_PLAN, TRAINING_PLAN
+    from heritage.indexes import get_index
+    from heritage.queries import select
+    from heritage.rollups import get_rollups
+    from heritage.storage import DATASETS, SegmentStore, open_store
+
+    seconds = {}
+    with timed(seconds, "generate"):
+        write_legacy_layout(".", rows, photos, seed)
+
+    for dataset in DATASETS:
+        with timed(seconds, f"import_legacy_csv.{dataset}"):
+            open_store(dataset)
+
+    if "load" not in skip:
+        for dataset in DATASETS:
+            with timed(seconds, f"load_data.cold.{dataset}"):
+                SegmentStore(dataset).read()
+            open_store(dataset).read()
+            with timed(seconds, f"load_data.warm.{dataset}"):
+                open_store(dataset).read()
+
+    if "validate" not in skip:
+        for dataset, plan in (("snf", SNF_PLAN), ("training", TRAINING_PLAN), ("survey", SURVEY_PLAN)):
+            df = plan.to_keys(open_store(dataset).read())
+            sample = df.head(1000).to_dict("records")
+            with timed(seconds, f"validate_form_data.1000_records.{dataset}"):
+                for record in sample:
+                    plan.validate_record(record)
+            with timed(seconds, f"validate_frame.{dataset}"):
+                plan.validate_frame(df)
+
+    if "rollups" not in skip:
+        for dataset in DATASETS:
+            with timed(seconds, f"dashboard_rollups.build.{dataset}"):
+                get_rollups(dataset)
+            with timed(seconds, f"dashboard_rollups.cached.{dataset}"):
+                get_rollups(dataset)
+
+    if "pages_store" not in skip:
+        snf_store = open_store("snf")
+        with timed(seconds, "read_page.middle"):
+            snf_store.read_page(rows // 2, 50)
+        with timed(seconds, "read_page.sorted"):
+            snf_store.read_page(rows // 2, 50, sort_by="Farmer Code")
+        with timed(seconds, "select.projected"):
+            select("snf", ["SNF in the list (%)"])
+        with timed(seconds, "select.filtered"):
+            select("snf", ["Farmer Code", "SNF in the list (%)"], start=datetime.date(2025, 1, 1),
+                   end=datetime.date(2025, 1, 31), hpcs=["HPC0001"])
+        with timed(seconds, "index_filter.build"):
+            snf_index = get_index("snf")
+        with timed(seconds, "index_filter.filtered"):
+            positions = snf_index.filter(start=datetime.date(2025, 1, 1), end=datetime.date(2025, 1, 31),
+                                         hpcs=["HPC0001"])
+        with timed(seconds, "index_filter.page"):
+            snf_store.take(positions[:50])
+        farmer = snf_store.read_page(rows // 2, 1)["Farmer Code"].iloc[0]
+        with timed(seconds, "index_filter.farmer"):
+            snf_index.filter(farmer=farmer)
+
+    if "exports" not in skip:
+        snf_store = open_store("snf")
+        with timed(seconds, "export_csv.snf"):
+            csv_export(snf_store)
+        with timed(seconds, "export_excel.snf"):
+            excel_export(snf_store, "SNF Responses")
+        with timed(seconds, "export_zip.snf"):
+            get_archive("benchmark_snf_photos", "snf", (".png", ".jpg", ".jpeg")).refresh()
+        with timed(seconds, "export_zip.snf.unchanged"):
+            get_archive("benchmark_snf_photos", "snf", (".png", ".jpg", ".jpeg")).refresh()
+
+    if "startup" not in skip:
+        for page in PAGES:
+            name = os.path.splitext(os.path.basename(page))[0]
+            for mode in ("cold", "warm"):
+                command = [sys.executable, "-m", "benchmarks.run", "--first-render", page]
+                if mode == "warm":
+                    command.append("--warm-up")
+                start = time.perf_counter()
+                completed = subprocess.run(command, capture_output=True, text=True)
+                elapsed = round(time.perf_counter() - start, 4)
+                if completed.returncode != 0:
+                    sys.stderr.write(completed.stderr)
+                    raise SystemExit(f"first render of {page} failed")
+                # The result is the last line; anything the page printed comes before it.
+                timings = json.loads(completed.stdout.splitlines()[-1])
+                if mode == "cold":
+                    seconds[f"startup.time_to_first_render.{name}"] = elapsed
+                else:
+                    seconds[f"startup.warm_up.{name}"] = timings["warm_up"]
+                    seconds[f"startup.first_render_after_warm_up.{name}"] = timings["render"]
+                if "exception" in timings:
+                    seconds[f"startup.exception.{mode}.{name}"] = timings["exception"]
+
+    if "apptest" not in skip:
+        from streamlit.testing.v1 import AppTest
+        for page in PAGES:
+            name = os.path.splitext(os.path.basename(page))[0]
+            at = AppTest.from_file(os.path.join(REPO_ROOT, page), default_timeout=3600)
+            with timed(seconds, f"apptest.first_run.{name}"):
+                at.run()
+            with timed(seconds, f"apptest.rerun.{name}"):
+                at.run()
+            if at.exception:
+                seconds[f"apptest.exception.{name}"] = at.exception[0].value
+
+    return {
+        "rows": rows,
+        "photos": photos,
+        "seconds": seconds,
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def first_render(page, warm):
+    """Renders a page once in this process, optionally after the server warm-up."""
+    timings = {}
+    if warm:
+        from heritage.warmup import warm_up
+        with timed(timings, "warm_up"):
+            warm_up()
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(os.path.join(REPO_ROOT, page), default_timeout=3600)
+    with timed(timings, "render"):
+        at.run()
+    if at.exception:
+        timings["exception"] = at.exception[0].value
+    return timings
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _package_versions():
+    versions = {}
+    for package in ("pandas", "pyarrow", "numpy", "streamlit", "PIL"):
+        try:
+            versions[package] = __import__(package).__version__
+        except ImportError:
+            versions[package] = None
+    return versions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROWS, help="row counts to benchmark")
+    parser.add_argument("--photos", type=int, default=50, help="photos per collection")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip", nargs="*", default=[], choices=STEPS, help="steps to leave out")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--first-render", help=argparse.SUPPRESS)
+    parser.add_argument("--warm-up", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.first_render:
+        print(json.dumps(first_render(args.first_render, args.warm_up)))
+        return
+
+    if args.child:
+        json.dump(run_size(args.rows[0], args.photos, args.seed, set(args.skip)), sys.stdout)
+        return
+
+    results = []
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO_ROOT, os.environ.get("PYTHONPATH")])))
+    env.pop("HERITAGE_STORE_DIR", None)
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory(prefix=f"heritage-bench-{rows}-") as workdir:
+            command = [sys.executable, "-m", "benchmarks.run", "--child", "--rows", str(rows),
+                       "--photos", str(args.photos), "--seed", str(args.seed), "--skip", *args.skip]
+            completed = subprocess.run(command, cwd=workdir, env=env, capture_output=True, text=True)
+            if completed.returncode != 0:
+                sys.stderr.write(completed.stderr)
+                raise SystemExit(f"benchmark failed at {rows} rows")
+            result = json.loads(completed.stdout)
+        print(f"{rows} rows: " + ", ".join(f"{name}={value}s" for name, value in result["seconds"].items()), file=sys.stderr)
+        results.append(result)
+
+    report = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "packages": _package_versions(),
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
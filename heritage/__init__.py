@@ -0,0 +1 @@
+"""Shared building blocks for the Heritage Dairy Streamlit pages."""
@@ -0,0 +1,155 @@
+"""
+Persistent, incrementally extended ZIP archives of a photo collection.
+
+The archive lives on disk next to a small JSON index of what it already
+contains. refresh() compares the collection's generation in the blob store
+first, so an unchanged library costs a dictionary lookup. When photos were
+added they are appended to the existing archive. Blob files are immutable,
+but a photo is replaced by its recompressed rendition shortly after upload;
+the index remembers which file was archived for each photo, and the archive
+is rebuilt if any of them has been replaced since. JPEG/PNG files are
+already compressed and are stored as-is rather than deflated again. An
+unreadable archive is rebuilt from scratch.
+"""
+import json
+import os
+import threading
+import zipfile
+
+from heritage.blobs import get_blob_store
+from heritage.metrics import observe_bytes, span
+from heritage.storage import STORE_DIR, write_json_atomic
+
+ARCHIVE_DIR = os.path.join(STORE_DIR, "archives")
+PRECOMPRESSED_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+def _empty_index():
+    return {"generation": None, "files": {}, "sources": {}, "skipped": {}}
+
+
+def _source(photo):
+    return os.path.basename(photo["path"])
+
+
+class PhotoArchive:
+    def __init__(self, name, collection, extensions, verify=None):
+        self.collection = collection
+        self.extensions = tuple(extensions)
+        self.verify = verify
+        self.path = os.path.join(ARCHIVE_DIR, f"{name}.zip")
+        self.index_path = os.path.join(ARCHIVE_DIR, f"{name}.index.json")
+        self._lock = threading.Lock()
+        os.makedirs(ARCHIVE_DIR, exist_ok=True)
+
+    def _load_index(self):
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+            # Indexes written before sources were tracked are rebuilt once.
+            index.setdefault("sources", {})
+            return index
+        except (FileNotFoundError, ValueError):
+            return _empty_index()
+
+    @staticmethod
+    def _arcname(photo, used_names):
+        """The photo's original name, disambiguated by digest if already taken."""
+        # Recompressed photos may have changed format; the stored extension wins.
+        stem = os.path.splitext(photo["name"])[0]
+        ext = os.path.splitext(photo["path"])[1]
+        name = f"{stem}{ext}"
+        if name in used_names:
+            name = f"{stem}_{photo['digest'][:8]}{ext}"
+        return name
+
+    def _add(self, zf, photo, index, used_names):
+        digest = photo["digest"]
+        try:
+            if self.verify is not None:
+                try:
+                    with span("photo_verify", collection=self.collection):
+                        self.verify(photo["path"])
+                except FileNotFoundError:
+                    raise
+                except Exception as e:
+                    index["skipped"][digest] = {"name": photo["name"], "error": str(e), "source": _source(photo)}
+                    return
+            arcname = self._arcname(photo, used_names)
+            compress_type = zipfile.ZIP_STORED if arcname.lower().endswith(PRECOMPRESSED_EXTENSIONS) else zipfile.ZIP_DEFLATED
+            zf.write(photo["path"], arcname, compress_type=compress_type)
+        except FileNotFoundError:
+            # Replaced by its rendition since it was listed; that bumps the generation, so the next refresh adds it.
+            return
+        index["files"][digest] = arcname
+        index["sources"][digest] = _source(photo)
+        used_names.add(arcname)
+
+    def refresh(self):
+        """Bring the archive up to date and return its path, or None if there are no photos."""
+        blob_store = get_blob_store()
+        with self._lock, span("zip_archive", collection=self.collection):
+            generation = blob_store.generation(self.collection)
+            index = self._load_index()
+            if index["generation"] == generation and os.path.exists(self.path):
+                return self._result(index)
+
+            photos = [photo for photo in blob_store.photos(self.collection)
+                      if photo["name"].lower().endswith(self.extensions)]
+            try:
+                with zipfile.ZipFile(self.path) as zf:
+                    rebuild = set(zf.namelist()) != set(index["files"].values())
+            except (FileNotFoundError, zipfile.BadZipFile):
+                rebuild = True
+            rebuild = rebuild or any(
+                photo["digest"] in index["files"] and index["sources"].get(photo["digest"]) != _source(photo)
+                for photo in photos
+            )
+            if rebuild:
+                index = _empty_index()
+                if os.path.exists(self.path):
+                    os.remove(self.path)
+
+            new_photos = [
+                photo for photo in photos
+                if photo["digest"] not in index["files"]
+                and index["skipped"].get(photo["digest"], {}).get("source") != _source(photo)
+            ]
+            if new_photos or rebuild:
+                used_names = set(index["files"].values())
+                with zipfile.ZipFile(self.path, "a") as zf:
+                    for photo in new_photos:
+                        self._add(zf, photo, index, used_names)
+                observe_bytes("zip_archive", os.path.getsize(self.path), collection=self.collection)
+            index["generation"] = generation
+            write_json_atomic(self.index_path, index)
+            return self._result(index)
+
+    def _result(self, index):
+        return self.path if index["files"] else None
+
+    def read(self):
+        """
+        The up-to-date archive's bytes. Passed uncalled as a download button's
+        data, so the ZIP is only read when someone downloads it.
+        """
+        self.refresh()
+        with self._lock, open(self.path, "rb") as f:
+            return f.read()
+
+    def skipped(self):
+        """Photos left out of the archive because verification failed, by name."""
+        return {entry["name"]: entry["error"] for entry in self._load_index()["skipped"].values()}
+
+
+_archives = {}
+_archives_lock = threading.Lock()
+
+
+def get_archive(name, collection, extensions, verify=None):
+    """Returns the process-wide archive for a photo collection."""
+    with _archives_lock:
+        archive = _archives.get(name)
+        if archive is None:
+            archive = _archives[name] = PhotoArchive(name, collection, extensions, verify)
+    return archive
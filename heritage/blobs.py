@@ -0,0 +1,286 @@
+"""
+Content-addressed photo store shared by all pages.
+
+Photos are stored once per distinct content under their SHA-256 digest in
+sharded directories (blobs/ab/cd/<digest>.<ext>), so two phones uploading
+IMG_0001.jpg never collide and identical uploads are kept once. An
+append-only manifest (manifest.jsonl) records every stored blob and every
+link of a blob into a collection ("survey", "snf", "training"), optionally
+tied to a submission's record ID. The manifest is replayed into in-memory
+dictionaries once per process and tail-read afterwards, so listing a
+collection or looking up a blob never scans a directory.
+
+Newly stored photos are recompressed in the background (see heritage.images).
+The EXIF-free rendition is stored under its own digest, the original file is
+removed, and a "processed" manifest event points the original digest at the
+rendition and records its format, dimensions and size. Files are never
+rewritten in place; callers keep digests and resolve paths with blob_path().
+
+Server processes sharing the directory append to the manifest under an
+exclusive file lock, and each replays the others' events on its next read.
+"""
+import functools
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+
+from heritage.coordination import FileLock
+from heritage.images import PROCESSED_EXTENSIONS, output_extension, submit_image
+from heritage.storage import STORE_DIR
+
+BLOB_DIR = os.path.join(STORE_DIR, "blobs")
+MANIFEST_PATH = os.path.join(BLOB_DIR, "manifest.jsonl")
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".bmp", ".tiff")
+
+
+class BlobStore:
+    def __init__(self, root=BLOB_DIR):
+        self.root = root
+        self.manifest_path = os.path.join(root, "manifest.jsonl")
+        self._lock = threading.RLock()
+        self._offset = 0
+        self._blobs = {}
+        self._collections = {}
+        self._replaced = {}
+        self._submissions = {}
+        self._imported = set()
+        self._scheduled = set()
+        os.makedirs(root, exist_ok=True)
+        self._manifest_lock = FileLock(os.path.join(root, "manifest.lock"))
+
+    # --- Manifest ---
+    def _apply(self, event):
+        kind = event["event"]
+        if kind == "blob":
+            self._blobs[event["digest"]] = {"ext": event["ext"], "bytes": event["bytes"]}
+        elif kind == "link":
+            photos = self._collections.setdefault(event["collection"], {})
+            photos.setdefault(event["digest"], {"name": event["name"], "ts": event["ts"]})
+            if event.get("submission_id"):
+                key = (event["collection"], event["submission_id"])
+                self._submissions.setdefault(key, []).append(event["digest"])
+        elif kind == "processed":
+            blob = self._blobs[event["digest"]]
+            blob["processed"] = True
+            for key in ("rendition", "ext", "bytes", "width", "height"):
+                if key in event:
+                    blob[key] = event[key]
+            if "ext" in event:
+                for collection, photos in self._collections.items():
+                    if event["digest"] in photos:
+                        self._replaced[collection] = self._replaced.get(collection, 0) + 1
+        elif kind == "import":
+            self._imported.add((event["directory"], event["collection"]))
+
+    def _refresh(self):
+        """Replay manifest events appended since the last call."""
+        try:
+            size = os.path.getsize(self.manifest_path)
+        except FileNotFoundError:
+            return
+        if size == self._offset:
+            return
+        with open(self.manifest_path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read(size - self._offset)
+        data = data[:data.rfind(b"\n") + 1]
+        for line in data.splitlines():
+            if line.strip():
+                self._apply(json.loads(line))
+        self._offset += len(data)
+
+    def _record(self, events):
+        payload = "".join(json.dumps(event) + "\n" for event in events)
+        with self._manifest_lock.exclusive():
+            with open(self.manifest_path, "a", encoding="utf-8") as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+        self._refresh()
+
+    # --- Writing ---
+    def _path(self, digest, ext):
+        return os.path.join(self.root, digest[:2], digest[2:4], f"{digest}{ext}")
+
+    def _current_path(self, digest):
+        blob = self._blobs[digest]
+        # A rendition is a blob too; follow it in case it was itself recompressed later.
+        while "rendition" in blob:
+            digest = blob["rendition"]
+            blob = self._blobs[digest]
+        return self._path(digest, blob["ext"])
+
+    def blob_path(self, digest):
+        """Where the photo stored under digest currently lives: its recompressed rendition once processed."""
+        with self._lock:
+            self._refresh()
+            return self._current_path(digest)
+
+    def put(self, data, name):
+        """Store bytes under their digest (once) and return the digest."""
+        digest = hashlib.sha256(data).hexdigest()
+        ext = os.path.splitext(name)[1].lower()
+        with self._lock:
+            self._refresh()
+            if digest in self._blobs:
+                return digest
+            path = self._path(digest, ext)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+            self._record([{"event": "blob", "digest": digest, "ext": ext, "bytes": len(data)}])
+            self._schedule(digest)
+        return digest
+
+    def link(self, digest, collection, name, submission_id=None):
+        """Attach a stored blob to a collection and, optionally, a submission."""
+        with self._lock:
+            self._refresh()
+            key = (collection, submission_id)
+            if digest in self._collections.get(collection, {}) and (
+                    submission_id is None or digest in self._submissions.get(key, [])):
+                return
+            self._record([{
+                "event": "link", "digest": digest, "collection": collection,
+                "name": name, "submission_id": submission_id, "ts": time.time(),
+            }])
+
+    def add(self, data, name, collection, submission_id=None):
+        digest = self.put(data, name)
+        self.link(digest, collection, name, submission_id)
+        return digest
+
+    def import_directory(self, directory, collection, extensions=IMAGE_EXTENSIONS):
+        """One-shot import of a legacy flat photo directory into a collection."""
+        with self._lock, self._manifest_lock.exclusive():
+            self._refresh()
+            if (directory, collection) in self._imported or not os.path.isdir(directory):
+                return 0
+            imported = 0
+            for name in sorted(os.listdir(directory)):
+                if name.lower().endswith(extensions):
+                    with open(os.path.join(directory, name), "rb") as f:
+                        self.add(f.read(), name, collection)
+                    imported += 1
+            self._record([{"event": "import", "directory": directory, "collection": collection}])
+            return imported
+
+    # --- Background processing ---
+    def _schedule(self, digest):
+        blob = self._blobs[digest]
+        if digest in self._scheduled or blob.get("processed") or blob["ext"] not in PROCESSED_EXTENSIONS:
+            return
+        self._scheduled.add(digest)
+        src_path = self._current_path(digest)
+        tmp_path = f"{src_path}.{os.getpid()}.{uuid.uuid4().hex}.processing"
+        try:
+            future = submit_image(src_path, tmp_path)
+        except Exception:
+            # Left for process_pending() on the next start; storing the photo already succeeded.
+            self._scheduled.discard(digest)
+            return
+        future.add_done_callback(functools.partial(self._processed, digest, src_path, tmp_path))
+
+    def _processed(self, digest, src_path, tmp_path, future):
+        """
+        Store the recompressed photo under its own digest and point the
+        original at it. It replaces the original even when it is not smaller,
+        so no stored photo keeps its EXIF metadata.
+        """
+        with self._lock, self._manifest_lock.exclusive():
+            self._scheduled.discard(digest)
+            self._refresh()
+            events = []
+            event = {"event": "processed", "digest": digest}
+            try:
+                result = future.result()
+            except Exception as e:
+                event["error"] = str(e)
+                result = None
+            if self._blobs[digest].get("processed"):
+                # Another server process recompressed it first.
+                event = None
+            elif result is not None:
+                rendition, ext = result["digest"], output_extension()
+                size = {"width": result["width"], "height": result["height"]}
+                if rendition not in self._blobs:
+                    # Registered as a blob, so uploading the rendition itself later is a duplicate.
+                    dst_path = self._path(rendition, ext)
+                    os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+                    os.replace(tmp_path, dst_path)
+                    events += [{"event": "blob", "digest": rendition, "ext": ext, "bytes": result["bytes"]},
+                               {"event": "processed", "digest": rendition, **size}]
+                if rendition != digest:
+                    event.update(rendition=rendition, ext=ext, bytes=result["bytes"])
+                event.update(size)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            if event is not None:
+                self._record(events + [event])
+                if "rendition" in event and src_path != self._current_path(digest):
+                    os.remove(src_path)
+
+    def process_pending(self):
+        """Queue every stored photo that has not been recompressed yet."""
+        with self._lock:
+            self._refresh()
+            for digest in list(self._blobs):
+                self._schedule(digest)
+
+    # --- Reading ---
+    def photos(self, collection):
+        """Every photo linked into a collection, oldest first."""
+        with self._lock:
+            self._refresh()
+            return [
+                {"digest": digest, "name": meta["name"], "path": self._current_path(digest),
+                 "bytes": self._blobs[digest]["bytes"], "width": self._blobs[digest].get("width"),
+                 "height": self._blobs[digest].get("height")}
+                for digest, meta in self._collections.get(collection, {}).items()
+            ]
+
+    def submission_photos(self, collection, submission_id):
+        with self._lock:
+            self._refresh()
+            return list(self._submissions.get((collection, submission_id), []))
+
+    def generation(self, collection):
+        """Changes whenever a photo is linked into the collection or replaced by its recompressed rendition."""
+        with self._lock:
+            self._refresh()
+            return len(self._collections.get(collection, {})) + self._replaced.get(collection, 0)
+
+    def get(self, digest):
+        with self._lock:
+            self._refresh()
+            return self._blobs.get(digest)
+
+
+_blob_store = None
+_blob_store_lock = threading.Lock()
+
+# Flat photo directories written before the blob store existed.
+LEGACY_PHOTO_DIRS = [
+    ("photos", "snf"),
+    ("photos", "training"),
+    (os.path.join("survey_responses", "final_images"), "survey"),
+]
+
+
+def get_blob_store():
+    """Returns the process-wide blob store, importing legacy photo directories once."""
+    global _blob_store
+    with _blob_store_lock:
+        if _blob_store is None:
+            _blob_store = BlobStore()
+            for directory, collection in LEGACY_PHOTO_DIRS:
+                _blob_store.import_directory(directory, collection)
+            _blob_store.process_pending()
+    return _blob_store
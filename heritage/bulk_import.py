@@ -0,0 +1,124 @@
+"""
+Bulk import of offline-collected SNF surveys and training sessions.
+
+An uploaded CSV/XLSX is read as text, its columns are matched to the form's
+field keys or labels, every row is validated in one vectorized pass, and the
+accepted rows are committed through the submission writer as a single batch.
+"""
+import datetime
+import os
+import re
+
+import pandas as pd
+
+from heritage.forms import FORM_FIELDS_MAP, SNF_PLAN, TRAINING_COLUMNS, TRAINING_PLAN
+from heritage.schema import invalid_rows
+from heritage.writer import submit_many
+
+IMPORT_TARGETS = {
+    "SNF Follow-up Survey": {"dataset": "snf", "plan": SNF_PLAN},
+    "Training Tracker": {"dataset": "training", "plan": TRAINING_PLAN},
+}
+
+
+def read_upload(uploaded_file):
+    """Read an uploaded CSV or Excel file with every cell as text."""
+    extension = os.path.splitext(uploaded_file.name)[1].lower()
+    if extension in (".xlsx", ".xls"):
+        df = pd.read_excel(uploaded_file, dtype=str)
+    else:
+        df = pd.read_csv(uploaded_file, dtype=str, skipinitialspace=True)
+    df.columns = df.columns.astype(str).str.strip()
+    return df
+
+
+def _normalize(name):
+    return re.sub(r"[^a-z0-9]", "", str(name).lower())
+
+
+def map_columns(df, plan, extra_columns=()):
+    """
+    Match uploaded column names to field keys by key or label, ignoring case,
+    spacing and punctuation. Returns ({uploaded column: key}, [unmatched]).
+    """
+    lookup = {}
+    for key, label in plan.labels.items():
+        lookup[_normalize(key)] = key
+        lookup[_normalize(label)] = key
+    for column in extra_columns:
+        lookup.setdefault(_normalize(column), column)
+    mapping = {}
+    unmatched = []
+    for column in df.columns:
+        key = lookup.get(_normalize(column))
+        if key is None or key in mapping.values():
+            unmatched.append(column)
+        else:
+            mapping[column] = key
+    return mapping, unmatched
+
+
+def prepare_import(target, df):
+    """
+    Validate an uploaded frame for an import target. Returns the accepted
+    rows (keyed by field key) and a report of rejected rows with messages.
+    """
+    plan = IMPORT_TARGETS[target]["plan"]
+    extra_columns = TRAINING_COLUMNS if IMPORT_TARGETS[target]["dataset"] == "training" else ()
+    mapping, unmatched = map_columns(df, plan, extra_columns)
+    keyed = df[list(mapping)].rename(columns=mapping)
+    keyed = keyed.apply(lambda col: col.str.strip()).fillna("")
+    codes = plan.validate_frame(keyed)
+    rejected_mask = invalid_rows(codes).to_numpy()
+
+    rejected_codes = codes[rejected_mask]
+    messages = []
+    for row_codes in rejected_codes.itertuples(index=False, name=None):
+        messages.append("; ".join(
+            plan.message(key, code) for key, code in zip(rejected_codes.columns, row_codes) if code
+        ))
+    rejected = df[rejected_mask].copy()
+    # Row numbers as shown in a spreadsheet: header is row 1.
+    rejected.insert(0, "row", rejected.index + 2)
+    rejected.insert(1, "errors", messages)
+    return {
+        "accepted": keyed[~rejected_mask],
+        "rejected": rejected,
+        "mapping": mapping,
+        "unmatched": unmatched,
+    }
+
+
+def _snf_records(accepted):
+    columns = [key for key in FORM_FIELDS_MAP if key in accepted.columns]
+    labels = [FORM_FIELDS_MAP[key]["label"] for key in columns]
+    records = []
+    for values in accepted[columns].itertuples(index=False, name=None):
+        row_data = {label: "" for label in (details["label"] for details in FORM_FIELDS_MAP.values())}
+        row_data.update(zip(labels, values))
+        row_data["Photo Filename"] = ""
+        records.append(row_data)
+    return records
+
+
+def _training_records(accepted, email):
+    imported_at = datetime.datetime.now().isoformat()
+    columns = [col for col in TRAINING_COLUMNS if col in accepted.columns]
+    records = []
+    for values in accepted[columns].itertuples(index=False, name=None):
+        row_data = {col: None for col in TRAINING_COLUMNS}
+        row_data.update(zip(columns, values))
+        row_data["timestamp"] = row_data["timestamp"] or imported_at
+        row_data["email"] = row_data["email"] or email
+        records.append(row_data)
+    return records
+
+
+def commit_import(target, accepted, email=""):
+    """Write every accepted row in one batched commit; returns the record IDs."""
+    dataset = IMPORT_TARGETS[target]["dataset"]
+    if dataset == "snf":
+        records = _snf_records(accepted)
+    else:
+        records = _training_records(accepted, email)
+    return submit_many(dataset, records)
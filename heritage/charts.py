@@ -0,0 +1,104 @@
+"""
+Dashboard figures, cached as serialized Plotly JSON.
+
+cached_figure() builds a figure at most once per key, where the key holds
+the data version it was drawn from. Later reruns, in any session, rebuild
+the Figure from the stored JSON instead of running plotly.express over the
+data again. snf_histogram() counts values into the fixed SNF_BIN_EDGES with
+numpy.histogram and draws the counts as a bar trace, so the chart sends the
+same few dozen numbers to the browser however many responses there are.
+"""
+import collections
+import threading
+
+import numpy as np
+
+from heritage.metrics import observe_bytes
+
+FIGURE_CACHE_SIZE = 64
+# SNF (%) bins: 6 to 11 in steps of 0.25.
+SNF_BIN_EDGES = np.round(np.arange(6.0, 11.0 + 0.125, 0.25), 2)
+
+_figures = collections.OrderedDict()
+_lock = threading.Lock()
+_MISSING = object()
+
+
+def cached_figure(name, key, build):
+    """
+    The figure for (name, key). On a miss build() makes it; a build that
+    returns None (nothing to plot) is cached too.
+    """
+    import plotly.io as pio
+    cache_key = (name, key)
+    with _lock:
+        spec = _figures.get(cache_key, _MISSING)
+        if spec is not _MISSING:
+            _figures.move_to_end(cache_key)
+    if spec is _MISSING:
+        figure = build()
+        spec = None if figure is None else figure.to_json()
+        if spec is not None:
+            observe_bytes("chart_payload", len(spec), chart=name)
+        with _lock:
+            _figures[cache_key] = spec
+            while len(_figures) > FIGURE_CACHE_SIZE:
+                _figures.popitem(last=False)
+    return None if spec is None else pio.from_json(spec)
+
+
+def _express():
+    # plotly.express takes a second to import; only pages that draw a chart pay for it.
+    import plotly.express as px
+    return px
+
+
+def count_bar(counts, x_label, y_label, title):
+    """Bar chart of a Series of counts, one colour per bar."""
+    return _express().bar(
+        counts,
+        x=counts.index,
+        y=counts.values,
+        labels={'x': x_label, 'y': y_label},
+        title=title,
+        color=counts.index,
+        template="streamlit"
+    )
+
+
+def count_pie(counts, title):
+    return _express().pie(counts, values=counts.values, names=counts.index, title=title, template="streamlit")
+
+
+def frame_bar(df, x, y, title, color=None):
+    """Bar chart of two columns of a DataFrame."""
+    return _express().bar(df, x=x, y=y, title=title, color=color, template="streamlit")
+
+
+def frame_line(df, labels, title):
+    """Line chart with one line per column of a DataFrame."""
+    return _express().line(df, labels=labels, title=title, template="streamlit")
+
+
+def snf_histogram(values, title):
+    """Bar chart of values counted into SNF_BIN_EDGES, or None if there are no values."""
+    import plotly.graph_objects as go
+    values = np.asarray(values, dtype=np.float64)
+    values = values[np.isfinite(values)]
+    if not len(values):
+        return None
+    counts, edges = np.histogram(values, bins=SNF_BIN_EDGES)
+    figure = go.Figure(go.Bar(
+        x=(edges[:-1] + edges[1:]) / 2,
+        y=counts,
+        width=np.diff(edges),
+        customdata=np.column_stack([edges[:-1], edges[1:]]),
+        hovertemplate="%{customdata[0]:.2f}-%{customdata[1]:.2f}%: %{y}<extra></extra>",
+    ))
+    figure.update_layout(title=title, xaxis_title="SNF Value (%)", yaxis_title="Number of Entries",
+                         bargap=0.05, template="streamlit")
+    outside = len(values) - int(counts.sum())
+    if outside:
+        figure.add_annotation(text=f"{outside} values outside {edges[0]:g}-{edges[-1]:g}% not shown",
+                              xref="paper", yref="paper", x=1, y=1.08, showarrow=False)
+    return figure
@@ -0,0 +1,87 @@
+"""
+Coordination between server processes sharing one data directory.
+
+Several Streamlit processes can serve the same STORE_DIR. Writers take an
+advisory FileLock (fcntl.flock) around every change to shared files, and
+readers take it shared while they snapshot files a writer may be rewriting.
+Each store also has a VersionCounter: a uint64 in a small file that every
+process maps into memory. Writers bump it under the lock after each commit,
+so a process checks whether anything changed anywhere with one memory
+read, and only then re-reads the files.
+
+Without fcntl (Windows) the locks only coordinate the threads of one
+process.
+"""
+import contextlib
+import mmap
+import os
+import struct
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+COUNTER_FORMAT = "<Q"
+COUNTER_BYTES = struct.calcsize(COUNTER_FORMAT)
+
+
+class FileLock:
+    """
+    An advisory lock on a file, re-entrant within a thread. Nested
+    acquisitions reuse the outermost one, so take it exclusively first if
+    the block may write.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    @contextlib.contextmanager
+    def _hold(self, operation):
+        with self._thread_lock:
+            if self._depth == 0 and fcntl is not None:
+                if self._fd is None:
+                    self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(self._fd, operation)
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+                if self._depth == 0 and fcntl is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def exclusive(self):
+        return self._hold(fcntl.LOCK_EX if fcntl else None)
+
+    def shared(self):
+        return self._hold(fcntl.LOCK_SH if fcntl else None)
+
+
+class VersionCounter:
+    """A monotonically increasing counter in a memory-mapped file shared by all processes."""
+
+    def __init__(self, path):
+        self.path = path
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < COUNTER_BYTES:
+                os.ftruncate(fd, COUNTER_BYTES)
+            self._map = mmap.mmap(fd, COUNTER_BYTES)
+        finally:
+            os.close(fd)
+
+    def value(self):
+        return struct.unpack_from(COUNTER_FORMAT, self._map)[0]
+
+    def bump(self):
+        """Increment the counter. Callers hold the writer lock that guards it."""
+        value = self.value() + 1
+        struct.pack_into(COUNTER_FORMAT, self._map, 0, value)
+        # Durable, so a restart never reuses a version an export was cached under.
+        self._map.flush()
+        return value
@@ -0,0 +1,180 @@
+"""
+List-vs-slip discrepancy detection for SNF follow-up responses.
+
+For every response the fat, SNF and volume recorded in the HPC list are
+compared with the farmer's slip, and the slip is compared with the
+volume-weighted fat/SNF of the breeds reported (Jersey, HF, Desi). Deltas
+are kept as float32 arrays and each rule that fires sets a bit in a uint16
+flag array, computed one NumPy pass per batch of rows. Z-scores of the
+deltas use running moments, so they are cheap to recompute at read time.
+New responses are folded in from the store's tail rows; the full set is
+only parsed once per process.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+from heritage.forms import FORM_FIELDS_MAP
+from heritage.storage import open_store
+
+DATASET = "snf"
+Z_THRESHOLD = 3.0
+
+BREEDS = ["jersey", "hf", "desi"]
+SOURCE_FIELDS = ["fat_list", "snf_list", "vol_list", "as_on_date_fat", "as_on_date_snf", "as_on_date_vol", "buffalo_vol_lpd"] + [
+    f"{breed}_{measure}" for breed in BREEDS for measure in ("vol_lpd", "fat", "snf")
+]
+DELTAS = {
+    "fat_delta": "Slip fat - list fat",
+    "snf_delta": "Slip SNF - list SNF",
+    "vol_delta_pct": "Slip vol vs list vol (%)",
+    "breed_fat_gap": "Slip fat - breed-weighted fat",
+    "breed_snf_gap": "Slip SNF - breed-weighted SNF",
+    "breed_vol_gap_pct": "Breed vol vs slip vol (%)",
+}
+
+# Rule name -> (delta, absolute limit, description); bit i of the flags is rule i.
+RULES = {
+    "fat_slip_vs_list": ("fat_delta", 0.3, "Slip fat differs from list fat by more than 0.3"),
+    "snf_slip_vs_list": ("snf_delta", 0.3, "Slip SNF differs from list SNF by more than 0.3"),
+    "vol_slip_vs_list": ("vol_delta_pct", 20.0, "Slip volume differs from list volume by more than 20%"),
+    "breed_fat_vs_slip": ("breed_fat_gap", 0.5, "Breed-weighted fat inconsistent with the slip (over 0.5)"),
+    "breed_snf_vs_slip": ("breed_snf_gap", 0.5, "Breed-weighted SNF inconsistent with the slip (over 0.5)"),
+    "breed_vol_vs_slip": ("breed_vol_gap_pct", 25.0, "Breed volumes do not add up to the slip volume (over 25%)"),
+}
+OUTLIER_RULE = "statistical_outlier"
+RULE_NAMES = list(RULES) + [OUTLIER_RULE]
+RULE_BITS = {name: np.uint16(1 << i) for i, name in enumerate(RULE_NAMES)}
+RULE_DESCRIPTIONS = {name: rule[2] for name, rule in RULES.items()}
+RULE_DESCRIPTIONS[OUTLIER_RULE] = f"Some delta is more than {Z_THRESHOLD:g} standard deviations from the mean"
+
+
+def _numbers(df, key):
+    label = FORM_FIELDS_MAP[key]["label"]
+    if label not in df.columns:
+        return np.full(len(df), np.nan)
+    column = df[label]
+    if not pd.api.types.is_numeric_dtype(column):
+        column = pd.to_numeric(column.astype(str).str.rstrip("%"), errors="coerce")
+    return column.to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def compute_deltas(df):
+    """Deltas and rule flags for a batch of responses, as NumPy arrays."""
+    v = {key: _numbers(df, key) for key in SOURCE_FIELDS}
+    with np.errstate(divide="ignore", invalid="ignore"):
+        breed_vol = np.stack([np.nan_to_num(v[f"{breed}_vol_lpd"]) for breed in BREEDS])
+        has_breeds = breed_vol.sum(axis=0) > 0
+
+        def weighted(measure):
+            values = np.stack([v[f"{breed}_{measure}"] for breed in BREEDS])
+            weights = np.where(np.isnan(values), 0, breed_vol)
+            total = weights.sum(axis=0)
+            return np.where(total > 0, (np.nan_to_num(values) * weights).sum(axis=0) / total, np.nan)
+
+        total_vol = breed_vol.sum(axis=0) + np.nan_to_num(v["buffalo_vol_lpd"])
+        deltas = {
+            "fat_delta": v["as_on_date_fat"] - v["fat_list"],
+            "snf_delta": v["as_on_date_snf"] - v["snf_list"],
+            "vol_delta_pct": 100 * (v["as_on_date_vol"] - v["vol_list"]) / v["vol_list"],
+            "breed_fat_gap": v["as_on_date_fat"] - weighted("fat"),
+            "breed_snf_gap": v["as_on_date_snf"] - weighted("snf"),
+            "breed_vol_gap_pct": np.where(has_breeds, 100 * (total_vol - v["as_on_date_vol"]) / v["as_on_date_vol"], np.nan),
+        }
+    deltas = {name: np.where(np.isfinite(values), values, np.nan).astype(np.float32) for name, values in deltas.items()}
+    flags = np.zeros(len(df), dtype=np.uint16)
+    for name, (delta, limit, _) in RULES.items():
+        # NaN compares False, so missing values never raise a flag.
+        flags[np.abs(deltas[delta]) > limit] |= RULE_BITS[name]
+    return deltas, flags
+
+
+class DiscrepancyIndex:
+    def __init__(self):
+        self.rows = 0
+        self._chunks = []
+        self._deltas = {name: np.zeros(0, dtype=np.float32) for name in DELTAS}
+        self._flags = np.zeros(0, dtype=np.uint16)
+        # Running count, sum and sum of squares of each delta, for z-scores.
+        self._moments = {name: np.zeros(3) for name in DELTAS}
+        self._view = None
+
+    def apply(self, df):
+        deltas, flags = compute_deltas(df)
+        for name, values in deltas.items():
+            finite = values[~np.isnan(values)].astype(np.float64)
+            self._moments[name] += (len(finite), finite.sum(), np.square(finite).sum())
+        self._chunks.append((deltas, flags))
+        self.rows += len(df)
+        self._view = None
+
+    def _consolidate(self):
+        if self._chunks:
+            self._deltas = {
+                name: np.concatenate([self._deltas[name]] + [deltas[name] for deltas, _ in self._chunks])
+                for name in DELTAS
+            }
+            self._flags = np.concatenate([self._flags] + [flags for _, flags in self._chunks])
+            self._chunks = []
+
+    def view(self):
+        """Deltas, z-scores, flags (including the outlier bit) and each row's largest |z|."""
+        if self._view is None:
+            self._consolidate()
+            flags = self._flags.copy()
+            z_scores = {}
+            with np.errstate(divide="ignore", invalid="ignore"):
+                for name, values in self._deltas.items():
+                    count, total, squares = self._moments[name]
+                    mean = total / count if count else 0.0
+                    std = np.sqrt(max(squares / count - mean * mean, 0.0)) if count else 0.0
+                    z_scores[name] = ((values - mean) / std).astype(np.float32) if std > 0 else np.full_like(values, np.nan)
+            max_abs_z = np.fmax.reduce([np.abs(z) for z in z_scores.values()]) if z_scores else np.zeros(0)
+            flags[max_abs_z > Z_THRESHOLD] |= RULE_BITS[OUTLIER_RULE]
+            self._view = {"deltas": self._deltas, "z": z_scores, "flags": flags, "max_abs_z": max_abs_z}
+        return self._view
+
+    def summary(self):
+        """Rows flagged per rule."""
+        flags = self.view()["flags"]
+        return {name: int(np.count_nonzero(flags & bit)) for name, bit in RULE_BITS.items()}
+
+    def flagged(self, rules=None):
+        """Row positions matching any of the rules, most extreme (by |z|) first."""
+        view = self.view()
+        mask = np.uint16(0)
+        for name in rules or RULE_NAMES:
+            mask |= RULE_BITS[name]
+        positions = np.flatnonzero(view["flags"] & mask)
+        order = np.argsort(-np.nan_to_num(view["max_abs_z"][positions], nan=0.0), kind="stable")
+        return positions[order]
+
+    def details(self, positions):
+        """Deltas, z-scores and fired rules for the given rows."""
+        view = self.view()
+        frame = pd.DataFrame({label: np.round(view["deltas"][name][positions], 2) for name, label in DELTAS.items()})
+        frame["Max |z|"] = np.round(view["max_abs_z"][positions], 2)
+        flags = view["flags"][positions]
+        frame["Rules"] = [", ".join(name for name, bit in RULE_BITS.items() if flag & bit) for flag in flags]
+        frame.index = positions
+        return frame
+
+
+_index = None
+_lock = threading.Lock()
+
+
+def get_discrepancies():
+    """The process-wide index, folding in responses committed since the last call."""
+    global _index
+    with _lock:
+        store = open_store(DATASET)
+        row_count = store.row_count()
+        if _index is None or _index.rows > row_count:
+            _index = DiscrepancyIndex()
+            if row_count:
+                _index.apply(store.read())
+        elif _index.rows < row_count:
+            _index.apply(store.read_range(_index.rows, row_count))
+        return _index
@@ -0,0 +1,182 @@
+"""
+Per-user, per-session survey drafts.
+
+Each draft is its own JSON file, written atomically (temp file + rename), and
+a single index file maps user -> draft ID -> metadata so listing a user's
+drafts or finding one to restore is a dictionary lookup. Autosave is
+debounced: autosave() only records the latest form state and a timer thread
+writes it once the form has been quiet for AUTOSAVE_DEBOUNCE_SECONDS, so
+reruns never wait on disk. Drafts untouched for DRAFT_TTL_SECONDS are removed
+by cleanup_expired(), which runs at most once per CLEANUP_INTERVAL_SECONDS.
+
+The index is shared by every server process: it is re-read whenever the
+file changed on disk, and updated under an exclusive file lock so two
+processes never overwrite each other's entries.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+from heritage.coordination import FileLock
+from heritage.storage import STORE_DIR, write_json_atomic
+
+DRAFT_DIR = os.path.join(STORE_DIR, "drafts")
+INDEX_PATH = os.path.join(DRAFT_DIR, "index.json")
+INDEX_LOCK_PATH = os.path.join(DRAFT_DIR, "index.lock")
+AUTOSAVE_DEBOUNCE_SECONDS = 3
+DRAFT_TTL_SECONDS = 14 * 24 * 3600
+CLEANUP_INTERVAL_SECONDS = 3600
+
+
+def _draft_path(draft_id):
+    return os.path.join(DRAFT_DIR, hashlib.sha256(draft_id.encode("utf-8")).hexdigest()[:32] + ".json")
+
+
+class DraftStore:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._index = None
+        self._index_signature = None
+        self._last_saved = {}
+        self._pending = {}
+        self._timers = {}
+        self._last_cleanup = 0.0
+        os.makedirs(DRAFT_DIR, exist_ok=True)
+        self._index_lock = FileLock(INDEX_LOCK_PATH)
+
+    # --- Index ---
+    @staticmethod
+    def _file_signature():
+        try:
+            stat = os.stat(INDEX_PATH)
+            return stat.st_size, stat.st_mtime_ns, stat.st_ino
+        except FileNotFoundError:
+            return None
+
+    def _load_index(self):
+        signature = self._file_signature()
+        if self._index is None or signature != self._index_signature:
+            try:
+                with open(INDEX_PATH) as f:
+                    self._index = json.load(f)
+            except (FileNotFoundError, ValueError):
+                self._index = {}
+            self._index_signature = signature
+        return self._index
+
+    def _save_index(self):
+        write_json_atomic(INDEX_PATH, self._index)
+        self._index_signature = self._file_signature()
+
+    # --- Public API ---
+    def save(self, user, session_id, data):
+        """Write a draft now. Returns the draft ID."""
+        draft_id = f"{user}:{session_id}"
+        with self._lock, self._index_lock.exclusive():
+            self._cancel_pending(draft_id)
+            changed = self._last_saved.get(draft_id) != data
+            if changed or not os.path.exists(_draft_path(draft_id)):
+                write_json_atomic(_draft_path(draft_id), data)
+                self._last_saved[draft_id] = dict(data)
+            index = self._load_index()
+            index.setdefault(user, {})[draft_id] = {"session_id": session_id, "updated": time.time()}
+            self._save_index()
+        return draft_id
+
+    def autosave(self, user, session_id, data):
+        """Schedule a debounced save of the latest form state."""
+        draft_id = f"{user}:{session_id}"
+        with self._lock:
+            if self._last_saved.get(draft_id) == data:
+                return
+            self._pending[draft_id] = (user, session_id, dict(data))
+            self._cancel_timer(draft_id)
+            timer = threading.Timer(AUTOSAVE_DEBOUNCE_SECONDS, self._flush_pending, args=(draft_id,))
+            timer.daemon = True
+            self._timers[draft_id] = timer
+            timer.start()
+
+    def _flush_pending(self, draft_id):
+        with self._lock:
+            pending = self._pending.pop(draft_id, None)
+            self._timers.pop(draft_id, None)
+            if pending is not None:
+                self.save(*pending)
+
+    def _cancel_timer(self, draft_id):
+        timer = self._timers.pop(draft_id, None)
+        if timer is not None:
+            timer.cancel()
+
+    def _cancel_pending(self, draft_id):
+        self._cancel_timer(draft_id)
+        self._pending.pop(draft_id, None)
+
+    def list(self, user):
+        """A user's drafts as {draft ID: metadata}, newest first."""
+        with self._lock:
+            drafts = self._load_index().get(user, {})
+            return dict(sorted(drafts.items(), key=lambda item: -item[1]["updated"]))
+
+    def load(self, draft_id):
+        with self._lock:
+            pending = self._pending.get(draft_id)
+            if pending is not None:
+                return dict(pending[2])
+        with open(_draft_path(draft_id)) as f:
+            return json.load(f)
+
+    def delete(self, user, session_id):
+        draft_id = f"{user}:{session_id}"
+        with self._lock, self._index_lock.exclusive():
+            self._cancel_pending(draft_id)
+            self._last_saved.pop(draft_id, None)
+            index = self._load_index()
+            if index.get(user, {}).pop(draft_id, None) is not None:
+                if not index[user]:
+                    del index[user]
+                self._save_index()
+            try:
+                os.remove(_draft_path(draft_id))
+            except FileNotFoundError:
+                pass
+
+    def delete_session(self, session_id):
+        """Remove every draft this session saved, whichever surveyor it was under."""
+        with self._lock:
+            users = [user for user, drafts in self._load_index().items()
+                     if any(meta["session_id"] == session_id for meta in drafts.values())]
+            for user in users:
+                self.delete(user, session_id)
+
+    def cleanup_expired(self, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            if now - self._last_cleanup < CLEANUP_INTERVAL_SECONDS:
+                return
+            self._last_cleanup = now
+            index = self._load_index()
+            expired = [
+                (user, meta["session_id"])
+                for user, drafts in index.items()
+                for meta in drafts.values()
+                if now - meta["updated"] > DRAFT_TTL_SECONDS
+            ]
+            for user, session_id in expired:
+                self.delete(user, session_id)
+
+
+_drafts = None
+_drafts_lock = threading.Lock()
+
+
+def get_draft_store():
+    """Returns the process-wide draft store, expiring stale drafts on the way."""
+    global _drafts
+    with _drafts_lock:
+        if _drafts is None:
+            _drafts = DraftStore()
+    _drafts.cleanup_expired()
+    return _drafts
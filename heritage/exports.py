@@ -0,0 +1,114 @@
+"""
+On-demand Excel and CSV exports of a stored dataset.
+
+Workbooks are written with xlsxwriter in constant-memory mode, one row at a
+time, and CSV files one chunk at a time, both from the store's chunked
+reader, so memory stays flat regardless of the number of responses. Each
+export is cached on disk under the dataset's data version; downloading
+unchanged data again reuses the existing file. Download buttons are given
+deferred_export() so the file is read only when it is actually downloaded.
+"""
+import glob
+import os
+import threading
+
+import pandas as pd
+
+from heritage.metrics import observe_bytes, span
+from heritage.storage import STORE_DIR
+
+EXPORT_DIR = os.path.join(STORE_DIR, "exports")
+EXPORT_CHUNK_ROWS = 10_000
+
+_lock = threading.Lock()
+
+
+def _export_path(store, extension):
+    return os.path.join(EXPORT_DIR, f"{store.name}-{store.data_version()}.{extension}")
+
+
+def _publish(tmp_path, path, store, metric):
+    """Move a finished export into place and remove those of older versions."""
+    os.replace(tmp_path, path)
+    observe_bytes(metric, os.path.getsize(path), dataset=store.name)
+    extension = os.path.splitext(path)[1]
+    for stale_path in glob.glob(os.path.join(EXPORT_DIR, f"{store.name}-*{extension}")):
+        if stale_path != path:
+            try:
+                os.remove(stale_path)
+            except FileNotFoundError:
+                # Already cleaned up by another server process.
+                pass
+
+
+def deferred_export(build, store, **kwargs):
+    """
+    A callable returning the bytes of build(store, **kwargs), to pass as a
+    download button's data. The export is only read when someone downloads
+    it, and is rebuilt then if the data has changed since the page was drawn.
+    """
+    def read():
+        with open(build(store, **kwargs), "rb") as f:
+            return f.read()
+    return read
+
+
+def _cell(value):
+    if value is None or (not isinstance(value, (list, tuple)) and pd.isna(value)):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return str(value)
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+
+def cached_excel_export(store):
+    """Path of an export matching the current data, or None if it needs building."""
+    path = _export_path(store, "xlsx")
+    return path if os.path.exists(path) else None
+
+
+def excel_export(store, sheet_name):
+    """Build (or reuse) the Excel export for the store's current data version."""
+    import xlsxwriter
+    with _lock, span("excel_export", dataset=store.name):
+        path = _export_path(store, "xlsx")
+        if os.path.exists(path):
+            return path
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        workbook = xlsxwriter.Workbook(tmp_path, {"constant_memory": True})
+        worksheet = workbook.add_worksheet(sheet_name)
+        row_index = 0
+        for chunk in store.iter_chunks(EXPORT_CHUNK_ROWS):
+            if row_index == 0:
+                worksheet.write_row(0, 0, list(chunk.columns))
+                row_index = 1
+            for row in chunk.itertuples(index=False, name=None):
+                worksheet.write_row(row_index, 0, [_cell(value) for value in row])
+                row_index += 1
+        workbook.close()
+        _publish(tmp_path, path, store, "excel_export")
+        return path
+
+
+def cached_csv_export(store):
+    """Path of a CSV export matching the current data, or None if it needs building."""
+    path = _export_path(store, "csv")
+    return path if os.path.exists(path) else None
+
+
+def csv_export(store):
+    """Build (or reuse) the CSV export for the store's current data version."""
+    with _lock, span("csv_export", dataset=store.name):
+        path = _export_path(store, "csv")
+        if os.path.exists(path):
+            return path
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+            for i, chunk in enumerate(store.iter_chunks(EXPORT_CHUNK_ROWS)):
+                chunk.to_csv(f, index=False, header=i == 0)
+        _publish(tmp_path, path, store, "csv_export")
+        return path
@@ -0,0 +1,187 @@
+"""
+Farmer registry with prefix and fuzzy search, scoped by HPC.
+
+The registry is loaded from FARMER_REGISTRY_PATH (CSV or Parquet with
+farmer_code, farmer_name, mobile and hpc_code columns) into numpy arrays
+sorted by (hpc_code, farmer_code), so every HPC is a contiguous slice and
+its codes are sorted within it. Names (one entry per word) and mobile
+numbers get their own sorted key arrays, prefixed with the HPC code, and a
+prefix search is two binary searches per field. Key arrays hold Python
+strings (object dtype) so a search never re-encodes the whole array to the
+query's width. Fuzzy matching only runs over the name words of one HPC,
+when the prefix search found too little.
+
+Pages ask for the top few matches and never hand the full registry to the
+browser. Without a registry file the three sample farmers are served.
+"""
+import difflib
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+FARMER_REGISTRY_PATH = os.environ.get("HERITAGE_FARMER_REGISTRY", "farmer_registry.csv")
+REGISTRY_COLUMNS = ["farmer_code", "farmer_name", "mobile", "hpc_code"]
+SEARCH_LIMIT = 20
+FUZZY_CUTOFF = 0.75
+
+# Served when no registry file is present.
+SAMPLE_FARMERS = [
+    {"farmer_code": "FARMER001", "farmer_name": "Ram Patil", "mobile": "9876543210", "hpc_code": ""},
+    {"farmer_code": "FARMER002", "farmer_name": "Sita Desai", "mobile": "9988776655", "hpc_code": ""},
+    {"farmer_code": "FARMER003", "farmer_name": "Laxman Rao", "mobile": "9012345678", "hpc_code": ""},
+]
+
+_SEP = "\x1f"
+_HIGH = "\U0010ffff"
+
+
+def _prefix_range(keys, prefix):
+    return np.searchsorted(keys, prefix, "left"), np.searchsorted(keys, prefix + _HIGH, "left")
+
+
+class _KeyIndex:
+    """Sorted search keys pointing back at registry rows, with and without the HPC prefix."""
+
+    def __init__(self, values, rows, hpcs):
+        self.keys, self.rows = self._sorted(values, rows)
+        self.scoped_keys, self.scoped_rows = self._sorted(np.char.add(np.char.add(hpcs, _SEP), values), rows)
+
+    @staticmethod
+    def _sorted(keys, rows):
+        order = np.argsort(keys, kind="stable")
+        return keys[order].astype(object), rows[order]
+
+    def scope(self, hpc_code):
+        """(key, row) pairs of one HPC, with the HPC prefix stripped from the keys."""
+        lo, hi = _prefix_range(self.scoped_keys, f"{hpc_code}{_SEP}")
+        skip = len(hpc_code) + 1
+        return [(key[skip:], row) for key, row in zip(self.scoped_keys[lo:hi], self.scoped_rows[lo:hi].tolist())]
+
+    def prefix(self, prefix, hpc_code, limit):
+        if hpc_code is None:
+            lo, hi = _prefix_range(self.keys, prefix)
+            return self.rows[lo:min(hi, lo + limit)].tolist()
+        lo, hi = _prefix_range(self.scoped_keys, f"{hpc_code}{_SEP}{prefix}")
+        return self.scoped_rows[lo:min(hi, lo + limit)].tolist()
+
+
+class FarmerRegistry:
+    def __init__(self, df):
+        df = df.reindex(columns=REGISTRY_COLUMNS).fillna("").astype(str)
+        df["farmer_code"] = df["farmer_code"].str.strip().str.upper()
+        df["hpc_code"] = df["hpc_code"].str.strip().str.upper()
+        df["mobile"] = df["mobile"].str.replace(r"\D", "", regex=True)
+        df = df[df["farmer_code"] != ""].drop_duplicates("farmer_code", keep="last")
+        df = df.sort_values(["hpc_code", "farmer_code"], kind="stable").reset_index(drop=True)
+
+        self.codes = df["farmer_code"].to_numpy(dtype=str)
+        self.names = df["farmer_name"].to_numpy(dtype=str)
+        self.mobiles = df["mobile"].to_numpy(dtype=str)
+        self.hpcs = df["hpc_code"].to_numpy(dtype=str)
+        # Rows are sorted by HPC, so each distinct code starts where the previous one ends.
+        starts = np.flatnonzero(np.r_[True, self.hpcs[1:] != self.hpcs[:-1]]) if len(df) else []
+        self._hpc_codes = [code for code in self.hpcs[starts].tolist() if code]
+
+        rows = np.arange(len(df))
+        self._codes = _KeyIndex(self.codes, rows, self.hpcs)
+        self._mobiles = _KeyIndex(self.mobiles, rows, self.hpcs)
+        # One key per word of the name, so "patil" finds "Ram Patil".
+        tokens = df["farmer_name"].str.lower().str.split().explode().dropna()
+        token_rows = tokens.index.to_numpy()
+        self._names = _KeyIndex(tokens.to_numpy(dtype=str), token_rows, self.hpcs[token_rows])
+
+    def __len__(self):
+        return len(self.codes)
+
+    def hpc_codes(self):
+        """Distinct HPC codes, sorted; computed once when the registry is loaded."""
+        return self._hpc_codes
+
+    def _record(self, row):
+        return {
+            "farmer_code": str(self.codes[row]), "farmer_name": str(self.names[row]),
+            "mobile": str(self.mobiles[row]), "hpc_code": str(self.hpcs[row]),
+        }
+
+    def lookup(self, farmer_code):
+        """The registry entry for an exact farmer code, or None."""
+        code = str(farmer_code).strip().upper()
+        rows = self._codes.prefix(code, None, 1)
+        if rows and self.codes[rows[0]] == code:
+            return self._record(rows[0])
+        return None
+
+    def search(self, query, hpc_code=None, limit=SEARCH_LIMIT):
+        """
+        Farmers whose code, mobile number or any name word starts with the
+        query, within one HPC (or everywhere if hpc_code is None). Farmers
+        without an HPC are offered under every HPC. When that finds fewer
+        than limit, substring and close-spelling matches on the HPC's
+        farmers fill the rest.
+        """
+        query = str(query).strip()
+        if not query:
+            return []
+        scopes = [None] if hpc_code is None else [str(hpc_code).strip().upper(), ""]
+        digits = query.replace(" ", "")
+        rows = []
+        seen = set()
+        for scope in scopes:
+            candidates = self._codes.prefix(query.upper(), scope, limit)
+            if digits.isdigit():
+                candidates += self._mobiles.prefix(digits, scope, limit)
+            candidates += self._names.prefix(query.lower().split()[0], scope, limit)
+            for row in candidates:
+                if row not in seen:
+                    seen.add(row)
+                    rows.append(row)
+        if len(rows) < limit and hpc_code is not None:
+            for row in self._fuzzy(query, scopes, limit):
+                if row not in seen:
+                    seen.add(row)
+                    rows.append(row)
+        return [self._record(row) for row in rows[:limit]]
+
+    def _fuzzy(self, query, scopes, limit):
+        """Codes and name words containing the query, then name words spelt close to it."""
+        code_needle = query.upper()
+        word_needle = query.lower().split()[0]
+        matches = []
+        for scope in scopes:
+            matches += [row for code, row in self._codes.scope(scope) if code_needle in code]
+            words = self._names.scope(scope)
+            matches += [row for word, row in words if word_needle in word]
+            if len(matches) < limit:
+                close = set(difflib.get_close_matches(word_needle, {word for word, _ in words}, n=limit, cutoff=FUZZY_CUTOFF))
+                matches += [row for word, row in words if word in close]
+        return matches
+
+
+def load_registry_frame(path=FARMER_REGISTRY_PATH):
+    if not os.path.exists(path):
+        return pd.DataFrame(SAMPLE_FARMERS)
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    return pd.read_csv(path, dtype=str, keep_default_na=False)
+
+
+_registry = None
+_registry_signature = None
+_registry_lock = threading.Lock()
+
+
+def get_farmer_registry(path=FARMER_REGISTRY_PATH):
+    """Returns the process-wide registry, reloading it when the file changes."""
+    global _registry, _registry_signature
+    try:
+        stat = os.stat(path)
+        signature = (path, stat.st_size, stat.st_mtime_ns)
+    except FileNotFoundError:
+        signature = (path, None, None)
+    with _registry_lock:
+        if _registry is None or signature != _registry_signature:
+            _registry = FarmerRegistry(load_registry_frame(path))
+            _registry_signature = signature
+    return _registry
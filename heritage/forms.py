@@ -0,0 +1,137 @@
+"""
+Form definitions shared by the pages, the bulk importer, validation and the
+typed columns of the submission store. A field's stored dtype follows from
+its validation and options (see heritage.schema) unless it sets "dtype";
+free-text fields with few distinct values are marked "category".
+"""
+from heritage.schema import compile_schema
+
+# --- SNF Follow-up survey (pages/SNF-Follow-up.py) ---
+FORM_FIELDS_MAP = {
+    "surveyor_name": {"label": "Surveyor Name", "widget": "selectbox", "options": ["Guru", "Balaji"]},
+    "date_of_visit": {"label": "Date of Visit (DD-MM-YYYY)", "widget": "text_input", "validation": "date"},
+    "hpc_code": {"label": "HPC Code", "widget": "text_input", "dtype": "category"},
+    "hpc_name": {"label": "HPC Name", "widget": "text_input", "dtype": "category"},
+    "farmer_name": {"label": "Farmer Name", "widget": "text_input"},
+    "farmer_code": {"label": "Farmer Code", "widget": "text_input"},
+    "gender": {"label": "Gender", "widget": "selectbox", "options": ["Male", "Female", "Other"]},
+    "fat_list": {"label": "Fat in the list (%)", "widget": "text_input", "validation": "numeric"},
+    "snf_list": {"label": "SNF in the list (%)", "widget": "text_input", "validation": "numeric"},
+    "vol_list": {"label": "Vol in the list (LPD)", "widget": "text_input", "validation": "numeric"},
+    "as_on_date_fat": {"label": "Fat in the farmer slip (%)", "widget": "text_input", "validation": "numeric"},
+    "as_on_date_snf": {"label": "SNF in the farmer slip (%)", "widget": "text_input", "validation": "numeric"},
+    "as_on_date_vol": {"label": "Vol in the farmer slip (LPD)", "widget": "text_input", "validation": "numeric"},
+    "number_of_cows": {"label": "Total Number of Cows", "widget": "text_input", "validation": "numeric"},
+    "jersey_cross": {"label": "Jersey /Cross (Count)", "widget": "text_input", "validation": "numeric"},
+    "hf_cross": {"label": "HF/Cross (Count)", "widget": "text_input", "validation": "numeric"},
+    "jersey_milk": {"label": "No. of Jersey cows in milk", "widget": "text_input", "validation": "numeric"},
+    "jersey_vol_lpd": {"label": "Vol-LPD (Jersey Cows)", "widget": "text_input", "validation": "numeric"},
+    "jersey_fat": {"label": "Fat (Jersey Cows) (%)", "widget": "text_input", "validation": "numeric"},
+    "jersey_snf": {"label": "SNF (Jersey Cows) (%)", "widget": "text_input", "validation": "numeric"},
+    "hf_milk": {"label": "No. of HF cows in milk", "widget": "text_input", "validation": "numeric"},
+    "hf_vol_lpd": {"label": "Vol-LPD (HF Cows)", "widget": "text_input", "validation": "numeric"},
+    "hf_fat": {"label": "Fat (HF Cows) (%)", "widget": "text_input", "validation": "numeric"},
+    "hf_snf": {"label": "SNF (HF Cows) (%)", "widget": "text_input", "validation": "numeric"},
+    "desi_milk": {"label": "No. of Desi cows in milk", "widget": "text_input", "validation": "numeric"},
+    "desi_vol_lpd": {"label": "Vol-LPD (Desi Cows)", "widget": "text_input", "validation": "numeric"},
+    "desi_fat": {"label": "Fat (Desi Cows) (%)", "widget": "text_input", "validation": "numeric"},
+    "desi_snf": {"label": "SNF (Desi Cows) (%)", "widget": "text_input", "validation": "numeric"},
+    "buffalo_milk": {"label": "No. of Buffalo in milk", "widget": "text_input", "validation": "numeric"},
+    "buffalo_vol_lpd": {"label": "Vol-LPD (Buffalo)", "widget": "text_input", "validation": "numeric"},
+    "green_fodder": {"label": "Green Fodder Available?", "widget": "selectbox", "options": ["Yes", "No"]},
+    "green_fodder_type": {"label": "Type of Green Fodder (if Yes)", "widget": "text_input", "dtype": "category", "conditional_required_if": {"field": "green_fodder", "value": "Yes"}},
+    "green_fodder_qty": {"label": "Quantity of Green Fodder (Kg/day)", "widget": "text_input", "validation": "numeric", "conditional_required_if": {"field": "green_fodder", "value": "Yes"}},
+    "dry_fodder": {"label": "Dry Fodder Available?", "widget": "selectbox", "options": ["Yes", "No"]},
+    "dry_fodder_type": {"label": "Type of Dry Fodder (if Yes)", "widget": "text_input", "dtype": "category", "conditional_required_if": {"field": "dry_fodder", "value": "Yes"}},
+    "dry_fodder_qty": {"label": "Quantity of Dry Fodder (Kg/day)", "widget": "text_input", "validation": "numeric", "conditional_required_if": {"field": "dry_fodder", "value": "Yes"}},
+    "pellet_feed": {"label": "Pellet Feed Used?", "widget": "selectbox", "options": ["Yes", "No"]},
+    "heritage_feed": {"label": "If Yes, Heritage Feed (Yes/No)", "widget": "text_input", "dtype": "category", "conditional_required_if": {"field": "pellet_feed", "value": "Yes"}},
+    "feed_variant": {"label": "If Yes, Mention the Feed Variant", "widget": "text_input", "dtype": "category", "conditional_required_if": {"field": "pellet_feed", "value": "Yes"}},
+    "feed_brand": {"label": "If No, Mention the Feed Brand", "widget": "text_input", "dtype": "category", "conditional_required_if": {"field": "pellet_feed", "value": "No"}},
+    "pellet_qty": {"label": "Quantity of Pellet Feed (Kg/day)", "widget": "text_input", "validation": "numeric", "conditional_required_if": {"field": "pellet_feed", "value": "Yes"}},
+    "mineral_mix": {"label": "Mineral Mixture Used?", "widget": "selectbox", "options": ["Yes", "No"]},
+    "mineral_mix_brand": {"label": "Mineral Mixture Brand (if Yes)", "widget": "text_input", "dtype": "category", "conditional_required_if": {"field": "mineral_mix", "value": "Yes"}},
+    "mineral_mix_qty": {"label": "Quantity of Mineral Mixture (gm/day)", "widget": "text_input", "validation": "numeric", "conditional_required_if": {"field": "mineral_mix", "value": "Yes"}},
+    "key_insights": {"label": "Key Insights/Observations", "widget": "text_area"},
+}
+
+SNF_REQUIRED_FIELDS = [
+    "surveyor_name", "date_of_visit", "hpc_code", "hpc_name", "farmer_name", "farmer_code", "gender",
+    "green_fodder", "dry_fodder", "pellet_feed", "mineral_mix"
+]
+
+SNF_PLAN = compile_schema(FORM_FIELDS_MAP, required=SNF_REQUIRED_FIELDS, date_format="%d-%m-%Y")
+
+# --- Training Tracker (pages/Training Tracker.py) ---
+TRAINING_COLUMNS = [
+    "timestamp", "date", "hpc_code", "hpc_name", "trainer", "topic",
+    "volume", "avg_fat", "avg_snf", "pourers_total", "pourers_attended",
+    "heritage_users", "non_heritage_users", "awareness_feed",
+    "awareness_supplements", "awareness_vet", "awareness_ai",
+    "awareness_loans", "awareness_insurance", "awareness_gpa",
+    "key_insights", "email", "photo_filename"
+]
+TRAINERS = ["Guru", "Balaji"]
+TRAINING_TOPICS = [
+    "Balanced Nutrition", "Fodder Enrichment", "EVM for Mastitis",
+    "Diarrhea", "Repeat breeding"
+]
+TRAINING_FIELDS_MAP = {
+    "date": {"label": "Date", "validation": "date"},
+    "hpc_code": {"label": "HPC Code", "dtype": "category"},
+    "hpc_name": {"label": "HPC Name", "dtype": "category"},
+    "trainer": {"label": "Training conducted by", "options": TRAINERS},
+    "topic": {"label": "Training Topic", "dtype": "category"},
+    "volume": {"label": "Volume (LPD)", "validation": "numeric"},
+    "avg_fat": {"label": "Average Fat (%)", "validation": "numeric"},
+    "avg_snf": {"label": "Average SNF (%)", "validation": "numeric"},
+    "pourers_total": {"label": "Pourers at HPC (Total)", "validation": "numeric"},
+    "pourers_attended": {"label": "Pourers Attended Training", "validation": "numeric"},
+    "heritage_users": {"label": "Heritage Feed Using Farmers", "validation": "numeric"},
+    "non_heritage_users": {"label": "Non-Heritage Feed Using Farmers", "validation": "numeric"},
+    "awareness_feed": {"label": "Feed Awareness (Yes/No)", "options": ["Yes", "No"]},
+    "awareness_supplements": {"label": "Supplements Awareness (Yes/No)", "options": ["Yes", "No"]},
+    "awareness_vet": {"label": "Veterinary Services Awareness (Yes/No)", "options": ["Yes", "No"]},
+    "awareness_ai": {"label": "AI Services Awareness (Yes/No)", "options": ["Yes", "No"]},
+    "awareness_loans": {"label": "Loan Awareness (Yes/No)", "options": ["Yes", "No"]},
+    "awareness_insurance": {"label": "Cattle Insurance Awareness (Yes/No)", "options": ["Yes", "No"]},
+    "awareness_gpa": {"label": "GPA Policy Awareness (Yes/No)", "options": ["Yes", "No"]},
+    "key_insights": {"label": "Key Insights"},
+}
+TRAINING_REQUIRED_FIELDS = ["date", "trainer"]
+
+TRAINING_PLAN = compile_schema(TRAINING_FIELDS_MAP, required=TRAINING_REQUIRED_FIELDS, date_format="%Y-%m-%d")
+
+# --- Heritage Dairy Survey (app.py) ---
+SURVEY_FIELDS_MAP = {
+    "Surveyor": {"label": "Surveyor Name", "dtype": "category"},
+    "Date": {"label": "Date of Visit", "validation": "date"},
+    "HPC Code": {"label": "HPC Code", "dtype": "category"},
+    "Farmer Code": {"label": "Farmer Code"},
+}
+# The remaining survey columns are typed for storage only; the form's own widgets constrain them.
+SURVEY_FIELDS_MAP.update({
+    name: {"label": name, "dtype": "float32"}
+    for name in ["Milk Yield (LPD)", "Total Cows", "Cows in Milk", "Dry Cows", "Heifers", "Calves",
+                 "Fat (%)", "SNF (%)", "Protein (%)", "TDS (%)"]
+})
+SURVEY_FIELDS_MAP.update({
+    name: {"label": name, "dtype": "boolean"}
+    for name in ["Green Fodder", "Dry Fodder", "Concentrated Feed", "Mineral Mixture", "Any Disease Outbreak",
+                 "Veterinary Visit", "AI/Services", "Manure Management"]
+})
+SURVEY_FIELDS_MAP.update({
+    name: {"label": name, "dtype": "category"}
+    for name in ["HPC Name", "Cattle Breed", "Shed Type", "Water Source", "Green Fodder Source",
+                 "Dry Fodder Source", "Feed Brand", "Mineral Mixture Brand"]
+})
+SURVEY_FIELDS_MAP.update({
+    name: {"label": name, "dtype": "datetime64[ns]"}
+    for name in ["Last Calving Date", "Last Vet Visit Date", "Last AI Date"]
+})
+SURVEY_REQUIRED_FIELDS = ["Surveyor", "Farmer Code", "HPC Code", "Date"]
+
+SURVEY_PLAN = compile_schema(SURVEY_FIELDS_MAP, required=SURVEY_REQUIRED_FIELDS, date_format="%Y-%m-%d")
+
+# Dataset name in the submission store -> plan typing its columns.
+DATASET_PLANS = {"snf": SNF_PLAN, "training": TRAINING_PLAN, "survey": SURVEY_PLAN}
@@ -0,0 +1,252 @@
+"""
+Rollups of SNF responses and trainings up the HPC hierarchy.
+
+Operations are organised as plant -> chilling centre -> route -> HPC. The
+master table (HPC_MASTER_PATH, one row per HPC) says where each HPC sits;
+HPCs that only appear in the data are filed under "Unassigned".
+
+Rows are mapped to HPC positions through pandas categorical codes and
+aggregated with np.bincount into per-HPC arrays (row counts, sums and
+non-blank counts for the averaged columns). Every level above is a second
+bincount of those arrays through an HPC -> node map, so a level costs
+O(number of HPCs), never O(rows). Committed submissions are folded in as
+per-HPC deltas, and only the cached drill-down tables on the branches they
+touched are dropped.
+"""
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from heritage.storage import open_store
+
+HPC_MASTER_PATH = os.environ.get("HERITAGE_HPC_MASTER", "hpc_master.csv")
+LEVELS = ["plant", "chilling_centre", "route", "hpc_code"]
+LEVEL_LABELS = {"plant": "Plant", "chilling_centre": "Chilling Centre", "route": "Route", "hpc_code": "HPC"}
+UNASSIGNED = "Unassigned"
+
+# Per dataset: the HPC column, columns averaged per node and columns summed per node.
+HIERARCHY_SPECS = {
+    "snf": {
+        "hpc": "HPC Code",
+        "means": {"Mean Fat (%)": "Fat in the list (%)", "Mean SNF (%)": "SNF in the list (%)"},
+        "sums": {},
+    },
+    "training": {
+        "hpc": "hpc_code",
+        "means": {"Mean Fat (%)": "avg_fat", "Mean SNF (%)": "avg_snf"},
+        "sums": {"pourers_total": "pourers_total", "pourers_attended": "pourers_attended"},
+    },
+}
+
+
+def _normalize_codes(values):
+    return pd.Series(values, dtype="object").fillna("").astype(str).str.strip().str.upper()
+
+
+def _to_numbers(values):
+    if isinstance(values, pd.Series) and pd.api.types.is_float_dtype(values):
+        return values.astype(float)
+    return pd.to_numeric(pd.Series(values, dtype="object").astype(str).str.replace("%", "", regex=False), errors="coerce")
+
+
+def load_hpc_master(path=HPC_MASTER_PATH):
+    """The master table indexed by HPC code, or an empty one if there is no file."""
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=LEVELS[:-1] + ["hpc_name"], index=pd.Index([], name="hpc_code"))
+    df = pd.read_csv(path, dtype=str, keep_default_na=False)
+    df["hpc_code"] = _normalize_codes(df["hpc_code"])
+    df = df.drop_duplicates("hpc_code", keep="last").set_index("hpc_code")
+    for level in LEVELS[:-1] + ["hpc_name"]:
+        if level not in df.columns:
+            df[level] = ""
+        df[level] = df[level].replace("", UNASSIGNED if level != "hpc_name" else "")
+    return df[LEVELS[:-1] + ["hpc_name"]]
+
+
+class HierarchyRollup:
+    def __init__(self, spec, master):
+        self.spec = spec
+        self.master = master
+        self.rows = 0
+        self.hpc_codes = []
+        self._hpc_index = {}
+        # Per level: node paths (tuples from plant down), path -> node, and HPC position -> node.
+        self.nodes = {level: [] for level in LEVELS}
+        self._node_index = {level: {} for level in LEVELS}
+        self._hpc_to_node = {level: np.zeros(0, dtype=np.int64) for level in LEVELS}
+        self._metrics = ["rows"] + [f"{name}:sum" for name in spec["means"]] + \
+                        [f"{name}:n" for name in spec["means"]] + list(spec["sums"])
+        self.hpc_totals = {metric: np.zeros(0) for metric in self._metrics}
+        self._levels = {}
+        self._frames = {}
+        self._add_hpcs(list(master.index))
+
+    # --- HPC and node registration ---
+    def _add_hpcs(self, codes):
+        new_codes = [code for code in dict.fromkeys(codes) if code not in self._hpc_index]
+        if not new_codes:
+            return
+        new_nodes = {level: [] for level in LEVELS}
+        for code in new_codes:
+            self._hpc_index[code] = len(self.hpc_codes)
+            self.hpc_codes.append(code)
+            if code in self.master.index:
+                parents = tuple(self.master.at[code, level] for level in LEVELS[:-1])
+            else:
+                parents = (UNASSIGNED,) * (len(LEVELS) - 1)
+            path = parents + (code or UNASSIGNED,)
+            for depth, level in enumerate(LEVELS):
+                node_path = path[:depth + 1]
+                node = self._node_index[level].get(node_path)
+                if node is None:
+                    node = self._node_index[level][node_path] = len(self.nodes[level])
+                    self.nodes[level].append(node_path)
+                new_nodes[level].append(node)
+        for level in LEVELS:
+            self._hpc_to_node[level] = np.concatenate([self._hpc_to_node[level], np.asarray(new_nodes[level], dtype=np.int64)])
+        for metric, totals in self.hpc_totals.items():
+            self.hpc_totals[metric] = np.concatenate([totals, np.zeros(len(new_codes))])
+        # Level arrays are re-derived from the HPC totals the next time they are read.
+        self._levels.clear()
+        self._frames.clear()
+
+    # --- Aggregation ---
+    def _batch_totals(self, df):
+        """Per-HPC totals of one batch of rows, and the HPC positions it touched."""
+        codes = _normalize_codes(df[self.spec["hpc"]] if self.spec["hpc"] in df.columns else [""] * len(df))
+        self._add_hpcs(codes.unique().tolist())
+        positions = pd.Categorical(codes, categories=self.hpc_codes).codes
+        size = len(self.hpc_codes)
+        totals = {"rows": np.bincount(positions, minlength=size).astype(float)}
+        for name, column in self.spec["means"].items():
+            values = _to_numbers(df[column] if column in df.columns else [None] * len(df)).to_numpy()
+            valid = ~np.isnan(values)
+            totals[f"{name}:sum"] = np.bincount(positions[valid], weights=values[valid], minlength=size)
+            totals[f"{name}:n"] = np.bincount(positions[valid], minlength=size).astype(float)
+        for name, column in self.spec["sums"].items():
+            values = _to_numbers(df[column] if column in df.columns else [None] * len(df)).fillna(0).to_numpy()
+            totals[name] = np.bincount(positions, weights=values, minlength=size)
+        return totals, np.unique(positions)
+
+    def _level_totals(self, level):
+        totals = self._levels.get(level)
+        if totals is None:
+            node_of = self._hpc_to_node[level]
+            size = len(self.nodes[level])
+            totals = self._levels[level] = {
+                metric: np.bincount(node_of, weights=values, minlength=size)
+                for metric, values in self.hpc_totals.items()
+            }
+        return totals
+
+    def build(self, df):
+        totals, _ = self._batch_totals(df)
+        self.hpc_totals = totals
+        self.rows = len(df)
+        self._levels.clear()
+        self._frames.clear()
+
+    def apply(self, df):
+        """Fold a batch of new rows in, dropping only the cached tables on touched branches."""
+        totals, touched = self._batch_totals(df)
+        for metric, delta in totals.items():
+            self.hpc_totals[metric] += delta
+        for level, level_totals in self._levels.items():
+            node_of = self._hpc_to_node[level]
+            size = len(self.nodes[level])
+            for metric, delta in totals.items():
+                level_totals[metric] += np.bincount(node_of, weights=delta, minlength=size)
+        for position in touched:
+            for level in LEVELS:
+                parent = self.nodes[level][self._hpc_to_node[level][position]][:-1]
+                self._frames.pop((level, parent), None)
+        self.rows += len(df)
+
+    # --- Reading ---
+    def table(self, level, parent=()):
+        """
+        One row per node of a level under the parent path (e.g. ("Plant A",)
+        for the chilling centres of Plant A), with response counts, means and
+        the attendance rate where the dataset has one.
+        """
+        key = (level, tuple(parent))
+        frame = self._frames.get(key)
+        if frame is None:
+            frame = self._frames[key] = self._build_table(level, tuple(parent))
+        return frame
+
+    def _build_table(self, level, parent):
+        totals = self._level_totals(level)
+        nodes = [node for node, path in enumerate(self.nodes[level]) if path[:-1] == parent]
+        nodes = [node for node in nodes if totals["rows"][node] > 0]
+        label = LEVEL_LABELS[level]
+        frame = pd.DataFrame({label: [self.nodes[level][node][-1] for node in nodes]})
+        if level == "hpc_code" and "hpc_name" in self.master.columns:
+            frame["HPC Name"] = frame[label].map(self.master["hpc_name"]).fillna("")
+        frame["Responses"] = totals["rows"][nodes].astype(int)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for name in self.spec["means"]:
+                frame[name] = np.round(totals[f"{name}:sum"][nodes] / totals[f"{name}:n"][nodes], 2)
+            if {"pourers_total", "pourers_attended"} <= set(self.spec["sums"]):
+                frame["Attendance Rate (%)"] = np.round(
+                    100 * totals["pourers_attended"][nodes] / totals["pourers_total"][nodes], 2
+                )
+        return frame.sort_values("Responses", ascending=False, kind="stable").reset_index(drop=True)
+
+    def children(self, level, parent=()):
+        """Names of the nodes directly under parent at a level."""
+        return self.table(level, parent).iloc[:, 0].tolist()
+
+
+_hierarchies = {}
+_master_signature = None
+_lock = threading.RLock()
+
+
+def _master_file_signature():
+    try:
+        stat = os.stat(HPC_MASTER_PATH)
+        return stat.st_size, stat.st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _catch_up(dataset, hierarchy):
+    """Fold in rows committed since the hierarchy last saw the store; rebuild if it is ahead."""
+    store = open_store(dataset)
+    row_count = store.row_count()
+    if hierarchy is None or hierarchy.rows > row_count:
+        hierarchy = HierarchyRollup(HIERARCHY_SPECS[dataset], load_hpc_master())
+        hierarchy.build(store.read())
+    elif hierarchy.rows < row_count:
+        hierarchy.apply(store.read_range(hierarchy.rows, row_count))
+    _hierarchies[dataset] = hierarchy
+    return hierarchy
+
+
+def get_hierarchy(dataset):
+    """The dataset's hierarchy rollup, rebuilt only if the master table changed."""
+    global _master_signature
+    with _lock:
+        signature = _master_file_signature()
+        if signature != _master_signature:
+            _hierarchies.clear()
+            _master_signature = signature
+        return _catch_up(dataset, _hierarchies.get(dataset))
+
+
+def update_hierarchy(dataset, records):
+    """Called by the submission writer after a batch has been committed."""
+    if dataset not in HIERARCHY_SPECS:
+        return
+    with _lock:
+        hierarchy = _hierarchies.get(dataset)
+        if hierarchy is None:
+            # Built from the store on first read.
+            return
+        if hierarchy.rows + len(records) == open_store(dataset).row_count():
+            hierarchy.apply(pd.DataFrame(records))
+        else:
+            _catch_up(dataset, hierarchy)
@@ -0,0 +1,78 @@
+"""
+Background recompression of uploaded photos.
+
+Phone photos arrive as multi-megabyte originals. Once a photo is in the blob
+store it is handed to a small process pool that downscales it to
+MAX_DIMENSION on its longest side, drops EXIF (after applying the
+orientation) and re-encodes it as a progressive JPEG or WebP. The pool runs
+outside the Streamlit script, so submitting a form never waits on Pillow.
+Settings can be overridden through HERITAGE_PHOTO_* environment variables.
+"""
+import hashlib
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+MAX_DIMENSION = int(os.environ.get("HERITAGE_PHOTO_MAX_DIMENSION", "1600"))
+OUTPUT_FORMAT = os.environ.get("HERITAGE_PHOTO_FORMAT", "JPEG").upper()
+OUTPUT_QUALITY = int(os.environ.get("HERITAGE_PHOTO_QUALITY", "82"))
+IMAGE_WORKERS = int(os.environ.get("HERITAGE_PHOTO_WORKERS", "2"))
+
+OUTPUT_EXTENSIONS = {"JPEG": ".jpg", "WEBP": ".webp"}
+# GIFs are left alone so animations survive.
+PROCESSED_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tiff", ".webp")
+
+
+def output_extension():
+    return OUTPUT_EXTENSIONS[OUTPUT_FORMAT]
+
+
+def process_image(src_path, dst_path, max_dimension=MAX_DIMENSION, fmt=OUTPUT_FORMAT, quality=OUTPUT_QUALITY):
+    """
+    Writes a downscaled, EXIF-free re-encoding of src_path to dst_path.
+    Runs in a worker process; returns the new width, height, size and
+    SHA-256 digest.
+    """
+    from PIL import Image, ImageOps
+    with Image.open(src_path) as img:
+        img.draft("RGB", (max_dimension, max_dimension))
+        img = ImageOps.exif_transpose(img).convert("RGB")
+        img.thumbnail((max_dimension, max_dimension))
+        options = {"quality": quality}
+        if fmt == "JPEG":
+            options.update(optimize=True, progressive=True)
+        else:
+            options.update(method=4)
+        # Saving without an exif argument leaves all metadata behind.
+        img.save(dst_path, fmt, **options)
+        width, height = img.size
+    with open(dst_path, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    return {"width": width, "height": height, "bytes": os.path.getsize(dst_path), "digest": digest}
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_image_pool():
+    """Returns the process-wide worker pool, started on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawned rather than forked: the Streamlit server is multi-threaded.
+            _pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def submit_image(src_path, dst_path):
+    """Queues process_image on the pool, restarting the pool once if a worker died."""
+    global _pool
+    try:
+        return get_image_pool().submit(process_image, src_path, dst_path)
+    except BrokenProcessPool:
+        with _pool_lock:
+            _pool = None
+        return get_image_pool().submit(process_image, src_path, dst_path)
@@ -0,0 +1,351 @@
+"""
+Persisted secondary indexes behind the admin filters.
+
+Every stored row of a dataset is indexed by:
+
+- date: the visit or training day of each row, plus the row positions
+  sorted by day, so a date range is two binary searches and a slice;
+- surveyor or trainer, and HPC code: a key code per row, from which a
+  packed bitmap per key is derived on first use and extended as batches
+  are added. A filter ORs the bitmaps of the chosen keys and ANDs the
+  dimensions;
+- farmer code (SNF only): a hash index, mapping each code to the last row
+  holding it, with each row pointing at the previous row of the same
+  farmer, so a lookup visits only that farmer's rows.
+
+The submission writer folds each committed batch's records straight into
+the process's index. A timer thread saves the arrays to <store>/indexes.npz
+once writes have been quiet for INDEX_SAVE_DELAY_SECONDS, so the writer
+never waits on disk. Any saved index describes a prefix of the
+append-only store, so the file is replaced atomically without the writer
+lock. A process loads it on first use and reads the rows committed since
+from the store's tail.
+Filters return row positions; the pages read back only the rows they show
+with SegmentStore.take().
+"""
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from heritage.rollups import ROLLUP_SPECS
+from heritage.storage import open_store
+from heritage.timeseries import parse_days
+
+# Per dataset: the date column and its format, and the columns of the key and hash indexes.
+INDEX_SPECS = {
+    "snf": {"date": ROLLUP_SPECS["snf"]["date"], "person": "Surveyor Name", "hpc": "HPC Code", "farmer": "Farmer Code"},
+    "training": {"date": ROLLUP_SPECS["training"]["date"], "person": "trainer", "hpc": "hpc_code", "farmer": None},
+}
+NO_DAY = np.iinfo(np.int32).min
+INDEX_SAVE_DELAY_SECONDS = 2
+
+
+class _Keys:
+    """Distinct non-blank keys of a column, numbered in order of appearance."""
+
+    def __init__(self, keys=()):
+        self.keys = list(keys)
+        self._ids = {key: i for i, key in enumerate(self.keys)}
+
+    def encode(self, values):
+        """Key number per value, -1 for blanks; new keys are numbered as they are seen."""
+        codes, uniques = pd.factorize(pd.Series(values, dtype="object"))
+        ids = np.full(len(uniques) + 1, -1, dtype=np.int32)
+        for i, key in enumerate(uniques.tolist()):
+            key = str(key).strip()
+            if key:
+                if key not in self._ids:
+                    self._ids[key] = len(self.keys)
+                    self.keys.append(key)
+                ids[i] = self._ids[key]
+        return ids[codes]
+
+    def id(self, key):
+        return self._ids.get(key)
+
+
+class _DateIndex:
+    def __init__(self, days=None, order=None, sorted_days=None):
+        self.days = np.zeros(0, dtype=np.int32) if days is None else days
+        self.order = np.zeros(0, dtype=np.int32) if order is None else order
+        self.sorted_days = np.zeros(0, dtype=np.int32) if sorted_days is None else sorted_days
+
+    def add(self, days):
+        first = len(self.days)
+        numbers = np.where(np.isnat(days), NO_DAY, days.astype(np.int64)).astype(np.int32)
+        self.days = np.concatenate([self.days, numbers])
+        dated = np.flatnonzero(numbers != NO_DAY)
+        new_order = np.argsort(numbers[dated], kind="stable")
+        new_days, new_positions = numbers[dated][new_order], (first + dated[new_order]).astype(np.int32)
+        if not len(self.sorted_days) or not len(new_days) or new_days[0] >= self.sorted_days[-1]:
+            # The usual case, a batch of recent rows: a plain append.
+            self.sorted_days = np.concatenate([self.sorted_days, new_days])
+            self.order = np.concatenate([self.order, new_positions])
+            return
+        # Merged in one pass; equal days keep store order, so new rows go after existing ones.
+        at = np.searchsorted(self.sorted_days, new_days, side="right")
+        self.sorted_days = np.insert(self.sorted_days, at, new_days)
+        self.order = np.insert(self.order, at, new_positions)
+
+    @staticmethod
+    def _bounds(start, end):
+        low = NO_DAY + 1 if start is None else int(np.datetime64(start, "D").astype(np.int64))
+        high = np.iinfo(np.int32).max if end is None else int(np.datetime64(end, "D").astype(np.int64))
+        return low, high
+
+    def between(self, start, end):
+        """Positions of the rows dated start..end (inclusive), in date order."""
+        low, high = self._bounds(start, end)
+        return self.order[np.searchsorted(self.sorted_days, low, side="left"):
+                          np.searchsorted(self.sorted_days, high, side="right")]
+
+    def within(self, positions, start, end):
+        """The given positions whose rows are dated start..end."""
+        low, high = self._bounds(start, end)
+        days = self.days[positions]
+        return positions[(days >= low) & (days <= high)]
+
+
+def _append_bits(bitmap, rows, bits):
+    """The packed bitmap of rows bits followed by bits; only the last partial byte is repacked."""
+    used = rows % 8
+    if not used:
+        return np.concatenate([bitmap, np.packbits(bits)])
+    tail = np.unpackbits(bitmap[-1:], count=used)
+    return np.concatenate([bitmap[:-1], np.packbits(np.concatenate([tail, bits]))])
+
+
+class _BitmapIndex:
+    def __init__(self, keys=(), codes=None):
+        self.keys = _Keys(keys)
+        self.codes = np.zeros(0, dtype=np.int32) if codes is None else codes
+        self._bitmaps = {}
+
+    def add(self, values):
+        rows = len(self.codes)
+        new_codes = self.keys.encode(values)
+        self.codes = np.concatenate([self.codes, new_codes])
+        # Bitmaps already derived are extended by the new rows rather than rebuilt on next use.
+        for key_id, bitmap in self._bitmaps.items():
+            self._bitmaps[key_id] = _append_bits(bitmap, rows, new_codes == key_id)
+
+    def bitmap(self, keys):
+        """Packed bitmap of the rows holding any of the keys."""
+        result = np.zeros((len(self.codes) + 7) // 8, dtype=np.uint8)
+        for key in keys:
+            key_id = self.keys.id(key)
+            if key_id is None:
+                continue
+            bitmap = self._bitmaps.get(key_id)
+            if bitmap is None:
+                bitmap = self._bitmaps[key_id] = np.packbits(self.codes == key_id)
+            result |= bitmap
+        return result
+
+
+class _HashIndex:
+    def __init__(self, keys=(), head=None, previous=None):
+        self.keys = _Keys(keys)
+        self.head = np.zeros(0, dtype=np.int32) if head is None else head
+        self.previous = np.zeros(0, dtype=np.int32) if previous is None else previous
+
+    def add(self, values):
+        first = len(self.previous)
+        codes = self.keys.encode(values)
+        if len(self.keys.keys) > len(self.head):
+            self.head = np.pad(self.head, (0, len(self.keys.keys) - len(self.head)), constant_values=-1)
+        previous = np.full(len(codes), -1, dtype=np.int32)
+        keyed = np.flatnonzero(codes >= 0)
+        grouped = keyed[np.argsort(codes[keyed], kind="stable")]
+        group_codes = codes[grouped]
+        starts = np.r_[True, group_codes[1:] != group_codes[:-1]] if len(grouped) else np.zeros(0, dtype=bool)
+        ends = np.r_[group_codes[1:] != group_codes[:-1], True] if len(grouped) else np.zeros(0, dtype=bool)
+        # Each row points at the previous row of its key: within the batch, or the key's last row so far.
+        links = np.empty(len(grouped), dtype=np.int32)
+        links[1:] = first + grouped[:-1]
+        links[starts] = self.head[group_codes[starts]]
+        previous[grouped] = links
+        self.head[group_codes[ends]] = first + grouped[ends]
+        self.previous = np.concatenate([self.previous, previous])
+
+    def lookup(self, key):
+        """Positions of the rows holding key, in store order."""
+        key_id = self.keys.id(key)
+        positions = []
+        position = -1 if key_id is None else int(self.head[key_id])
+        while position >= 0:
+            positions.append(position)
+            position = int(self.previous[position])
+        return np.array(positions[::-1], dtype=np.int32)
+
+
+def _test_bits(bitmap, positions):
+    return ((bitmap[positions >> 3] >> (7 - (positions & 7)).astype(np.uint8)) & 1).astype(bool)
+
+
+class SecondaryIndex:
+    def __init__(self, spec):
+        self.spec = spec
+        self.rows = 0
+        self.dates = _DateIndex()
+        self.people = _BitmapIndex()
+        self.hpcs = _BitmapIndex()
+        self.farmers = _HashIndex() if spec["farmer"] else None
+
+    def columns(self):
+        return [self.spec["date"][0], self.spec["person"], self.spec["hpc"]] + (
+            [self.spec["farmer"]] if self.spec["farmer"] else []
+        )
+
+    def apply(self, df):
+        def values(column):
+            return df[column] if column in df.columns else [None] * len(df)
+
+        date_column, date_format = self.spec["date"]
+        self.dates.add(parse_days(values(date_column), date_format))
+        self.people.add(values(self.spec["person"]))
+        self.hpcs.add(values(self.spec["hpc"]))
+        if self.farmers is not None:
+            self.farmers.add(values(self.spec["farmer"]))
+        self.rows += len(df)
+
+    def keys(self, name):
+        """Sorted keys of the person or hpc index, for filter choices."""
+        return sorted(getattr(self, {"person": "people", "hpc": "hpcs"}[name]).keys.keys)
+
+    def filter(self, start=None, end=None, people=None, hpcs=None, farmer=None):
+        """Positions, in store order, of the rows matching every given filter."""
+        candidates = None
+        if farmer and self.farmers is not None:
+            candidates = self.farmers.lookup(farmer)
+        elif farmer:
+            return np.zeros(0, dtype=np.int32)
+        if start is not None or end is not None:
+            if candidates is None:
+                candidates = self.dates.between(start, end)
+            else:
+                candidates = self.dates.within(candidates, start, end)
+        bitmap = None
+        for keys, index in ((people, self.people), (hpcs, self.hpcs)):
+            if keys:
+                keys_bitmap = index.bitmap(keys)
+                bitmap = keys_bitmap if bitmap is None else bitmap & keys_bitmap
+        if bitmap is not None:
+            if candidates is None:
+                candidates = np.flatnonzero(np.unpackbits(bitmap, count=self.rows)).astype(np.int32)
+            else:
+                candidates = candidates[_test_bits(bitmap, candidates)]
+        if candidates is None:
+            return np.arange(self.rows, dtype=np.int32)
+        return np.sort(candidates)
+
+    # --- Persistence ---
+    def to_arrays(self):
+        arrays = {
+            "rows": np.array(self.rows),
+            "days": self.dates.days, "date_order": self.dates.order, "sorted_days": self.dates.sorted_days,
+            "person_keys": np.array(self.people.keys.keys, dtype=str), "person_codes": self.people.codes,
+            "hpc_keys": np.array(self.hpcs.keys.keys, dtype=str), "hpc_codes": self.hpcs.codes,
+        }
+        if self.farmers is not None:
+            arrays.update(farmer_keys=np.array(self.farmers.keys.keys, dtype=str),
+                          # Updated in place by add(), so saved from a copy.
+                          farmer_head=self.farmers.head.copy(), farmer_previous=self.farmers.previous)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, spec, arrays):
+        index = cls(spec)
+        index.rows = int(arrays["rows"])
+        index.dates = _DateIndex(arrays["days"], arrays["date_order"], arrays["sorted_days"])
+        index.people = _BitmapIndex(arrays["person_keys"].tolist(), arrays["person_codes"])
+        index.hpcs = _BitmapIndex(arrays["hpc_keys"].tolist(), arrays["hpc_codes"])
+        if index.farmers is not None:
+            index.farmers = _HashIndex(arrays["farmer_keys"].tolist(), arrays["farmer_head"], arrays["farmer_previous"])
+        return index
+
+
+_indexes = {}
+_save_timers = {}
+_lock = threading.RLock()
+
+
+def _index_path(dataset):
+    return os.path.join(open_store(dataset).path, "indexes.npz")
+
+
+def _load(dataset):
+    try:
+        with np.load(_index_path(dataset)) as arrays:
+            return SecondaryIndex.from_arrays(INDEX_SPECS[dataset], {name: arrays[name] for name in arrays.files})
+    except (FileNotFoundError, ValueError, KeyError, OSError):
+        return None
+
+
+def _save(dataset, arrays):
+    path = _index_path(dataset)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+
+
+def _schedule_save(dataset):
+    """Save the index once it has been quiet for a moment. Call with _lock held."""
+    if dataset in _save_timers:
+        return
+    timer = threading.Timer(INDEX_SAVE_DELAY_SECONDS, _save_latest, args=(dataset,))
+    timer.daemon = True
+    _save_timers[dataset] = timer
+    timer.start()
+
+
+def _save_latest(dataset):
+    with _lock:
+        _save_timers.pop(dataset, None)
+        index = _indexes.get(dataset)
+        if index is None:
+            return
+        arrays = index.to_arrays()
+    _save(dataset, arrays)
+
+
+def _catch_up(dataset, index):
+    """Fold in rows committed since the index last saw the store; rebuild if it is ahead."""
+    store = open_store(dataset)
+    row_count = store.row_count()
+    if index is None:
+        index = _load(dataset)
+    if index is None or index.rows > row_count:
+        index = SecondaryIndex(INDEX_SPECS[dataset])
+        if row_count:
+            index.apply(store.query(index.columns()))
+        _schedule_save(dataset)
+    elif index.rows < row_count:
+        index.apply(store.read_range(index.rows, row_count))
+        _schedule_save(dataset)
+    _indexes[dataset] = index
+    return index
+
+
+def get_index(dataset):
+    """The dataset's process-wide index, folding in rows committed since the last call."""
+    with _lock:
+        return _catch_up(dataset, _indexes.get(dataset))
+
+
+def update_indexes(dataset, records):
+    """Called by the submission writer after a batch has been committed."""
+    if dataset not in INDEX_SPECS:
+        return
+    with _lock:
+        index = _indexes.get(dataset)
+        if index is None:
+            # Loaded and caught up on first read.
+            return
+        # Anything else (another process committed in between) is caught up on next read.
+        if index.rows + len(records) == open_store(dataset).row_count():
+            index.apply(pd.DataFrame(records))
+            _schedule_save(dataset)
@@ -0,0 +1,202 @@
+"""
+In-process timing spans and histograms for the expensive page sections.
+
+Wrap a section in span("name") (or decorate a function with timed("name"))
+to record its duration, and call observe_bytes() for payload sizes.
+Observations are aggregated into fixed-bucket histograms per span and label
+set, which render_prometheus() turns into the Prometheus text format. A
+bounded list of recent samples per span backs the admin Performance page.
+
+Metrics are off unless HERITAGE_METRICS=1; a disabled span is a shared no-op
+context manager, so instrumented code pays one flag check. When enabled,
+HERITAGE_METRICS_FILE names a file the exposition is rewritten to at most
+every EXPORT_INTERVAL_SECONDS, and HERITAGE_METRICS_PORT starts a local HTTP
+endpoint serving it.
+"""
+import bisect
+import collections
+import contextlib
+import functools
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ENABLED = os.environ.get("HERITAGE_METRICS", "") == "1"
+METRICS_FILE = os.environ.get("HERITAGE_METRICS_FILE")
+METRICS_PORT = os.environ.get("HERITAGE_METRICS_PORT")
+EXPORT_INTERVAL_SECONDS = 10
+RECENT_SAMPLES = 500
+
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BYTES_BUCKETS = tuple(1024 * 4 ** i for i in range(11))
+
+_NULL_SPAN = contextlib.nullcontext()
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = collections.deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.recent.append((time.time(), value))
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._last_export = 0.0
+
+    def observe(self, metric, name, labels, value, buckets):
+        key = (metric, name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+        if METRICS_FILE and time.monotonic() - self._last_export > EXPORT_INTERVAL_SECONDS:
+            self._last_export = time.monotonic()
+            self.write_file(METRICS_FILE)
+
+    def snapshot(self):
+        """Per span and label set: count, total, mean, p50, p95 and max of recent samples."""
+        rows = []
+        with self._lock:
+            items = list(self._histograms.items())
+        for (metric, name, labels), histogram in items:
+            values = sorted(value for _, value in histogram.recent)
+            if not values:
+                continue
+            rows.append({
+                "metric": metric,
+                "span": name,
+                "labels": ", ".join(f"{key}={value}" for key, value in labels),
+                "count": histogram.count,
+                "total": histogram.sum,
+                "mean": histogram.sum / histogram.count,
+                "p50": values[len(values) // 2],
+                "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+                "max": values[-1],
+            })
+        return rows
+
+    def recent(self, metric="seconds"):
+        """Recent (timestamp, span, labels, value) samples, oldest first."""
+        with self._lock:
+            samples = [
+                (ts, name, dict(labels), value)
+                for (kind, name, labels), histogram in self._histograms.items() if kind == metric
+                for ts, value in histogram.recent
+            ]
+        return sorted(samples)
+
+    def render_prometheus(self):
+        lines = []
+        with self._lock:
+            items = sorted(self._histograms.items())
+        for metric in ("seconds", "bytes"):
+            family = f"heritage_span_{metric}"
+            lines.append(f"# TYPE {family} histogram")
+            for (kind, name, labels), histogram in items:
+                if kind != metric:
+                    continue
+                label_text = ",".join([f'span="{name}"'] + [f'{key}="{value}"' for key, value in labels])
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                    cumulative += count
+                    lines.append(f'{family}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+                lines.append(f"{family}_sum{{{label_text}}} {histogram.sum}")
+                lines.append(f"{family}_count{{{label_text}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_file(self, path):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp_path, path)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+registry = Registry()
+
+
+@contextlib.contextmanager
+def _span(name, labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.observe("seconds", name, labels, time.perf_counter() - start, SECONDS_BUCKETS)
+
+
+def span(name, **labels):
+    """Context manager timing the enclosed block under name (a no-op when disabled)."""
+    if not ENABLED:
+        return _NULL_SPAN
+    return _span(name, labels)
+
+
+def timed(name, **labels):
+    """Decorator form of span()."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            with _span(name, labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def observe_bytes(name, size, **labels):
+    """Records a payload size for name (a no-op when disabled)."""
+    if ENABLED:
+        registry.observe("bytes", name, labels, size, BYTES_BUCKETS)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = registry.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_http_server(port=None):
+    """Serves the Prometheus exposition on localhost; started once per process."""
+    global _server
+    port = int(port or METRICS_PORT)
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer(("127.0.0.1", port), _MetricsHandler)
+            except OSError:
+                # Another server process already holds the port.
+                return None
+            threading.Thread(target=_server.serve_forever, daemon=True).start()
+    return _server
+
+
+if ENABLED and METRICS_PORT:
+    start_http_server()
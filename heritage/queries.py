@@ -0,0 +1,41 @@
+"""
+Projected, filtered reads of a dataset for the dashboard and admin views.
+
+select() takes the columns a view renders and the common row predicates
+(visit date range, surveyor or trainer, HPC), and hands both to the store,
+so only those columns of the matching rows are ever materialized.
+"""
+from heritage.metrics import span
+from heritage.storage import open_store
+
+# Per dataset: the columns the common predicates apply to.
+QUERY_FIELDS = {
+    "snf": {"date": "Date of Visit (DD-MM-YYYY)", "person": "Surveyor Name", "hpc": "HPC Code"},
+    "training": {"date": "date", "person": "trainer", "hpc": "hpc_code"},
+    "survey": {"date": "Date", "person": "Surveyor", "hpc": "HPC Code"},
+}
+
+
+def build_filters(dataset, start=None, end=None, people=None, hpcs=None):
+    """Store filters for a date range (inclusive), surveyors or trainers, and HPC codes."""
+    fields = QUERY_FIELDS[dataset]
+    filters = []
+    if start is not None:
+        filters.append((fields["date"], ">=", start))
+    if end is not None:
+        filters.append((fields["date"], "<=", end))
+    if people:
+        filters.append((fields["person"], "in", list(people)))
+    if hpcs:
+        filters.append((fields["hpc"], "in", list(hpcs)))
+    return filters
+
+
+def select(dataset, columns=None, start=None, end=None, people=None, hpcs=None):
+    """
+    The given columns (all when None) of the dataset's rows matching the
+    predicates. The frame is shared between callers and must not be modified
+    in place.
+    """
+    with span("select", dataset=dataset):
+        return open_store(dataset).query(columns, build_filters(dataset, start, end, people, hpcs))
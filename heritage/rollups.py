@@ -0,0 +1,218 @@
+"""
+Materialized dashboard aggregates, maintained on write.
+
+For each dataset the rollup holds the row count, counts per categorical field
+(surveyor, trainer, topic), sums of numeric fields and counts per day. The
+submission writer folds every committed batch into the rollup, so the
+dashboard reads a small JSON document instead of aggregating the full
+history. A rollup whose row count disagrees with the store (legacy import,
+crash between commit and update) is rebuilt from the stored rows.
+
+The rollup file is shared by every server process and only changed under
+the store's writer lock; the writer updates it in the same critical section
+as the commit, before the submitter is answered. Each process caches it with
+the store's data version and re-reads the file once another process has
+committed. The file is stamped with the store version it matches, so a
+reader compares it with the store's shared version counter and takes no
+lock at all; only a rollup that fell behind the store (legacy import, crash)
+is rebuilt under the writer lock. Lock order is the store's writer lock
+first, then the module lock.
+"""
+import datetime
+import json
+import os
+import threading
+
+import pandas as pd
+
+from heritage.storage import open_store, write_json_atomic
+
+ROLLUP_SPECS = {
+    "snf": {
+        "counts": {"surveyor": "Surveyor Name"},
+        "multi_counts": {},
+        "sums": [],
+        "date": ("Date of Visit (DD-MM-YYYY)", "%d-%m-%Y"),
+    },
+    "training": {
+        "counts": {"trainer": "trainer"},
+        "multi_counts": {"topic": ("topic", ", ")},
+        "sums": ["pourers_total", "pourers_attended"],
+        "date": ("date", "%Y-%m-%d"),
+    },
+    "survey": {
+        "counts": {"surveyor": "Surveyor"},
+        "multi_counts": {},
+        "sums": [],
+        "date": ("Date", "%Y-%m-%d"),
+    },
+}
+
+_lock = threading.RLock()
+_cache = {}
+
+
+def _empty_rollup(spec):
+    return {
+        "rows": 0,
+        "counts": {name: {} for name in [*spec["counts"], *spec["multi_counts"]]},
+        "sums": {column: 0.0 for column in spec["sums"]},
+        "daily": {},
+    }
+
+
+def _rollup_path(dataset):
+    return os.path.join(open_store(dataset).path, "rollups.json")
+
+
+def _to_number(value):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if number != number else number
+
+
+def _to_day(value, date_format):
+    if value is None:
+        return None
+    try:
+        return datetime.datetime.strptime(str(value)[:10], date_format).date().isoformat()
+    except ValueError:
+        return None
+
+
+def _increment(counter, key, amount=1):
+    counter[key] = counter.get(key, 0) + amount
+
+
+# Batches larger than this are aggregated with pandas and merged in.
+VECTORIZED_BATCH_ROWS = 1000
+
+
+def _merge(rollup, partial):
+    rollup["rows"] += partial["rows"]
+    for name, counts in partial["counts"].items():
+        for key, count in counts.items():
+            _increment(rollup["counts"][name], key, count)
+    for column, total in partial["sums"].items():
+        rollup["sums"][column] += total
+    for day, count in partial["daily"].items():
+        _increment(rollup["daily"], day, count)
+
+
+def apply_records(rollup, spec, records):
+    """Fold newly committed row dicts into a rollup in place."""
+    if len(records) > VECTORIZED_BATCH_ROWS:
+        _merge(rollup, build_rollup(spec, pd.DataFrame(records)))
+        return
+    for record in records:
+        rollup["rows"] += 1
+        for name, column in spec["counts"].items():
+            value = record.get(column)
+            if value not in (None, ""):
+                _increment(rollup["counts"][name], str(value))
+        for name, (column, separator) in spec["multi_counts"].items():
+            value = record.get(column)
+            if value:
+                for item in str(value).split(separator):
+                    _increment(rollup["counts"][name], item)
+        for column in spec["sums"]:
+            number = _to_number(record.get(column))
+            if number is not None:
+                rollup["sums"][column] += number
+        date_column, date_format = spec["date"]
+        day = _to_day(record.get(date_column), date_format)
+        if day:
+            _increment(rollup["daily"], day)
+
+
+def build_rollup(spec, df):
+    """Compute a rollup from scratch over a full DataFrame."""
+    rollup = _empty_rollup(spec)
+    rollup["rows"] = len(df)
+    for name, column in spec["counts"].items():
+        if column in df.columns:
+            values = df[column].dropna().astype(str)
+            rollup["counts"][name] = {k: int(v) for k, v in values[values != ""].value_counts().items()}
+    for name, (column, separator) in spec["multi_counts"].items():
+        if column in df.columns:
+            items = df[column].dropna().astype(str)
+            items = items[items != ""].str.split(separator).explode()
+            rollup["counts"][name] = {k: int(v) for k, v in items.value_counts().items()}
+    for column in spec["sums"]:
+        if column in df.columns:
+            rollup["sums"][column] = float(pd.to_numeric(df[column], errors="coerce").sum())
+    date_column, date_format = spec["date"]
+    if date_column in df.columns:
+        days = df[date_column]
+        if not pd.api.types.is_datetime64_any_dtype(days):
+            days = pd.to_datetime(days.astype(str).str[:10], format=date_format, errors="coerce")
+        days = days.dropna()
+        rollup["daily"] = {k.date().isoformat(): int(v) for k, v in days.value_counts().sort_index().items()}
+    return rollup
+
+
+def _load(dataset):
+    try:
+        with open(_rollup_path(dataset)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _save(dataset, rollup, version):
+    rollup["version"] = version
+    write_json_atomic(_rollup_path(dataset), rollup)
+
+
+def _current(dataset, spec, store):
+    """The rollup matching the store, from the file or rebuilt. Call with the writer lock held."""
+    rollup = _load(dataset)
+    version = store.committed_version()
+    if rollup is None or rollup["rows"] != store.row_count():
+        rollup = build_rollup(spec, store.read())
+        _save(dataset, rollup, version)
+    elif rollup.get("version") != version:
+        _save(dataset, rollup, version)
+    _cache[dataset] = (version, rollup)
+    return rollup
+
+
+def update_rollups(dataset, records):
+    """Called by the submission writer with the store's writer lock still held from the commit."""
+    spec = ROLLUP_SPECS.get(dataset)
+    if spec is None:
+        return
+    store = open_store(dataset)
+    with store.write_lock(), _lock:
+        rollup = _load(dataset)
+        if rollup is None or rollup["rows"] + len(records) != store.row_count():
+            # Missing, already rebuilt by a reader after the commit, or
+            # another process committed in between: take the file if it
+            # already covers this batch, otherwise rebuild from the store.
+            _current(dataset, spec, store)
+            return
+        apply_records(rollup, spec, records)
+        _save(dataset, rollup, store.committed_version())
+        _cache[dataset] = (rollup["version"], rollup)
+
+
+def get_rollups(dataset):
+    """The current rollup for a dataset, rebuilding it if it has drifted."""
+    spec = ROLLUP_SPECS[dataset]
+    store = open_store(dataset)
+    version = store.committed_version()
+    with _lock:
+        cached = _cache.get(dataset)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+    # The file is replaced atomically and stamped in the same critical section
+    # as each commit, so it is current whenever its version is the store's.
+    rollup = _load(dataset)
+    if rollup is not None and rollup.get("version") == version:
+        with _lock:
+            _cache[dataset] = (version, rollup)
+        return rollup
+    with store.write_lock(), _lock:
+        return _current(dataset, spec, store)
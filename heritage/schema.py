@@ -0,0 +1,305 @@
+"""
+Compiled validation plans for FORM_FIELDS_MAP-style form definitions.
+
+compile_schema() walks a field map once and groups the fields by check
+(required, numeric, date, option, conditional). The resulting plan validates
+a single record on submit, or a whole DataFrame in one vectorized pass that
+returns an error code per row and field.
+
+The plan also decides how each field is stored: float32 for numeric fields,
+nullable booleans for Yes/No choices, categoricals for other choices (or
+fields marked "dtype": "category"), datetime64 for dates and strings for the
+rest. normalize_record() puts a submission's values in canonical form before
+it is written, and apply_dtypes() casts a frame of stored rows, so numbers
+arrive as numbers and nothing downstream re-parses text.
+"""
+import datetime
+
+import numpy as np
+import pandas as pd
+
+REQUIRED = "required"
+NOT_NUMERIC = "not_numeric"
+NEGATIVE = "negative"
+BAD_DATE = "bad_date"
+INVALID_OPTION = "invalid_option"
+CONDITIONAL_REQUIRED = "conditional_required"
+# Position in this list is the integer code used by validate_frame().
+ERROR_CODES = ["", REQUIRED, NOT_NUMERIC, NEGATIVE, BAD_DATE, INVALID_OPTION, CONDITIONAL_REQUIRED]
+
+DATE_FORMAT_HINTS = {"%d-%m-%Y": "DD-MM-YYYY", "%Y-%m-%d": "YYYY-MM-DD"}
+
+FLOAT = "float32"
+BOOLEAN = "boolean"
+CATEGORY = "category"
+DATE = "datetime64[ns]"
+STRING = "string[pyarrow]"
+YES_NO = {"yes": True, "no": False, "true": True, "false": False}
+
+
+def _is_blank(value):
+    if value is None:
+        return True
+    if isinstance(value, float) and value != value:
+        return True
+    return value == "" or value is pd.NA
+
+
+def _field_dtype(details):
+    if details.get("dtype"):
+        return details["dtype"]
+    if details.get("validation") == "numeric":
+        return FLOAT
+    if details.get("validation") == "date":
+        return DATE
+    if details.get("options"):
+        return BOOLEAN if set(details["options"]) == {"Yes", "No"} else CATEGORY
+    return STRING
+
+
+def _has_dtype(values, dtype):
+    if dtype == DATE:
+        return pd.api.types.is_datetime64_any_dtype(values)
+    if dtype == CATEGORY:
+        return isinstance(values.dtype, pd.CategoricalDtype)
+    return values.dtype == pd.api.types.pandas_dtype(dtype)
+
+
+def _option_values(values):
+    """Stored choice values as the option text they were submitted as: Yes/No for booleans."""
+    if pd.api.types.is_bool_dtype(values):
+        return values.map({True: "Yes", False: "No"}).astype("object")
+    return values.astype("object")
+
+
+def parse_dates(values, date_format):
+    """Dates as a datetime64 Series, NaT where blank or unparseable. Only distinct strings are parsed."""
+    codes, uniques = pd.factorize(pd.Series(values, dtype="object").reset_index(drop=True))
+    parsed = pd.to_datetime(pd.Series(uniques, dtype="object").astype(str).str.strip().str[:10],
+                            format=date_format, errors="coerce")
+    return pd.Series(np.append(parsed.to_numpy(dtype="datetime64[ns]"), np.datetime64("NaT", "ns"))[codes])
+
+
+def _to_float(value):
+    if isinstance(value, str):
+        text = value.strip().rstrip("%").strip()
+        if not text:
+            return None
+        try:
+            return float(text)
+        except ValueError:
+            # Left as typed; it reads back as missing.
+            return value
+    if isinstance(value, (bool, np.bool_)):
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def _to_bool(value):
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    flag = YES_NO.get(str(value).strip().lower())
+    return value if flag is None else flag
+
+
+class ValidationPlan:
+    def __init__(self, fields, required, date_format, check_options):
+        self.fields = fields
+        self.date_format = date_format
+        self.labels = {key: details["label"] for key, details in fields.items()}
+        self.keys_by_label = {label: key for key, label in self.labels.items()}
+        self.required = [key for key in required if key in fields]
+        self.numeric = [key for key, details in fields.items() if details.get("validation") == "numeric"]
+        self.dates = [key for key, details in fields.items() if details.get("validation") == "date"]
+        self.options = {
+            key: set(details["options"])
+            for key, details in fields.items()
+            if check_options and details.get("options")
+        }
+        self.conditional = [
+            (key, details["conditional_required_if"]["field"], details["conditional_required_if"]["value"])
+            for key, details in fields.items()
+            if "conditional_required_if" in details
+        ]
+        # Stored columns are named by key in some datasets and by label in others.
+        self.dtypes = {}
+        for key, details in fields.items():
+            self.dtypes[key] = self.dtypes[details["label"]] = _field_dtype(details)
+
+    # --- Single record ---
+    def validate_record(self, data):
+        """Return a list of (field key, error code) for one record dict."""
+        errors = []
+        for key in self.required:
+            if _is_blank(data.get(key)):
+                errors.append((key, REQUIRED))
+        for key in self.numeric:
+            value = data.get(key)
+            if not _is_blank(value):
+                try:
+                    if float(value) < 0:
+                        errors.append((key, NEGATIVE))
+                except (TypeError, ValueError):
+                    errors.append((key, NOT_NUMERIC))
+        for key in self.dates:
+            value = data.get(key)
+            if not _is_blank(value) and not isinstance(value, datetime.date):
+                try:
+                    datetime.datetime.strptime(str(value), self.date_format)
+                except ValueError:
+                    errors.append((key, BAD_DATE))
+        for key, allowed in self.options.items():
+            value = data.get(key)
+            if not _is_blank(value) and value not in allowed:
+                errors.append((key, INVALID_OPTION))
+        for key, condition_field, condition_value in self.conditional:
+            if data.get(condition_field) == condition_value and _is_blank(data.get(key)):
+                errors.append((key, CONDITIONAL_REQUIRED))
+        return errors
+
+    def message(self, key, code):
+        label = self.labels[key]
+        if code == REQUIRED:
+            return f"'{label}' is a required field."
+        if code == NEGATIVE:
+            return f"'{label}' must be a non-negative number."
+        if code == NOT_NUMERIC:
+            return f"'{label}' must be a valid number."
+        if code == BAD_DATE:
+            return f"'{label}' must be in {DATE_FORMAT_HINTS.get(self.date_format, self.date_format)} format."
+        if code == INVALID_OPTION:
+            return f"'{label}' must be one of: {', '.join(sorted(self.options[key]))}."
+        for conditional_key, condition_field, condition_value in self.conditional:
+            if conditional_key == key:
+                return (f"'{label}' is required because '{self.labels[condition_field]}' "
+                        f"is '{condition_value}'.")
+        return f"'{label}' is invalid."
+
+    def messages(self, errors):
+        return [self.message(key, code) for key, code in errors]
+
+    # --- Storage ---
+    def normalize_record(self, record):
+        """A copy of a record with numbers, Yes/No choices and dates in the form they are stored in."""
+        normalized = dict(record)
+        for column, value in record.items():
+            dtype = self.dtypes.get(column)
+            if dtype is None or dtype in (STRING, CATEGORY):
+                continue
+            if _is_blank(value):
+                normalized[column] = None
+            elif dtype == FLOAT:
+                normalized[column] = _to_float(value)
+            elif dtype == BOOLEAN:
+                normalized[column] = _to_bool(value)
+            elif dtype == DATE and isinstance(value, datetime.date):
+                normalized[column] = value.strftime(self.date_format)
+        return normalized
+
+    def apply_dtypes(self, df):
+        """Cast the frame's schema columns to their stored dtypes; returns a new frame."""
+        casts = {}
+        for column in df.columns:
+            dtype = self.dtypes.get(column)
+            if dtype is None or _has_dtype(df[column], dtype):
+                continue
+            values = df[column]
+            if dtype == DATE:
+                casts[column] = parse_dates(values, self.date_format).set_axis(df.index)
+            elif dtype in (FLOAT, BOOLEAN) and not (dtype == FLOAT and pd.api.types.is_numeric_dtype(values)):
+                # Stored values repeat heavily, so each distinct value is converted once.
+                codes, uniques = pd.factorize(values.astype("object"))
+                if dtype == FLOAT:
+                    converted = pd.to_numeric(pd.Series([_to_float(value) for value in uniques] + [None], dtype="object"),
+                                              errors="coerce").to_numpy(dtype=np.float32)
+                else:
+                    flags = [_to_bool(value) for value in uniques]
+                    converted = pd.array([flag if isinstance(flag, bool) else None for flag in flags] + [None], dtype=BOOLEAN)
+                casts[column] = pd.Series(converted[codes], index=df.index)
+            else:
+                casts[column] = values.astype(dtype)
+        return df.assign(**casts) if casts else df
+
+    # --- Whole DataFrames ---
+    def to_keys(self, df):
+        """Rename label-named columns (as stored by the pages) to field keys."""
+        return df.rename(columns={label: key for label, key in self.keys_by_label.items() if label in df.columns})
+
+    def validate_frame(self, df):
+        """
+        Validate every row of a DataFrame in one vectorized pass. Columns may
+        be named by field key or by label. Returns a DataFrame with one column
+        per field holding the first error code for that cell ("" when valid),
+        stored as categoricals.
+        """
+        df = self.to_keys(df)
+        n_rows = len(df)
+        codes = {key: np.zeros(n_rows, dtype=np.int8) for key in self.fields}
+        blank = {}
+
+        all_blank = np.ones(n_rows, dtype=bool)
+
+        def is_blank(key):
+            if key not in df.columns:
+                return all_blank
+            if key not in blank:
+                values = df[key]
+                blank[key] = (values.isna() | values.eq("")).to_numpy(dtype=bool)
+            return blank[key]
+
+        def mark(key, mask, code):
+            target = codes[key]
+            target[mask & (target == 0)] = ERROR_CODES.index(code)
+
+        for key in self.required:
+            mark(key, is_blank(key), REQUIRED)
+        for key in self.numeric:
+            if key not in df.columns:
+                continue
+            numbers = pd.to_numeric(df[key], errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+            present = ~is_blank(key)
+            mark(key, present & np.isnan(numbers), NOT_NUMERIC)
+            with np.errstate(invalid="ignore"):
+                mark(key, present & (numbers < 0), NEGATIVE)
+        for key in self.dates:
+            if key not in df.columns or pd.api.types.is_datetime64_any_dtype(df[key]):
+                continue
+            parsed = pd.to_datetime(df[key].astype(str), format=self.date_format, errors="coerce")
+            mark(key, ~is_blank(key) & parsed.isna().to_numpy(), BAD_DATE)
+        for key, allowed in self.options.items():
+            if key in df.columns:
+                mark(key, ~is_blank(key) & ~_option_values(df[key]).isin(allowed).to_numpy(), INVALID_OPTION)
+        for key, condition_field, condition_value in self.conditional:
+            if condition_field not in df.columns:
+                continue
+            condition = _option_values(df[condition_field]).eq(condition_value).fillna(False).to_numpy(dtype=bool)
+            mark(key, condition & is_blank(key), CONDITIONAL_REQUIRED)
+        return pd.DataFrame(
+            {key: pd.Categorical.from_codes(values, categories=ERROR_CODES) for key, values in codes.items()},
+            index=df.index
+        )
+
+
+def invalid_rows(codes):
+    """Boolean Series marking rows with at least one error code."""
+    invalid = np.zeros(len(codes), dtype=bool)
+    for field in codes.columns:
+        invalid |= codes[field].cat.codes.to_numpy() != 0
+    return pd.Series(invalid, index=codes.index)
+
+
+def error_summary(codes):
+    """Count of each (field, error code) pair across a validated frame."""
+    rows = []
+    for field in codes.columns:
+        counts = np.bincount(codes[field].cat.codes.to_numpy(), minlength=len(ERROR_CODES))
+        rows.extend((field, ERROR_CODES[code], int(count)) for code, count in enumerate(counts) if code and count)
+    return pd.DataFrame(rows, columns=["field", "error", "rows"])
+
+
+def compile_schema(fields, required=(), date_format="%d-%m-%Y", check_options=True):
+    """Compile a FORM_FIELDS_MAP-style definition into a ValidationPlan."""
+    return ValidationPlan(fields, required, date_format, check_options)
@@ -0,0 +1,587 @@
+"""
+Columnar submission storage shared by every page.
+
+Each dataset lives in its own directory under STORE_DIR:
+
+    <STORE_DIR>/<dataset>/manifest.json       segment list, column order, buffer file
+    <STORE_DIR>/<dataset>/segments/*.parquet  immutable, compressed segments
+    <STORE_DIR>/<dataset>/wal*.jsonl          write-ahead buffer of recent rows
+    <STORE_DIR>/<dataset>/store.lock          writer lock shared by all processes
+    <STORE_DIR>/<dataset>/version             data version shared by all processes
+
+New rows are appended to the write-ahead buffer (one JSON line per row) and
+folded into a new Parquet segment once the buffer holds WAL_FLUSH_ROWS rows.
+A fold writes the segment, then switches to a freshly named buffer in the
+same atomic manifest write that lists the segment, so a crash at any point
+leaves the folded rows either in the segment or in the buffer, never both.
+Readers see the segments followed by the buffered rows. Reads are
+incremental: segments are immutable and parsed once per process, and the
+write-ahead buffer is tail-read so only rows appended since the previous
+read are parsed.
+
+Columns described by the dataset's form (heritage.forms.DATASET_PLANS) are
+stored typed: segments are written with the form's dtypes, legacy segments
+and buffered rows are cast when they are first read, and the writer
+normalizes each submission before it reaches the buffer.
+
+Several server processes may share a store. Writers hold the store's file
+lock while they append, flush or import, and bump the shared version when
+they are done. Every process caches the manifest and buffer it last read
+together with that version, and re-reads them only once the version moves.
+
+query() reads only the requested columns, and passes row filters to the
+Parquet reader wherever the segment's stored type allows, so row groups whose
+statistics rule out every row are never decoded.
+"""
+import datetime
+import json
+import operator
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from heritage.coordination import FileLock, VersionCounter
+from heritage.forms import DATASET_PLANS
+from heritage.metrics import span
+from heritage.tail import TailReader
+
+STORE_DIR = os.environ.get("HERITAGE_STORE_DIR", "data_store")
+WAL_FLUSH_ROWS = 500
+IMPORT_CHUNK_ROWS = 100_000
+# Rows per Parquet row group; the unit read when fetching a single page.
+ROW_GROUP_ROWS = 10_000
+SEGMENT_COMPRESSION = "zstd"
+# Query results kept per store; all are dropped at the next commit.
+QUERY_CACHE_SIZE = 32
+COMPARISONS = {
+    "==": operator.eq, "!=": operator.ne,
+    "<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge,
+}
+
+# Dataset name -> legacy CSV written by the pages before the store existed.
+DATASETS = {
+    "snf": "responses.csv",
+    "training": "submissions.csv",
+    "survey": os.path.join("survey_responses", "survey_responses_master.csv"),
+}
+
+
+def write_json_atomic(path, data):
+    # Per-process temp file, so two processes writing the same file cannot collide.
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _coerce_for_parquet(df, typed=()):
+    """Give every object column not typed by the schema a single Parquet-friendly type."""
+    for col in df.columns:
+        if col in typed or not (pd.api.types.is_object_dtype(df[col]) or pd.api.types.is_string_dtype(df[col])):
+            continue
+        non_null = df[col].dropna()
+        if non_null.empty:
+            df[col] = df[col].astype("string")
+            continue
+        numeric = pd.to_numeric(non_null, errors="coerce")
+        if numeric.notna().all() and not non_null.astype(str).str.strip().eq("").any():
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+        elif pd.api.types.infer_dtype(non_null, skipna=True) == "string":
+            df[col] = df[col].astype("string")
+        else:
+            df[col] = df[col].map(lambda v: v if pd.isna(v) else str(v)).astype("string")
+    return df
+
+
+def _concat(frames):
+    """pd.concat that keeps categorical columns categorical when the frames' categories differ."""
+    for column in frames[0].columns:
+        dtypes = [frame[column].dtype if column in frame.columns else None for frame in frames]
+        if not all(isinstance(dtype, pd.CategoricalDtype) for dtype in dtypes):
+            continue
+        categories = dtypes[0].categories
+        for dtype in dtypes[1:]:
+            categories = categories.append(dtype.categories.difference(categories))
+        frames = [
+            frame if frame[column].dtype.categories.equals(categories)
+            else frame.assign(**{column: frame[column].cat.set_categories(categories)})
+            for frame in frames
+        ]
+    return pd.concat(frames, ignore_index=True)
+
+
+def _filter_value(value):
+    if isinstance(value, datetime.date):
+        return pd.Timestamp(value)
+    return value
+
+
+def _normalize_filters(filters):
+    normalized = []
+    for column, op, value in filters:
+        if op in ("in", "not in"):
+            value = tuple(_filter_value(item) for item in value)
+        elif op in COMPARISONS:
+            value = _filter_value(value)
+        else:
+            raise ValueError(f"Unknown filter operator: {op}")
+        normalized.append((column, op, value))
+    return tuple(normalized)
+
+
+def _pushable(arrow_type, value):
+    """Whether a filter value can be compared with a stored Parquet column."""
+    if pa.types.is_dictionary(arrow_type):
+        arrow_type = arrow_type.value_type
+    values = value if isinstance(value, tuple) else (value,)
+    if all(isinstance(item, pd.Timestamp) for item in values):
+        return pa.types.is_timestamp(arrow_type)
+    if all(isinstance(item, str) for item in values):
+        return pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type)
+    if all(isinstance(item, (int, float)) and not isinstance(item, bool) for item in values):
+        return pa.types.is_integer(arrow_type) or pa.types.is_floating(arrow_type)
+    return False
+
+
+def _filter_mask(df, filters):
+    """Rows of a typed frame matching every filter; missing values never match."""
+    mask = np.ones(len(df), dtype=bool)
+    for column, op, value in filters:
+        if column not in df.columns:
+            return np.zeros(len(df), dtype=bool)
+        values = df[column]
+        if op == "in":
+            matched = values.isin(value)
+        elif op == "not in":
+            matched = ~values.isin(value)
+        else:
+            matched = COMPARISONS[op](values, value)
+        mask &= (matched & values.notna()).fillna(False).to_numpy(dtype=bool)
+    return mask
+
+
+class SegmentStore:
+    def __init__(self, name, root=STORE_DIR, schema=None):
+        self.name = name
+        self.schema = schema
+        self.path = os.path.join(root, name)
+        self.segment_dir = os.path.join(self.path, "segments")
+        self.manifest_path = os.path.join(self.path, "manifest.json")
+        self._lock = threading.RLock()
+        self._segments_frame = pd.DataFrame()
+        self._loaded_segments = []
+        self._wal_tail = TailReader(self._wal_path(self._load_manifest()), fmt="jsonl")
+        self._cache_key = None
+        self._cache = pd.DataFrame()
+        self._sort_orders = {}
+        self._queries = {}
+        os.makedirs(self.segment_dir, exist_ok=True)
+        self._file_lock = FileLock(os.path.join(self.path, "store.lock"))
+        self._version = VersionCounter(os.path.join(self.path, "version"))
+        # (version, manifest, buffered rows, row count) as of the last refresh.
+        self._state = None
+
+    def _typed(self, df):
+        return self.schema.apply_dtypes(df) if self.schema is not None else df
+
+    # --- Cross-process state ---
+    def write_lock(self):
+        """The exclusive writer lock; hold it to keep the store unchanged across several calls."""
+        return self._file_lock.exclusive()
+
+    def _refresh_state(self):
+        """The manifest and buffered rows, re-read only if some process has committed since."""
+        state = self._state
+        if state is None or state[0] != self._version.value():
+            with self._file_lock.shared():
+                version = self._version.value()
+                manifest = self._load_manifest()
+                wal_path = self._wal_path(manifest)
+                if self._wal_tail.path != wal_path:
+                    self._wal_tail = TailReader(wal_path, fmt="jsonl")
+                wal_df = self._wal_tail.read()
+                if not wal_df.empty:
+                    wal_df = self._typed(wal_df.reindex(columns=self._merge_columns(manifest["columns"], wal_df.columns)))
+                row_count = sum(segment["rows"] for segment in manifest["segments"]) + len(wal_df)
+                state = self._state = (version, manifest, wal_df, row_count)
+        return state
+
+    # --- Manifest ---
+    def _load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {"segments": [], "columns": [], "imported": []}
+        with open(self.manifest_path) as f:
+            return json.load(f)
+
+    def _wal_path(self, manifest):
+        # Stores written before buffers were renamed on each fold have no "wal" entry.
+        return os.path.join(self.path, manifest.get("wal", "wal.jsonl"))
+
+    def manifest(self):
+        """The current manifest. It is shared between callers and must not be modified."""
+        return self._refresh_state()[1]
+
+    def _save_manifest(self, manifest):
+        write_json_atomic(self.manifest_path, manifest)
+
+    @staticmethod
+    def _merge_columns(known, new):
+        merged = list(known)
+        seen = set(merged)
+        for col in new:
+            if col not in seen:
+                merged.append(col)
+                seen.add(col)
+        return merged
+
+    # --- Writing ---
+    def append(self, records):
+        """Durably append a list of row dicts to the write-ahead buffer."""
+        if not records:
+            return
+        payload = "".join(json.dumps(record, default=str) + "\n" for record in records)
+        with self._file_lock.exclusive():
+            wal_path = self._wal_path(self._load_manifest())
+            with open(wal_path, "a", encoding="utf-8") as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            if self._wal_row_count(wal_path) >= WAL_FLUSH_ROWS:
+                self.flush()
+            self._version.bump()
+
+    def _write_segment(self, df, manifest):
+        typed = self.schema.dtypes if self.schema is not None else ()
+        df = _coerce_for_parquet(self._typed(df).copy(), typed)
+        segment_name = f"seg-{len(manifest['segments']) + 1:06d}.parquet"
+        segment_path = os.path.join(self.segment_dir, segment_name)
+        df.to_parquet(segment_path, index=False, compression=SEGMENT_COMPRESSION, row_group_size=ROW_GROUP_ROWS)
+        manifest["segments"].append({"file": segment_name, "rows": len(df)})
+        manifest["columns"] = self._merge_columns(manifest["columns"], df.columns)
+
+    def flush(self):
+        """Fold the write-ahead buffer into a new segment and start a new, empty buffer."""
+        with self._file_lock.exclusive():
+            manifest = self._load_manifest()
+            wal_path = self._wal_path(manifest)
+            wal_rows = self._read_wal_records(wal_path)
+            if not wal_rows:
+                return
+            self._write_segment(pd.DataFrame(wal_rows), manifest)
+            # Named after the new segment, so it is unique; committed with the segment below.
+            manifest["wal"] = f"wal-{len(manifest['segments']):06d}.jsonl"
+            self._save_manifest(manifest)
+            # Also clears buffers left by a crash after an earlier manifest write.
+            for name in os.listdir(self.path):
+                if name.startswith("wal") and name.endswith(".jsonl") and name != manifest["wal"]:
+                    os.remove(os.path.join(self.path, name))
+            self._version.bump()
+
+    def import_csv(self, csv_path):
+        """One-shot import of a legacy CSV file into segments."""
+        with self._file_lock.exclusive():
+            manifest = self._load_manifest()
+            if csv_path in manifest["imported"] or not os.path.exists(csv_path):
+                return 0
+            imported_rows = 0
+            try:
+                for chunk in pd.read_csv(csv_path, chunksize=IMPORT_CHUNK_ROWS):
+                    chunk.columns = chunk.columns.str.strip()
+                    self._write_segment(chunk, manifest)
+                    imported_rows += len(chunk)
+            except pd.errors.EmptyDataError:
+                pass
+            manifest["imported"].append(csv_path)
+            self._save_manifest(manifest)
+            self._version.bump()
+            return imported_rows
+
+    # --- Reading ---
+    @staticmethod
+    def _read_wal_records(wal_path):
+        if not os.path.exists(wal_path):
+            return []
+        records = []
+        with open(wal_path, encoding="utf-8") as f:
+            for line in f:
+                # A torn final line from a crash mid-write is ignored.
+                if line.endswith("\n"):
+                    records.append(json.loads(line))
+        return records
+
+    @staticmethod
+    def _wal_row_count(wal_path):
+        if not os.path.exists(wal_path):
+            return 0
+        with open(wal_path, "rb") as f:
+            return sum(1 for line in f if line.endswith(b"\n"))
+
+    def _refresh_segments(self, manifest):
+        """Parse only the segments that appeared since the last read."""
+        files = [segment["file"] for segment in manifest["segments"]]
+        if files[:len(self._loaded_segments)] != self._loaded_segments:
+            self._segments_frame = pd.DataFrame()
+            self._loaded_segments = []
+        new_frames = [
+            self._typed(pd.read_parquet(os.path.join(self.segment_dir, segment_file)))
+            for segment_file in files[len(self._loaded_segments):]
+        ]
+        new_frames = [frame for frame in new_frames if not frame.empty]
+        if new_frames:
+            if not self._segments_frame.empty:
+                new_frames.insert(0, self._segments_frame)
+            self._segments_frame = _concat(new_frames)
+        self._loaded_segments = files
+
+    def read(self):
+        """
+        Return every stored row as a single DataFrame. The frame is shared
+        between callers and must not be modified in place.
+        """
+        with span("store_read", dataset=self.name):
+            # Taken before self._lock; the file lock is never waited on while holding it.
+            version, manifest, wal_df, _ = self._refresh_state()
+            with self._lock:
+                # A thread holding an older snapshot keeps the newer frame.
+                if self._cache_key is None or version > self._cache_key:
+                    self._refresh_segments(manifest)
+                    frames = [frame for frame in (self._segments_frame, wal_df) if not frame.empty]
+                    if not frames:
+                        df = pd.DataFrame(columns=manifest["columns"])
+                    elif len(frames) == 1:
+                        df = frames[0]
+                    else:
+                        df = _concat(frames)
+                    columns = self._merge_columns(manifest["columns"], df.columns)
+                    if columns != list(df.columns):
+                        df = df.reindex(columns=columns)
+                    self._cache_key = version
+                    self._cache = df
+                return self._cache
+
+    def iter_chunks(self, chunk_rows=IMPORT_CHUNK_ROWS):
+        """Yield the stored rows as DataFrames of at most chunk_rows rows each."""
+        _, manifest, wal_df, _ = self._refresh_state()
+        columns = self._merge_columns(manifest["columns"], wal_df.columns)
+        for segment in manifest["segments"]:
+            parquet_file = pq.ParquetFile(os.path.join(self.segment_dir, segment["file"]))
+            for batch in parquet_file.iter_batches(batch_size=chunk_rows):
+                yield self._typed(batch.to_pandas().reindex(columns=columns))
+        for start in range(0, len(wal_df), chunk_rows):
+            yield wal_df.iloc[start:start + chunk_rows].reindex(columns=columns)
+
+    # --- Queries ---
+    def query(self, columns=None, filters=()):
+        """
+        Rows matching every filter, with only the given columns (all when
+        None). Filters are (column, op, value) tuples with op one of ==, !=,
+        <, <=, >, >=, in and not in; dates may be given as datetime.date.
+        Results are cached until the next commit, shared between callers
+        and must not be modified in place.
+        """
+        filters = _normalize_filters(filters)
+        version, manifest, wal_df, _ = self._refresh_state()
+        if columns is None:
+            columns = self._merge_columns(manifest["columns"], wal_df.columns)
+        key = (version, tuple(columns), filters)
+        with self._lock:
+            result = self._queries.get(key)
+        if result is not None:
+            return result
+        with span("store_query", dataset=self.name):
+            needed = self._merge_columns(columns, [column for column, _, _ in filters])
+            pieces = []
+            for segment in manifest["segments"]:
+                segment_path = os.path.join(self.segment_dir, segment["file"])
+                schema = pq.read_schema(segment_path)
+                pushed = [
+                    (column, op, value) for column, op, value in filters
+                    if column in schema.names and _pushable(schema.field(column).type, value)
+                ]
+                table = pq.read_table(segment_path, columns=[column for column in needed if column in schema.names],
+                                      filters=pushed or None)
+                if table.num_rows:
+                    pieces.append(self._typed(table.to_pandas().reindex(columns=needed)))
+            if len(wal_df):
+                pieces.append(wal_df.reindex(columns=needed))
+            pieces = [piece[_filter_mask(piece, filters)] for piece in pieces]
+            pieces = [piece for piece in pieces if len(piece)]
+            if pieces:
+                result = _concat(pieces)[list(columns)]
+            else:
+                result = self._typed(pd.DataFrame(columns=list(columns)))
+        with self._lock:
+            self._queries = {k: v for k, v in self._queries.items() if k[0] == version}
+            if len(self._queries) >= QUERY_CACHE_SIZE:
+                self._queries.pop(next(iter(self._queries)))
+            self._queries[key] = result
+        return result
+
+    # --- Row-offset access ---
+    def _segment_offsets(self, manifest):
+        """(first row, segment file, rows) for each segment, in store order."""
+        offsets = []
+        start = 0
+        for segment in manifest["segments"]:
+            offsets.append((start, segment["file"], segment["rows"]))
+            start += segment["rows"]
+        return offsets, start
+
+    def take(self, positions):
+        """
+        Fetch rows by global row position, reading only the Parquet row
+        groups that contain them. Rows come back in the order requested.
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        _, manifest, wal_df, _ = self._refresh_state()
+        columns = self._merge_columns(manifest["columns"], wal_df.columns)
+        offsets, segment_total = self._segment_offsets(manifest)
+        # Each row group (and the buffer) is sliced once, in store order; the
+        # rows are put into the requested order with a single iloc at the end.
+        wanted = np.unique(positions)
+        pieces = []
+        for start, segment_file, rows in offsets:
+            in_segment = wanted[(wanted >= start) & (wanted < start + rows)]
+            if not len(in_segment):
+                continue
+            parquet_file = pq.ParquetFile(os.path.join(self.segment_dir, segment_file))
+            group_starts = np.cumsum([0] + [parquet_file.metadata.row_group(i).num_rows
+                                            for i in range(parquet_file.num_row_groups)])
+            local = in_segment - start
+            groups = np.searchsorted(group_starts, local, side="right") - 1
+            for group in np.unique(groups):
+                group_df = parquet_file.read_row_group(int(group)).to_pandas()
+                pieces.append(group_df.iloc[local[groups == group] - group_starts[group]])
+        wal_positions = wanted[(wanted >= segment_total) & (wanted < segment_total + len(wal_df))] - segment_total
+        if len(wal_positions):
+            pieces.append(wal_df.iloc[wal_positions])
+        found = wanted[(wanted >= 0) & (wanted < segment_total + len(wal_df))]
+        present = positions[np.isin(positions, found)]
+        if not len(present):
+            return pd.DataFrame(columns=columns)
+        page = pd.concat(pieces, ignore_index=True) if len(pieces) > 1 else pieces[0].reset_index(drop=True)
+        page = page.iloc[np.searchsorted(found, present)].reset_index(drop=True)
+        return self._typed(page.reindex(columns=columns))
+
+    def read_range(self, start, stop=None):
+        """
+        Rows from global position start up to stop (the end when None), read
+        a whole row group at a time. Used to catch up on rows committed since
+        a derived structure last saw the store.
+        """
+        _, manifest, wal_df, row_count = self._refresh_state()
+        stop = row_count if stop is None else min(stop, row_count)
+        columns = self._merge_columns(manifest["columns"], wal_df.columns)
+        offsets, segment_total = self._segment_offsets(manifest)
+        pieces = []
+        for segment_start, segment_file, rows in offsets:
+            if segment_start + rows <= start or segment_start >= stop:
+                continue
+            parquet_file = pq.ParquetFile(os.path.join(self.segment_dir, segment_file))
+            group_start = segment_start
+            for group in range(parquet_file.num_row_groups):
+                group_rows = parquet_file.metadata.row_group(group).num_rows
+                if group_start + group_rows > start and group_start < stop:
+                    group_df = parquet_file.read_row_group(group).to_pandas()
+                    pieces.append(group_df.iloc[max(start - group_start, 0):stop - group_start])
+                group_start += group_rows
+        if stop > segment_total:
+            pieces.append(wal_df.iloc[max(start - segment_total, 0):stop - segment_total])
+        pieces = [piece for piece in pieces if len(piece)]
+        if not pieces:
+            return self._typed(pd.DataFrame(columns=columns))
+        page = pd.concat(pieces, ignore_index=True) if len(pieces) > 1 else pieces[0].reset_index(drop=True)
+        return self._typed(page.reindex(columns=columns))
+
+    def column(self, name):
+        """Read a single column across all segments and the buffer."""
+        _, manifest, wal_df, _ = self._refresh_state()
+        parts = []
+        for segment in manifest["segments"]:
+            segment_path = os.path.join(self.segment_dir, segment["file"])
+            if name in pq.read_schema(segment_path).names:
+                parts.append(pd.read_parquet(segment_path, columns=[name])[name])
+            else:
+                parts.append(pd.Series([None] * segment["rows"], dtype=object))
+        if len(wal_df):
+            parts.append(wal_df[name] if name in wal_df.columns else pd.Series([None] * len(wal_df), dtype=object))
+        if not parts:
+            return pd.Series(dtype=object, name=name)
+        return self._typed(pd.concat(parts, ignore_index=True).rename(name).to_frame())[name]
+
+    def _sort_order(self, column, ascending):
+        key = (column, ascending, self.data_version())
+        order = self._sort_orders.get(key)
+        if order is None:
+            values = self.column(column)
+            try:
+                ranked = values.sort_values(ascending=ascending, kind="stable", na_position="last")
+            except TypeError:
+                ranked = values.astype(str).sort_values(ascending=ascending, kind="stable", na_position="last")
+            order = ranked.index.to_numpy()
+            # Only the latest order per column/direction is worth keeping.
+            self._sort_orders = {k: v for k, v in self._sort_orders.items() if k[:2] != key[:2]}
+            self._sort_orders[key] = order
+        return order
+
+    def read_page(self, offset, limit, sort_by=None, ascending=True):
+        """One page of rows, optionally ordered by a column."""
+        if sort_by:
+            positions = self._sort_order(sort_by, ascending)[offset:offset + limit]
+        else:
+            positions = np.arange(offset, min(offset + limit, self.row_count()))
+        return self.take(positions)
+
+    def data_version(self):
+        """
+        The shared version counter as of the last refresh. It increases with
+        every commit by any process and never repeats.
+        """
+        return self._refresh_state()[0]
+
+    def committed_version(self):
+        """
+        The shared version counter read directly, without refreshing or
+        taking the file lock, so it never waits for a writer in progress.
+        """
+        return self._version.value()
+
+    def row_count(self):
+        return self._refresh_state()[3]
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def open_store(name, root=STORE_DIR):
+    """
+    Returns the process-wide store for a dataset, importing its legacy CSV
+    the first time the store is opened.
+    """
+    key = (name, os.path.abspath(root))
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = SegmentStore(name, root, schema=DATASET_PLANS.get(name))
+            legacy_csv = DATASETS.get(name)
+            if legacy_csv:
+                store.import_csv(legacy_csv)
+            _stores[key] = store
+    return store
+
+
+def import_legacy_csvs(root=STORE_DIR):
+    for name, csv_path in DATASETS.items():
+        rows = SegmentStore(name, root, schema=DATASET_PLANS.get(name)).import_csv(csv_path)
+        print(f"{name}: imported {rows} rows from {csv_path}")
+
+
+if __name__ == "__main__":
+    import_legacy_csvs()
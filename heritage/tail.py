@@ -0,0 +1,101 @@
+"""
+Incremental readers for append-only files.
+
+A TailReader remembers how far into a file it has parsed together with the
+file's (size, mtime, inode) and a short fingerprint of the bytes just before
+that offset. Each read() only parses the complete lines appended since the
+previous call. If the file was truncated, replaced or rewritten in place the
+reader falls back to a full reload.
+"""
+import io
+import json
+import os
+
+import pandas as pd
+
+FINGERPRINT_BYTES = 64
+
+
+def _parse_jsonl(data, columns):
+    records = [json.loads(line) for line in data.splitlines() if line.strip()]
+    return pd.DataFrame(records)
+
+
+def _parse_csv(data, columns):
+    if not data.strip():
+        return pd.DataFrame(columns=columns)
+    if columns is None:
+        return pd.read_csv(io.BytesIO(data))
+    return pd.read_csv(io.BytesIO(data), header=None, names=columns)
+
+
+PARSERS = {"csv": _parse_csv, "jsonl": _parse_jsonl}
+
+
+class TailReader:
+    def __init__(self, path, fmt="csv"):
+        self.path = path
+        self.parse = PARSERS[fmt]
+        self.has_header = fmt == "csv"
+        self.full_reloads = 0
+        self._reset()
+
+    def _reset(self):
+        self.offset = 0
+        self.signature = None
+        self.columns = None
+        self.fingerprint = b""
+        self.frame = pd.DataFrame()
+
+    def _is_continuation(self, stat, f):
+        """True when the file still starts with the bytes already parsed."""
+        if self.signature is None:
+            return False
+        size, mtime, inode = self.signature
+        if stat.st_ino != inode or stat.st_size < self.offset:
+            return False
+        if stat.st_size == size and stat.st_mtime_ns != mtime:
+            return False
+        if self.fingerprint:
+            f.seek(self.offset - len(self.fingerprint))
+            return f.read(len(self.fingerprint)) == self.fingerprint
+        return True
+
+    def read(self):
+        """Return the whole file as a DataFrame, parsing only new rows."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self._reset()
+            return self.frame
+
+        signature = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+        if signature == self.signature:
+            return self.frame
+
+        with open(self.path, "rb") as f:
+            if not self._is_continuation(stat, f):
+                if self.signature is not None:
+                    self.full_reloads += 1
+                self._reset()
+            f.seek(self.offset)
+            data = f.read(stat.st_size - self.offset)
+            # Only consume complete lines; a partially written row is picked up next time.
+            data = data[:data.rfind(b"\n") + 1]
+            if data:
+                self.offset += len(data)
+                f.seek(max(self.offset - FINGERPRINT_BYTES, 0))
+                self.fingerprint = f.read(min(self.offset, FINGERPRINT_BYTES))
+
+        if data:
+            if self.has_header and self.columns is None:
+                header_end = data.find(b"\n") + 1
+                self.columns = list(pd.read_csv(io.BytesIO(data[:header_end])).columns.str.strip())
+                data = data[header_end:]
+            new_rows = self.parse(data, self.columns)
+            if self.frame.empty:
+                self.frame = new_rows
+            elif not new_rows.empty:
+                self.frame = pd.concat([self.frame, new_rows], ignore_index=True)
+        self.signature = signature
+        return self.frame
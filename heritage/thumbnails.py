@@ -0,0 +1,111 @@
+"""
+Thumbnail cache for the admin photo galleries.
+
+Each photo gets a small and a medium JPEG rendition, generated once and keyed
+by the SHA-256 of the photo's content, so renamed or duplicated photos share
+thumbnails. Renditions live under THUMBNAIL_DIR and are touched on every hit;
+when the cache grows past MAX_CACHE_BYTES the least recently used renditions
+are evicted.
+"""
+import hashlib
+import os
+import threading
+
+from heritage.storage import STORE_DIR
+
+THUMBNAIL_DIR = os.path.join(STORE_DIR, "thumbnails")
+RENDITIONS = {"small": 200, "medium": 800}
+THUMBNAIL_QUALITY = 80
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+
+_hash_cache = {}
+_cache_bytes = None
+_lock = threading.Lock()
+
+
+def content_hash(path):
+    """SHA-256 of a file, memoised on (path, size, mtime)."""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    digest = _hash_cache.get(key)
+    if digest is None:
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                sha.update(block)
+        digest = _hash_cache[key] = sha.hexdigest()
+    return digest
+
+
+def _rendition_path(digest, rendition):
+    return os.path.join(THUMBNAIL_DIR, digest[:2], f"{digest}_{rendition}.jpg")
+
+
+def _generate(path, digest):
+    """Writes every rendition of a photo and returns the bytes written."""
+    from PIL import Image, ImageOps
+    written = 0
+    with Image.open(path) as img:
+        largest = max(RENDITIONS.values())
+        # Lets the JPEG decoder skip straight to a reduced scale.
+        img.draft("RGB", (largest, largest))
+        img = ImageOps.exif_transpose(img).convert("RGB")
+        for rendition, size in sorted(RENDITIONS.items(), key=lambda item: -item[1]):
+            img.thumbnail((size, size))
+            target = _rendition_path(digest, rendition)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            tmp_path = f"{target}.{os.getpid()}.tmp"
+            img.save(tmp_path, "JPEG", quality=THUMBNAIL_QUALITY, optimize=True)
+            os.replace(tmp_path, target)
+            written += os.path.getsize(target)
+    return written
+
+
+def _scan_cache():
+    entries = []
+    for root, _, files in os.walk(THUMBNAIL_DIR):
+        for name in files:
+            file_path = os.path.join(root, name)
+            stat = os.stat(file_path)
+            entries.append((stat.st_mtime, stat.st_size, file_path))
+    return entries
+
+
+def _evict():
+    global _cache_bytes
+    entries = sorted(_scan_cache())
+    _cache_bytes = sum(size for _, size, _ in entries)
+    target = MAX_CACHE_BYTES * 0.9
+    for _, size, file_path in entries:
+        if _cache_bytes <= target:
+            break
+        try:
+            os.remove(file_path)
+            _cache_bytes -= size
+        except FileNotFoundError:
+            pass
+
+
+def get_thumbnail(path, rendition="small", digest=None):
+    """
+    Path of a cached rendition of the photo, generating it on first use.
+    Pass the digest when it is already known (blob store photos) to skip hashing.
+    """
+    global _cache_bytes
+    digest = digest or content_hash(path)
+    target = _rendition_path(digest, rendition)
+    try:
+        os.utime(target)
+        return target
+    except FileNotFoundError:
+        pass
+    with _lock:
+        if not os.path.exists(target):
+            written = _generate(path, digest)
+            if _cache_bytes is None:
+                _cache_bytes = sum(size for _, size, _ in _scan_cache())
+            else:
+                _cache_bytes += written
+            if _cache_bytes > MAX_CACHE_BYTES:
+                _evict()
+    return target
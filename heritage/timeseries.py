@@ -0,0 +1,191 @@
+"""
+Per-day activity counts for throughput trends on the dashboard.
+
+Each row's date is parsed once, when the row is first seen, into a
+datetime64[D] array. Counts are kept as one int32 matrix per grouping
+(surveyor or trainer, and HPC) with a row per key and a column per day,
+plus a total per day. New submissions are folded in from the store's tail
+and only widen the matrices when they bring new days or keys. Weekly
+(Monday-start) and monthly series are np.add.reduceat over the day axis,
+rolling averages are a cumulative-sum difference, and both are cached
+until the next batch arrives.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+from heritage.rollups import ROLLUP_SPECS
+from heritage.schema import parse_dates
+from heritage.storage import open_store
+
+# Per dataset: the date column and its format, and the columns counts are grouped by.
+TIMESERIES_SPECS = {
+    "snf": {"date": ROLLUP_SPECS["snf"]["date"], "groups": {"surveyor": "Surveyor Name", "hpc": "HPC Code"}},
+    "training": {"date": ROLLUP_SPECS["training"]["date"], "groups": {"trainer": "trainer", "hpc": "hpc_code"}},
+    "survey": {"date": ROLLUP_SPECS["survey"]["date"], "groups": {"surveyor": "Surveyor", "hpc": "HPC Code"}},
+}
+FREQUENCIES = {"Daily": "D", "Weekly": "W", "Monthly": "M"}
+TOTAL = "Total"
+
+# 1970-01-05, the first Monday after the epoch, is day 4.
+_MONDAY_OFFSET = 4
+
+
+def parse_days(values, date_format):
+    """Dates as datetime64[D], NaT where missing or unparseable."""
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return pd.Series(values).to_numpy(dtype="datetime64[D]")
+    return parse_dates(values, date_format).to_numpy(dtype="datetime64[D]")
+
+
+class _Counts:
+    """Counts per key (rows) and day (columns)."""
+
+    def __init__(self):
+        self.keys = []
+        self._key_index = {}
+        self.matrix = np.zeros((0, 0), dtype=np.int32)
+
+    def add(self, values, day_positions, width):
+        codes, uniques = pd.factorize(pd.Series(values, dtype="object"))
+        # Batch key -> matrix row; -1 for blanks, which are not counted.
+        rows = np.full(len(uniques) + 1, -1, dtype=np.int64)
+        for i, key in enumerate(uniques.tolist()):
+            key = str(key).strip()
+            if key:
+                if key not in self._key_index:
+                    self._key_index[key] = len(self.keys)
+                    self.keys.append(key)
+                rows[i] = self._key_index[key]
+        if len(self.keys) > self.matrix.shape[0]:
+            self.matrix = np.pad(self.matrix, ((0, len(self.keys) - self.matrix.shape[0]), (0, 0)))
+        key_positions = rows[codes]
+        valid = (key_positions >= 0) & (day_positions >= 0)
+        key_positions, day_positions = key_positions[valid], day_positions[valid]
+        cells = np.bincount(key_positions * width + day_positions, minlength=len(self.keys) * width)
+        self.matrix += cells.reshape(len(self.keys), width).astype(np.int32)
+
+
+class ActivitySeries:
+    def __init__(self, spec):
+        self.spec = spec
+        self.rows = 0
+        self.first_day = None
+        self.totals = np.zeros(0, dtype=np.int32)
+        self.groups = {name: _Counts() for name in spec["groups"]}
+        self._day_chunks = []
+        self._days = np.zeros(0, dtype="datetime64[D]")
+        self._cache = {}
+
+    @property
+    def width(self):
+        return len(self.totals)
+
+    def _extend(self, first, last):
+        """Widen the day axis to cover days first..last (days since the epoch)."""
+        if self.first_day is None:
+            self.first_day = first
+        before = max(self.first_day - first, 0)
+        after = max(last - self.first_day + 1 + before - self.width, 0)
+        if before or after:
+            self.totals = np.pad(self.totals, (before, after))
+            for counts in self.groups.values():
+                counts.matrix = np.pad(counts.matrix, ((0, 0), (before, after)))
+            self.first_day = min(self.first_day, first)
+
+    def apply(self, df):
+        date_column, date_format = self.spec["date"]
+        days = parse_days(df[date_column] if date_column in df.columns else [None] * len(df), date_format)
+        self._day_chunks.append(days)
+        self.rows += len(df)
+        self._cache.clear()
+        dated = ~np.isnat(days)
+        if not dated.any():
+            return
+        day_numbers = days.astype(np.int64)
+        self._extend(int(day_numbers[dated].min()), int(day_numbers[dated].max()))
+        positions = np.where(dated, day_numbers - self.first_day, -1)
+        self.totals += np.bincount(positions[dated], minlength=self.width).astype(np.int32)
+        for name, column in self.spec["groups"].items():
+            values = df[column] if column in df.columns else [None] * len(df)
+            self.groups[name].add(values, positions, self.width)
+
+    def row_days(self):
+        """The parsed date of every row, in store order."""
+        if self._day_chunks:
+            self._days = np.concatenate([self._days] + self._day_chunks)
+            self._day_chunks = []
+        return self._days
+
+    def keys(self, group):
+        """A group's keys, busiest first."""
+        counts = self.groups[group]
+        order = np.argsort(-counts.matrix.sum(axis=1), kind="stable")
+        return [counts.keys[i] for i in order]
+
+    def _resample(self, matrix, freq):
+        """(period start dates, counts per period) for the columns of a day matrix."""
+        day_numbers = self.first_day + np.arange(self.width)
+        if freq == "D":
+            return day_numbers.astype("datetime64[D]"), matrix
+        if freq == "W":
+            periods = (day_numbers - _MONDAY_OFFSET) // 7
+        elif freq == "M":
+            periods = day_numbers.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+        else:
+            raise ValueError(f"Unknown frequency: {freq}")
+        starts = np.flatnonzero(np.r_[True, periods[1:] != periods[:-1]])
+        if freq == "W":
+            labels = (periods[starts] * 7 + _MONDAY_OFFSET).astype("datetime64[D]")
+        else:
+            labels = periods[starts].astype("datetime64[M]").astype("datetime64[D]")
+        return labels, np.add.reduceat(matrix, starts, axis=-1)
+
+    def series(self, group=None, freq="D", window=1, top=None):
+        """
+        Counts per period (D, W or M) as a frame indexed by period start,
+        with a column per key of the group (busiest first, at most top) or a
+        single Total column. A window above 1 gives the rolling mean over
+        that many periods, averaging fewer at the start of the series.
+        """
+        key = (group, freq, window, top)
+        frame = self._cache.get(key)
+        if frame is not None:
+            return frame
+        if self.first_day is None:
+            return pd.DataFrame()
+        if group is None:
+            names, matrix = [TOTAL], self.totals[np.newaxis, :]
+        else:
+            names = self.keys(group)[:top]
+            counts = self.groups[group]
+            matrix = counts.matrix[[counts._key_index[name] for name in names]]
+        labels, values = self._resample(matrix, freq)
+        values = values.astype(np.float64)
+        if window > 1:
+            cumulative = np.cumsum(np.pad(values, ((0, 0), (1, 0))), axis=1)
+            ends = np.arange(1, values.shape[1] + 1)
+            starts = np.maximum(ends - window, 0)
+            values = (cumulative[:, ends] - cumulative[:, starts]) / (ends - starts)
+        frame = self._cache[key] = pd.DataFrame(values.T, index=pd.DatetimeIndex(labels, name="Date"), columns=names)
+        return frame
+
+
+_series = {}
+_lock = threading.Lock()
+
+
+def get_activity_series(dataset):
+    """The dataset's process-wide series, folding in rows committed since the last call."""
+    with _lock:
+        store = open_store(dataset)
+        row_count = store.row_count()
+        series = _series.get(dataset)
+        if series is None or series.rows > row_count:
+            series = _series[dataset] = ActivitySeries(TIMESERIES_SPECS[dataset])
+            if row_count:
+                series.apply(store.read())
+        elif series.rows < row_count:
+            series.apply(store.read_range(series.rows, row_count))
+        return series
@@ -0,0 +1,104 @@
+"""
+Server warm-up: import the heavy libraries and prime the process-wide data
+caches (stores, rollups, hierarchy, trends, admin filter indexes,
+discrepancies, farmer registry) before the first visitor arrives, so no
+session pays for them.
+
+    python -m heritage.warmup Main.py [streamlit options]
+
+warms the current process and then runs `streamlit run Main.py ...` in it.
+A step that fails is reported and skipped; the server starts regardless.
+"""
+import importlib
+import sys
+import time
+
+from heritage.metrics import span
+
+# Imported by the pages only inside the sections that need them.
+MODULES = ["pandas", "pyarrow.parquet", "plotly.express", "PIL.Image", "xlsxwriter"]
+
+
+def _prime_stores():
+    from heritage.storage import DATASETS, open_store
+    for dataset in DATASETS:
+        # Opening imports any legacy CSV; the steps below read what they need.
+        open_store(dataset).row_count()
+
+
+def _prime_rollups():
+    from heritage.rollups import get_rollups
+    from heritage.storage import DATASETS
+    for dataset in DATASETS:
+        get_rollups(dataset)
+
+
+def _prime_hierarchy():
+    from heritage.hierarchy import HIERARCHY_SPECS, get_hierarchy
+    for dataset in HIERARCHY_SPECS:
+        get_hierarchy(dataset)
+
+
+def _prime_timeseries():
+    from heritage.timeseries import TIMESERIES_SPECS, get_activity_series
+    for dataset in TIMESERIES_SPECS:
+        get_activity_series(dataset)
+
+
+def _prime_indexes():
+    from heritage.indexes import INDEX_SPECS, get_index
+    for dataset in INDEX_SPECS:
+        get_index(dataset)
+
+
+def _prime_discrepancies():
+    from heritage.discrepancies import get_discrepancies
+    get_discrepancies()
+
+
+def _prime_farmers():
+    from heritage.farmers import get_farmer_registry
+    get_farmer_registry()
+
+
+STEPS = {
+    "stores": _prime_stores,
+    "rollups": _prime_rollups,
+    "hierarchy": _prime_hierarchy,
+    "timeseries": _prime_timeseries,
+    "indexes": _prime_indexes,
+    "discrepancies": _prime_discrepancies,
+    "farmers": _prime_farmers,
+}
+
+
+def warm_up():
+    """Run every warm-up step and return the seconds each took."""
+    seconds = {}
+    for module in MODULES:
+        start = time.perf_counter()
+        with span("warm_up", step=module):
+            importlib.import_module(module)
+        seconds[f"import.{module}"] = round(time.perf_counter() - start, 4)
+    for name, step in STEPS.items():
+        start = time.perf_counter()
+        try:
+            with span("warm_up", step=name):
+                step()
+        except Exception as e:
+            print(f"warm-up step {name} failed: {e}", file=sys.stderr)
+        seconds[name] = round(time.perf_counter() - start, 4)
+    return seconds
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    seconds = warm_up()
+    print("warmed up in " + ", ".join(f"{name}={value}s" for name, value in seconds.items()), file=sys.stderr)
+    from streamlit.web import cli
+    sys.argv = ["streamlit", "run", *argv]
+    sys.exit(cli.main())
+
+
+if __name__ == "__main__":
+    main()
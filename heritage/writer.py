@@ -0,0 +1,153 @@
+"""
+Single-writer submission log with group commit.
+
+Every page hands its final submission to submit(). Submissions are queued to
+one writer thread per process, which drains whatever has queued up while the
+previous batch was being written and commits each dataset's share of the
+batch with a single append and a single fsync. submit() returns only after
+the record is durable, with the record ID that was written alongside it.
+
+A queued batch is always committed, even if its submitter stops waiting.
+submit_many() therefore waits for the commit however long it takes, and a
+submit() that gives up after SUBMIT_TIMEOUT raises SubmissionPending rather
+than a plain error, so nobody retries a write that is still going to land.
+"""
+import queue
+import threading
+import uuid
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from heritage.forms import DATASET_PLANS
+from heritage.hierarchy import update_hierarchy
+from heritage.indexes import update_indexes
+from heritage.metrics import span
+from heritage.rollups import update_rollups
+from heritage.storage import open_store
+
+MAX_BATCH_RECORDS = 1000
+GROUP_COMMIT_WAIT = 0.002
+SUBMIT_TIMEOUT = 30
+
+
+class SubmissionPending(TimeoutError):
+    """The write is still queued and will be committed; resubmitting would duplicate it."""
+
+    def __init__(self, dataset, record_ids):
+        super().__init__(
+            f"{len(record_ids)} {dataset} record(s) are still being saved and will be "
+            "committed shortly; do not submit them again."
+        )
+        self.dataset = dataset
+        self.record_ids = record_ids
+
+
+def new_record_id():
+    return uuid.uuid4().hex
+
+
+class SubmissionWriter:
+    def __init__(self, max_batch=MAX_BATCH_RECORDS, group_wait=GROUP_COMMIT_WAIT):
+        self.max_batch = max_batch
+        self.group_wait = group_wait
+        self.batches_committed = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="submission-writer", daemon=True)
+        self._thread.start()
+
+    def submit_many(self, dataset, records, timeout=None):
+        """
+        Durably append records to a dataset and return their record IDs.
+        With a timeout, raises SubmissionPending if the batch is not committed in time.
+        """
+        records = [{"record_id": new_record_id(), **record} for record in records]
+        plan = DATASET_PLANS.get(dataset)
+        if plan is not None:
+            records = [plan.normalize_record(record) for record in records]
+        future = Future()
+        with span("submit_write", dataset=dataset):
+            self._queue.put((dataset, records, future))
+            try:
+                future.result(timeout=timeout)
+            except FutureTimeoutError:
+                raise SubmissionPending(dataset, [record["record_id"] for record in records]) from None
+        return [record["record_id"] for record in records]
+
+    def submit(self, dataset, record, timeout=SUBMIT_TIMEOUT):
+        return self.submit_many(dataset, [record], timeout=timeout)[0]
+
+    def _collect_batch(self):
+        batch = [self._queue.get()]
+        pending = len(batch[0][1])
+        while pending < self.max_batch:
+            try:
+                item = self._queue.get(timeout=self.group_wait)
+            except queue.Empty:
+                break
+            batch.append(item)
+            pending += len(item[1])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            by_dataset = {}
+            for dataset, records, future in batch:
+                by_dataset.setdefault(dataset, []).append((records, future))
+            for dataset, items in by_dataset.items():
+                try:
+                    self._commit(dataset, items)
+                except Exception as e:
+                    # Nothing may stop the writer thread: every later submission would wait forever.
+                    for _, future in items:
+                        if not future.done():
+                            future.set_exception(e)
+            self.batches_committed += 1
+
+    def _commit(self, dataset, items):
+        committed = [record for records, _ in items for record in records]
+        try:
+            store = open_store(dataset)
+            with store.write_lock():
+                with span("wal_append", dataset=dataset):
+                    store.append(committed)
+                # In the commit's critical section, so a dashboard read never
+                # finds rows the saved rollup has not counted yet.
+                try:
+                    update_rollups(dataset, committed)
+                except Exception:
+                    # Readers notice the row-count drift and rebuild.
+                    pass
+        except Exception as e:
+            for _, future in items:
+                future.set_exception(e)
+            return
+        for _, future in items:
+            future.set_result(None)
+        try:
+            update_hierarchy(dataset, committed)
+            update_indexes(dataset, committed)
+        except Exception:
+            # The hierarchy and indexes notice the row-count drift and catch up on next read.
+            pass
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = SubmissionWriter()
+    return _writer
+
+
+def submit(dataset, record):
+    """Durably record one submission and return its record ID."""
+    return get_writer().submit(dataset, record)
+
+
+def submit_many(dataset, records):
+    return get_writer().submit_many(dataset, records)
@@ -0,0 +1,82 @@
+import streamlit as st
+from heritage.bulk_import import IMPORT_TARGETS, commit_import, prepare_import, read_upload
+
+st.set_page_config(page_title="Bulk Import", layout="wide")
+
+ADMIN_EMAILS = [
+    "mkaushal@tns.org",
+    "vknikhitha@tns.org",
+    "rsomanchi@tns.org",
+    "gmreddy@tns.org",
+    "ksuneha@tns.org",
+    "kbalaji@tns.org"
+]
+
+REJECTED_PREVIEW_ROWS = 1000
+
+if 'bulk_import_email' not in st.session_state:
+    st.session_state.bulk_import_email = ""
+if 'bulk_import_result' not in st.session_state:
+    st.session_state.bulk_import_result = None
+
+st.title("Bulk Import")
+st.write("Upload surveys or trainings collected offline (CSV or Excel). Column headers may use either the form labels or the field names.")
+
+email_input = st.text_input("Enter admin email", value=st.session_state.bulk_import_email, key="bulk_import_email_input").strip()
+if email_input != st.session_state.bulk_import_email:
+    st.session_state.bulk_import_email = email_input
+    st.rerun()
+
+if st.session_state.bulk_import_email not in ADMIN_EMAILS:
+    st.warning("Enter an admin email for access to bulk import.")
+    st.stop()
+
+target = st.selectbox("Import into", list(IMPORT_TARGETS), key="bulk_import_target")
+uploaded_file = st.file_uploader("Upload file", type=["csv", "xlsx"], key="bulk_import_file")
+
+if uploaded_file is not None:
+    upload_key = (target, uploaded_file.name, uploaded_file.size)
+    prepared = st.session_state.bulk_import_result
+    if prepared is None or prepared["upload_key"] != upload_key:
+        try:
+            with st.spinner("Validating rows..."):
+                prepared = prepare_import(target, read_upload(uploaded_file))
+        except Exception as e:
+            st.error(f"Could not read {uploaded_file.name}: {e}")
+            st.stop()
+        prepared["upload_key"] = upload_key
+        prepared["committed"] = False
+        st.session_state.bulk_import_result = prepared
+
+    accepted = prepared["accepted"]
+    rejected = prepared["rejected"]
+
+    st.subheader("Column Mapping")
+    st.write(f"**Matched columns:** {len(prepared['mapping'])}")
+    if prepared["unmatched"]:
+        st.warning(f"Ignored columns (no matching field): {', '.join(prepared['unmatched'])}")
+
+    col1, col2 = st.columns(2)
+    col1.metric("Rows accepted", len(accepted))
+    col2.metric("Rows rejected", len(rejected))
+
+    if not rejected.empty:
+        st.subheader("Rejected Rows")
+        st.dataframe(rejected.head(REJECTED_PREVIEW_ROWS), use_container_width=True)
+        if len(rejected) > REJECTED_PREVIEW_ROWS:
+            st.caption(f"Showing the first {REJECTED_PREVIEW_ROWS} of {len(rejected)} rejected rows.")
+        st.download_button(
+            "Download Rejected Rows (CSV)",
+            rejected.to_csv(index=False).encode('utf-8'),
+            "rejected_rows.csv",
+            "text/csv",
+            key="download_rejected_rows"
+        )
+
+    if prepared["committed"]:
+        st.success(f"Imported {len(accepted)} rows.")
+    elif not accepted.empty and st.button(f"Import {len(accepted)} Accepted Rows", key="commit_bulk_import"):
+        with st.spinner("Importing..."):
+            record_ids = commit_import(target, accepted, email=st.session_state.bulk_import_email)
+        prepared["committed"] = True
+        st.success(f"Imported {len(record_ids)} rows.")
@@ -0,0 +1,70 @@
+import streamlit as st
+import pandas as pd
+from heritage import metrics
+
+st.set_page_config(page_title="Performance", layout="wide")
+
+ADMIN_EMAILS = [
+    "mkaushal@tns.org",
+    "vknikhitha@tns.org",
+    "rsomanchi@tns.org",
+    "gmreddy@tns.org",
+    "ksuneha@tns.org",
+    "kbalaji@tns.org"
+]
+
+if 'performance_email' not in st.session_state:
+    st.session_state.performance_email = ""
+
+st.title("Performance")
+st.write("Timings of the expensive page sections recorded by this server process since it started.")
+
+email_input = st.text_input("Enter admin email", value=st.session_state.performance_email, key="performance_email_input").strip()
+if email_input != st.session_state.performance_email:
+    st.session_state.performance_email = email_input
+    st.rerun()
+
+if st.session_state.performance_email not in ADMIN_EMAILS:
+    st.warning("Enter an admin email for access to the performance panel.")
+    st.stop()
+
+if not metrics.ENABLED:
+    st.info("Metrics are disabled. Start the app with HERITAGE_METRICS=1 to record timings.")
+    st.stop()
+
+snapshot = pd.DataFrame(metrics.registry.snapshot())
+if snapshot.empty:
+    st.info("No timings recorded yet. Use the other pages and come back.")
+    st.stop()
+
+st.subheader("Section Timings (ms)")
+timings = snapshot[snapshot["metric"] == "seconds"].drop(columns="metric")
+for column in ["total", "mean", "p50", "p95", "max"]:
+    timings[column] = (timings[column] * 1000).round(1)
+st.dataframe(timings.sort_values("total", ascending=False), use_container_width=True)
+
+sizes = snapshot[snapshot["metric"] == "bytes"].drop(columns="metric")
+if not sizes.empty:
+    st.subheader("Payload Sizes (KB)")
+    for column in ["total", "mean", "p50", "p95", "max"]:
+        sizes[column] = (sizes[column] / 1024).round(1)
+    st.dataframe(sizes, use_container_width=True)
+
+st.subheader("Recent Samples")
+recent = pd.DataFrame(metrics.registry.recent(), columns=["time", "span", "labels", "seconds"])
+recent["time"] = pd.to_datetime(recent["time"], unit="s")
+recent["ms"] = recent["seconds"] * 1000
+
+import plotly.express as px
+fig_recent = px.scatter(recent, x="time", y="ms", color="span", log_y=True, title="Section durations", template="streamlit")
+st.plotly_chart(fig_recent, use_container_width=True)
+
+st.subheader("Export")
+if metrics.METRICS_FILE:
+    st.write(f"Prometheus metrics are written to: `{metrics.METRICS_FILE}`")
+if metrics.METRICS_PORT:
+    st.write(f"Prometheus metrics are served on: `http://127.0.0.1:{metrics.METRICS_PORT}/metrics`")
+st.download_button("Download Metrics (Prometheus text)", metrics.registry.render_prometheus(), "heritage_metrics.prom", "text/plain")
+if st.button("Reset Metrics", key="reset_metrics"):
+    metrics.registry.reset()
+    st.rerun()
@@ -1,10 +1,18 @@
 import streamlit as st
 import pandas as pd
 import os
-import zipfile
 from io import BytesIO
 import datetime
-from PIL import Image
+from heritage.forms import FORM_FIELDS_MAP, SNF_PLAN
+from heritage.storage import open_store
+from heritage.writer import SubmissionPending, submit
+from heritage.archive import get_archive
+from heritage.blobs import get_blob_store
+from heritage.exports import cached_csv_export, csv_export, deferred_export
+from heritage.discrepancies import RULE_DESCRIPTIONS, RULE_NAMES, get_discrepancies
+from heritage.indexes import get_index
+from heritage.metrics import span
+from heritage.thumbnails import get_thumbnail
 
 st.set_page_config(
     page_title="SNF Follow-up Survey App",
@@ -14,10 +22,9 @@ st.set_page_config(
 
 st.title("SNF Follow-up Survey")
 
-PHOTOS_DIR = "photos"
-RESPONSES_CSV = "responses.csv"
-
-os.makedirs(PHOTOS_DIR, exist_ok=True)
+DATASET = "snf"
+PHOTO_COLLECTION = "snf"
+PHOTO_EXTENSIONS = ('.png', '.jpg', '.jpeg')
 
 ADMIN_EMAILS = [
     "mkaushal@tns.org",
@@ -40,8 +47,14 @@ if 'validation_errors' not in st.session_state:
     st.session_state.validation_errors = []
 if 'just_submitted' not in st.session_state:
     st.session_state.just_submitted = False
-if 'all_responses' not in st.session_state:
-    st.session_state.all_responses = []
+if 'viewing_photo' not in st.session_state:
+    st.session_state.viewing_photo = None
+if 'last_record_id' not in st.session_state:
+    st.session_state.last_record_id = None
+if 'submission_pending' not in st.session_state:
+    st.session_state.submission_pending = False
+
+RESPONSES_PAGE_SIZE = 50
 
 def get_field_value(key, default=""):
     return st.session_state.form_data.get(key, default)
@@ -49,108 +62,131 @@ def get_field_value(key, default=""):
 def set_field_value(key, value):
     st.session_state.form_data[key] = value
 
-FORM_FIELDS_MAP = {
-    "surveyor_name": {"label": "Surveyor Name", "widget": "selectbox", "options": ["Guru", "Balaji"]},
-    "date_of_visit": {"label": "Date of Visit (DD-MM-YYYY)", "widget": "text_input", "validation": "date"},
-    "hpc_code": {"label": "HPC Code", "widget": "text_input"},
-    "hpc_name": {"label": "HPC Name", "widget": "text_input"},
-    "farmer_name": {"label": "Farmer Name", "widget": "text_input"},
-    "farmer_code": {"label": "Farmer Code", "widget": "text_input"},
-    "gender": {"label": "Gender", "widget": "selectbox", "options": ["Male", "Female", "Other"]},
-    "fat_list": {"label": "Fat in the list (%)", "widget": "text_input", "validation": "numeric"},
-    "snf_list": {"label": "SNF in the list (%)", "widget": "text_input", "validation": "numeric"},
-    "vol_list": {"label": "Vol in the list (LPD)", "widget": "text_input", "validation": "numeric"},
-    "as_on_date_fat": {"label": "Fat in the farmer slip (%)", "widget": "text_input", "validation": "numeric"},
-    "as_on_date_snf": {"label": "SNF in the farmer slip (%)", "widget": "text_input", "validation": "numeric"},
-    "as_on_date_vol": {"label": "Vol in the farmer slip (LPD)", "widget": "text_input", "validation": "numeric"},
-    "number_of_cows": {"label": "Total Number of Cows", "widget": "text_input", "validation": "numeric"},
-    "jersey_cross": {"label": "Jersey /Cross (Count)", "widget": "text_input", "validation": "numeric"},
-    "hf_cross": {"label": "HF/Cross (Count)", "widget": "text_input", "validation": "numeric"},
-    "jersey_milk": {"label": "No. of Jersey cows in milk", "widget": "text_input", "validation": "numeric"},
-    "jersey_vol_lpd": {"label": "Vol-LPD (Jersey Cows)", "widget": "text_input", "validation": "numeric"},
-    "jersey_fat": {"label": "Fat (Jersey Cows) (%)", "widget": "text_input", "validation": "numeric"},
-    "jersey_snf": {"label": "SNF (Jersey Cows) (%)", "widget": "text_input", "validation": "numeric"},
-    "hf_milk": {"label": "No. of HF cows in milk", "widget": "text_input", "validation": "numeric"},
-    "hf_vol_lpd": {"label": "Vol-LPD (HF Cows)", "widget": "text_input", "validation": "numeric"},
-    "hf_fat": {"label": "Fat (HF Cows) (%)", "widget": "text_input", "validation": "numeric"},
-    "hf_snf": {"label": "SNF (HF Cows) (%)", "widget": "text_input", "validation": "numeric"},
-    "desi_milk": {"label": "No. of Desi cows in milk", "widget": "text_input", "validation": "numeric"},
-    "desi_vol_lpd": {"label": "Vol-LPD (Desi Cows)", "widget": "text_input", "validation": "numeric"},
-    "desi_fat": {"label": "Fat (Desi Cows) (%)", "widget": "text_input", "validation": "numeric"},
-    "desi_snf": {"label": "SNF (Desi Cows) (%)", "widget": "text_input", "validation": "numeric"},
-    "buffalo_milk": {"label": "No. of Buffalo in milk", "widget": "text_input", "validation": "numeric"},
-    "buffalo_vol_lpd": {"label": "Vol-LPD (Buffalo)", "widget": "text_input", "validation": "numeric"},
-    "green_fodder": {"label": "Green Fodder Available?", "widget": "selectbox", "options": ["Yes", "No"]},
-    "green_fodder_type": {"label": "Type of Green Fodder (if Yes)", "widget": "text_input", "conditional_required_if": {"field": "green_fodder", "value": "Yes"}},
-    "green_fodder_qty": {"label": "Quantity of Green Fodder (Kg/day)", "widget": "text_input", "validation": "numeric", "conditional_required_if": {"field": "green_fodder", "value": "Yes"}},
-    "dry_fodder": {"label": "Dry Fodder Available?", "widget": "selectbox", "options": ["Yes", "No"]},
-    "dry_fodder_type": {"label": "Type of Dry Fodder (if Yes)", "widget": "text_input", "conditional_required_if": {"field": "dry_fodder", "value": "Yes"}},
-    "dry_fodder_qty": {"label": "Quantity of Dry Fodder (Kg/day)", "widget": "text_input", "validation": "numeric", "conditional_required_if": {"field": "dry_fodder", "value": "Yes"}},
-    "pellet_feed": {"label": "Pellet Feed Used?", "widget": "selectbox", "options": ["Yes", "No"]},
-    "heritage_feed": {"label": "If Yes, Heritage Feed (Yes/No)", "widget": "text_input", "conditional_required_if": {"field": "pellet_feed", "value": "Yes"}},
-    "feed_variant": {"label": "If Yes, Mention the Feed Variant", "widget": "text_input", "conditional_required_if": {"field": "pellet_feed", "value": "Yes"}},
-    "feed_brand": {"label": "If No, Mention the Feed Brand", "widget": "text_input", "conditional_required_if": {"field": "pellet_feed", "value": "No"}},
-    "pellet_qty": {"label": "Quantity of Pellet Feed (Kg/day)", "widget": "text_input", "validation": "numeric", "conditional_required_if": {"field": "pellet_feed", "value": "Yes"}},
-    "mineral_mix": {"label": "Mineral Mixture Used?", "widget": "selectbox", "options": ["Yes", "No"]},
-    "mineral_mix_brand": {"label": "Mineral Mixture Brand (if Yes)", "widget": "text_input", "conditional_required_if": {"field": "mineral_mix", "value": "Yes"}},
-    "mineral_mix_qty": {"label": "Quantity of Mineral Mixture (gm/day)", "widget": "text_input", "validation": "numeric", "conditional_required_if": {"field": "mineral_mix", "value": "Yes"}},
-    "key_insights": {"label": "Key Insights/Observations", "widget": "text_area"},
-}
-
 def validate_form_data():
-    st.session_state.validation_errors = []
-    data = st.session_state.form_data
-    general_required_fields = [
-        "surveyor_name", "date_of_visit", "hpc_code", "hpc_name", "farmer_name", "farmer_code", "gender",
-        "green_fodder", "dry_fodder", "pellet_feed", "mineral_mix"
-    ]
-    for key in general_required_fields:
-        if not data.get(key):
-            st.session_state.validation_errors.append(f"'{FORM_FIELDS_MAP[key]['label']}' is a required field.")
-    for key, details in FORM_FIELDS_MAP.items():
-        if details.get("validation") == "numeric":
-            value = data.get(key)
-            if value:
-                try:
-                    num_val = float(value)
-                    if num_val < 0:
-                        st.session_state.validation_errors.append(f"'{details['label']}' must be a non-negative number.")
-                except ValueError:
-                    st.session_state.validation_errors.append(f"'{details['label']}' must be a valid number.")
-    date_str = data.get("date_of_visit")
-    if date_str:
-        try:
-            datetime.datetime.strptime(date_str, "%d-%m-%Y")
-        except ValueError:
-            st.session_state.validation_errors.append("Date of Visit must be in DD-MM-YYYY format.")
-    for key, details in FORM_FIELDS_MAP.items():
-        if "conditional_required_if" in details:
-            condition = details["conditional_required_if"]
-            if data.get(condition["field"]) == condition["value"]:
-                if not data.get(key):
-                    st.session_state.validation_errors.append(f"'{details['label']}' is required because '{FORM_FIELDS_MAP[condition['field']]['label']}' is '{condition['value']}'.")
+    errors = SNF_PLAN.validate_record(st.session_state.form_data)
+    st.session_state.validation_errors = SNF_PLAN.messages(errors)
     return not st.session_state.validation_errors
 
-# --- Data Loading at the start of the app ---
-if os.path.exists(RESPONSES_CSV):
-    try:
-        st.session_state.all_responses = pd.read_csv(RESPONSES_CSV).to_dict('records')
-    except pd.errors.EmptyDataError:
-        st.session_state.all_responses = []
-    except Exception as e:
-        st.error(f"Error loading existing data: {e}")
-        st.session_state.all_responses = []
+def verify_image(path):
+    # Pillow is only needed when the photo archive picks up new photos.
+    from PIL import Image
+    Image.open(path).verify()
+
+def show_responses_page(store, key_prefix):
+    """
+    Renders one page of stored responses. Only the visible rows are read
+    from the store; the page number widget is the only per-session state.
+    """
+    total_rows = store.row_count()
+    page_count = max((total_rows - 1) // RESPONSES_PAGE_SIZE + 1, 1)
+    col_sort, col_order, col_page = st.columns([2, 1, 1])
+    with col_sort:
+        sort_by = st.selectbox("Sort by", ["(submission order)"] + store.manifest()["columns"], key=f"{key_prefix}_sort_by")
+    with col_order:
+        descending = st.checkbox("Descending", key=f"{key_prefix}_descending")
+    with col_page:
+        page = st.number_input("Page", min_value=1, max_value=page_count, key=f"{key_prefix}_page")
+    with span("read_page", dataset=store.name):
+        page_df = store.read_page(
+            (page - 1) * RESPONSES_PAGE_SIZE,
+            RESPONSES_PAGE_SIZE,
+            sort_by=None if sort_by == "(submission order)" else sort_by,
+            ascending=not descending
+        )
+    with span("dataframe_render", table=key_prefix):
+        st.dataframe(page_df, use_container_width=True)
+    st.caption(f"Page {page} of {page_count} ({total_rows} responses)")
+
+def show_filtered_responses(store):
+    """
+    Responses matching the chosen visit dates, surveyors, HPCs and farmer
+    code. The secondary indexes pick the matching rows; only the visible
+    page of them is read back from the store.
+    """
+    index = get_index(DATASET)
+    col_dates, col_farmer = st.columns([2, 1])
+    with col_dates:
+        dates = st.date_input("Date of visit", value=(), key="filter_dates")
+    with col_farmer:
+        farmer = st.text_input("Farmer code", key="filter_farmer").strip()
+    col_surveyors, col_hpcs = st.columns(2)
+    with col_surveyors:
+        surveyors = st.multiselect("Surveyor", index.keys("person"), key="filter_surveyors")
+    with col_hpcs:
+        hpcs = st.multiselect("HPC code", index.keys("hpc"), key="filter_hpcs")
+    with span("index_filter", dataset=store.name):
+        positions = index.filter(
+            start=dates[0] if dates else None,
+            end=dates[-1] if dates else None,
+            people=surveyors,
+            hpcs=hpcs,
+            farmer=farmer
+        )
+    if len(positions) == 0:
+        st.info("No responses match the selected filters.")
+        return
+    page_count = (len(positions) - 1) // RESPONSES_PAGE_SIZE + 1
+    page = st.number_input("Page", min_value=1, max_value=page_count, key="filter_page")
+    page_positions = positions[(page - 1) * RESPONSES_PAGE_SIZE:page * RESPONSES_PAGE_SIZE]
+    rows = store.take(page_positions)
+    rows.index = page_positions
+    st.dataframe(rows, use_container_width=True)
+    st.caption(f"Page {page} of {page_count} ({len(positions)} matching responses)")
+
+DISCREPANCY_CONTEXT_FIELDS = [
+    "surveyor_name", "date_of_visit", "hpc_code", "farmer_code", "farmer_name",
+    "fat_list", "as_on_date_fat", "snf_list", "as_on_date_snf", "vol_list", "as_on_date_vol"
+]
+
+def show_discrepancies(store):
+    """
+    Flag counts per rule and one page of flagged responses, most extreme
+    first. Only the rows on the visible page are read back from the store.
+    """
+    discrepancies = get_discrepancies()
+    summary = discrepancies.summary()
+    st.dataframe(
+        pd.DataFrame({
+            "Rule": RULE_NAMES,
+            "Description": [RULE_DESCRIPTIONS[name] for name in RULE_NAMES],
+            "Flagged Responses": [summary[name] for name in RULE_NAMES],
+        }),
+        use_container_width=True
+    )
+    col_rules, col_page = st.columns([3, 1])
+    with col_rules:
+        rules = st.multiselect("Show responses flagged by", RULE_NAMES, default=["snf_slip_vs_list", "fat_slip_vs_list"], key="discrepancy_rules")
+    positions = discrepancies.flagged(rules) if rules else []
+    if len(positions) == 0:
+        st.info("No responses flagged by the selected rules.")
+        return
+    page_count = (len(positions) - 1) // RESPONSES_PAGE_SIZE + 1
+    with col_page:
+        page = st.number_input("Page", min_value=1, max_value=page_count, key="discrepancy_page")
+    page_positions = positions[(page - 1) * RESPONSES_PAGE_SIZE:page * RESPONSES_PAGE_SIZE]
+    context_columns = [FORM_FIELDS_MAP[key]["label"] for key in DISCREPANCY_CONTEXT_FIELDS]
+    rows = store.take(page_positions).reindex(columns=context_columns)
+    rows.index = page_positions
+    st.dataframe(rows.join(discrepancies.details(page_positions)), use_container_width=True)
+    st.caption(f"Page {page} of {page_count} ({len(positions)} flagged responses)")
 
 # ----- SHOW PREVIOUS SUBMISSIONS TABLE always if available -----
-if st.session_state.all_responses:
-    st.subheader("All Previous Submissions")
-    df_responses = pd.DataFrame(st.session_state.all_responses)
-    st.dataframe(df_responses, use_container_width=True)
-else:
-    st.info("No previous survey responses to display yet.")
+snf_store = open_store(DATASET)
+try:
+    if snf_store.row_count():
+        st.subheader("All Previous Submissions")
+        show_responses_page(snf_store, "previous_submissions")
+    else:
+        st.info("No previous survey responses to display yet.")
+except Exception as e:
+    st.error(f"Error loading existing data: {e}")
 
 if st.session_state.just_submitted:
-    st.success("Submitted successfully!")
+    if st.session_state.submission_pending:
+        st.info(f"Your submission is still being saved and will be recorded shortly. "
+                f"Reference ID: {st.session_state.last_record_id}. Please do not submit it again.")
+    else:
+        st.success(f"Submitted successfully! Reference ID: {st.session_state.last_record_id}")
     st.session_state.just_submitted = False
 
 # ----- MAIN FORM -----
@@ -213,30 +249,32 @@ if st.session_state.show_review_page:
     with col2:
         if confirm and st.button("Confirm & Final Submit", key="final_submit_button"):
             photo_filename = ""
+            photo_digest = None
             if st.session_state.uploaded_photo_info:
                 timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
                 file_extension = os.path.splitext(st.session_state.uploaded_photo_info['name'])[1]
                 identifier = get_field_value("farmer_code") or \
                              get_field_value("farmer_name") or "unknown_farmer"
                 photo_filename = f"{identifier}_{timestamp}{file_extension}"
-                photo_path = os.path.join(PHOTOS_DIR, photo_filename)
                 try:
-                    with open(photo_path, "wb") as f:
-                        f.write(st.session_state.uploaded_photo_info["data"])
+                    photo_digest = get_blob_store().put(st.session_state.uploaded_photo_info["data"], photo_filename)
                     st.success(f"Photo uploaded and saved as {photo_filename}.")
                 except Exception as e:
                     st.error(f"Error saving photo: {e}")
             row_data = {details['label']: get_field_value(key) for key, details in FORM_FIELDS_MAP.items()}
             row_data["Photo Filename"] = photo_filename
             
-            df_new_row = pd.DataFrame([row_data])
-
-            # --- NEW LOGIC: Append the single new entry to the CSV ---
-            if not os.path.exists(RESPONSES_CSV):
-                df_new_row.to_csv(RESPONSES_CSV, index=False)
-            else:
-                df_new_row.to_csv(RESPONSES_CSV, mode='a', index=False, header=False)
-
+            # --- Durably append the new entry through the shared submission writer ---
+            try:
+                st.session_state.last_record_id = submit(DATASET, row_data)
+                st.session_state.submission_pending = False
+            except SubmissionPending as e:
+                # Queued and certain to be committed under this ID; the form is cleared so it is not sent twice.
+                st.session_state.last_record_id = e.record_ids[0]
+                st.session_state.submission_pending = True
+            if photo_digest is not None:
+                get_blob_store().link(photo_digest, PHOTO_COLLECTION, photo_filename,
+                                      submission_id=st.session_state.last_record_id)
             st.session_state.just_submitted = True
             st.session_state.show_review_page = False
             st.session_state.form_data = {} # Clear form data for a new entry
@@ -257,66 +295,82 @@ else:
     with st.expander("Admin Access (Features)", expanded=True):
         st.success("Admin access granted.")
         st.subheader("Download Options")
-        st.write(f"Looking for responses.csv at: {os.path.abspath(RESPONSES_CSV)}")
-        st.write(f"File exists: {os.path.exists(RESPONSES_CSV)}")
-        if os.path.exists(RESPONSES_CSV):
-            with open(RESPONSES_CSV, "rb") as f:
+        st.write(f"Survey responses are stored at: {os.path.abspath(snf_store.path)}")
+        st.write(f"Stored responses: {snf_store.row_count()}")
+        if snf_store.row_count():
+            # Built when requested and cached per data version.
+            csv_path = cached_csv_export(snf_store)
+            if csv_path is None and st.button("Prepare CSV Download", key="prepare_csv_button"):
+                with st.spinner("Preparing CSV file..."):
+                    csv_path = csv_export(snf_store)
+            if csv_path:
                 st.download_button(
                     label="Download All Survey Responses (CSV)",
-                    data=f,
+                    data=deferred_export(csv_export, snf_store),
                     file_name="responses.csv",
                     mime="text/csv",
                     key="download_csv_button"
                 )
         else:
             st.info("No survey responses recorded yet.")
-        photo_files_in_dir = [f for f in os.listdir(PHOTOS_DIR) if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
-        if photo_files_in_dir:
-            zip_buffer = BytesIO()
-            with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zf:
-                for photo_file in photo_files_in_dir:
-                    file_path = os.path.join(PHOTOS_DIR, photo_file)
-                    try:
-                        Image.open(file_path).verify()
-                        zf.write(file_path, os.path.basename(file_path))
-                    except Exception as e:
-                        st.warning(f"Skipping corrupted image {photo_file} in ZIP: {e}")
-            zip_buffer.seek(0)
-            st.download_button(
-                label="Download All Photos (ZIP)",
-                data=zip_buffer.getvalue(),
-                file_name="photos.zip",
-                mime="application/zip",
-                key="download_photos_button"
-            )
+        photos = [photo for photo in get_blob_store().photos(PHOTO_COLLECTION)
+                  if photo["name"].lower().endswith(PHOTO_EXTENSIONS)]
+        if photos:
+            # Photos are verified once, when they are first added to the archive.
+            photo_archive = get_archive("snf_photos", PHOTO_COLLECTION, PHOTO_EXTENSIONS,
+                                        verify=verify_image)
+            archive_path = photo_archive.refresh()
+            for photo_file, error in photo_archive.skipped().items():
+                st.warning(f"Skipping corrupted image {photo_file} in ZIP: {error}")
+            if archive_path:
+                st.download_button(
+                    label="Download All Photos (ZIP)",
+                    data=photo_archive.read,
+                    file_name="photos.zip",
+                    mime="application/zip",
+                    key="download_photos_button"
+                )
         else:
             st.info("No photos uploaded yet.")
         st.subheader("View Real-time Data")
-        if os.path.exists(RESPONSES_CSV):
+        if snf_store.row_count():
             st.write("#### Survey Responses Table")
             try:
-                df_responses = pd.read_csv(RESPONSES_CSV)
-                if not df_responses.empty:
-                    st.dataframe(df_responses, use_container_width=True)
-                else:
-                    st.info("The CSV file exists but contains no data.")
-            except pd.errors.EmptyDataError:
-                st.info("The CSV file exists but is empty.")
+                show_responses_page(snf_store, "admin_responses")
             except Exception as e:
-                st.error(f"Error reading responses CSV: {e}")
+                st.error(f"Error reading survey responses: {e}")
         else:
             st.info("No survey responses to display.")
+        if snf_store.row_count():
+            st.write("#### Find Responses")
+            try:
+                show_filtered_responses(snf_store)
+            except Exception as e:
+                st.error(f"Error filtering survey responses: {e}")
+        if snf_store.row_count():
+            st.write("#### Discrepancies (List vs Farmer Slip)")
+            try:
+                show_discrepancies(snf_store)
+            except Exception as e:
+                st.error(f"Error computing discrepancies: {e}")
         st.write("#### Uploaded Photos")
-        if photo_files_in_dir:
+        if photos:
+            viewing = next((photo for photo in photos if photo["digest"] == st.session_state.viewing_photo), None)
+            if viewing is not None:
+                st.image(viewing["path"], caption=viewing["name"], use_column_width="always")
+                if st.button("Close original", key="close_original_photo"):
+                    st.session_state.viewing_photo = None
+                    st.rerun()
             num_cols = 3
             cols = st.columns(num_cols)
-            for i, photo_file in enumerate(photo_files_in_dir):
+            for i, photo in enumerate(photos):
                 with cols[i % num_cols]:
-                    file_path = os.path.join(PHOTOS_DIR, photo_file)
                     try:
-                        Image.open(file_path).verify()
-                        st.image(file_path, caption=photo_file, use_column_width="always")
+                        st.image(get_thumbnail(photo["path"], "small", digest=photo["digest"]), caption=photo["name"])
+                        if st.button("View original", key=f"view_original_{photo['digest']}"):
+                            st.session_state.viewing_photo = photo["digest"]
+                            st.rerun()
                     except Exception as e:
-                        st.warning(f"⚠️ Unable to display image: {photo_file}. Error: {str(e)}")
+                        st.warning(f"⚠️ Unable to display image: {photo['name']}. Error: {str(e)}")
         else:
             st.info("No photos to display.")
@@ -1,9 +1,15 @@
 import streamlit as st
-import pandas as pd
 import os
 from datetime import datetime
-import zipfile
-from io import BytesIO
+from heritage.forms import TRAINERS, TRAINING_COLUMNS, TRAINING_PLAN, TRAINING_TOPICS
+from heritage.storage import open_store
+from heritage.writer import SubmissionPending, submit
+from heritage.archive import get_archive
+from heritage.blobs import get_blob_store
+from heritage.exports import cached_csv_export, csv_export, deferred_export
+from heritage.indexes import get_index
+from heritage.metrics import span
+from heritage.thumbnails import get_thumbnail
 
 st.set_page_config(page_title="Training Tracker", layout="wide")
 
@@ -16,9 +22,9 @@ ADMIN_EMAILS = [
     "kbalaji@tns.org"
 ]
 
-DATA_FILE = "submissions.csv"
-PHOTO_DIR = "photos"
-os.makedirs(PHOTO_DIR, exist_ok=True)
+DATASET = "training"
+PHOTO_COLLECTION = "training"
+PHOTO_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tiff')
 
 # Session state variables to manage form flow and data
 if 'show_review' not in st.session_state:
@@ -27,37 +33,20 @@ if 'form_data' not in st.session_state:
     st.session_state.form_data = {}
 if 'uploaded_photo' not in st.session_state:
     st.session_state.uploaded_photo = None
+if 'viewing_photo' not in st.session_state:
+    st.session_state.viewing_photo = None
 if 'user_email' not in st.session_state:
     st.session_state.user_email = ""
-# New session state variable to store all data
-if 'all_submissions_df' not in st.session_state:
-    st.session_state.all_submissions_df = pd.DataFrame()
 
-# Load data from CSV at the start of the app
-def load_all_data():
-    if os.path.exists(DATA_FILE):
-        try:
-            return pd.read_csv(DATA_FILE)
-        except pd.errors.EmptyDataError:
-            return pd.DataFrame()
-    return pd.DataFrame()
-
-st.session_state.all_submissions_df = load_all_data()
+SUBMISSIONS_PAGE_SIZE = 50
 
 def save_submission(data, photo_file):
-    all_columns = [
-        "timestamp", "date", "hpc_code", "hpc_name", "trainer", "topic",
-        "volume", "avg_fat", "avg_snf", "pourers_total", "pourers_attended",
-        "heritage_users", "non_heritage_users", "awareness_feed",
-        "awareness_supplements", "awareness_vet", "awareness_ai",
-        "awareness_loans", "awareness_insurance", "awareness_gpa",
-        "key_insights", "email", "photo_filename"
-    ]
-
-    row_data = {col: None for col in all_columns}
+
+    row_data = {col: None for col in TRAINING_COLUMNS}
     row_data.update(data)
     row_data["timestamp"] = datetime.now().isoformat()
 
+    photo_digest = None
     if photo_file is not None:
         timestamp_str = datetime.now().strftime("%Y%m%d_%H%M%S")
         identifier = data.get('hpc_code', '').replace(' ', '_') or \
@@ -65,29 +54,53 @@ def save_submission(data, photo_file):
                      f"submission_{timestamp_str}"
         file_extension = os.path.splitext(photo_file.name)[1]
         photo_filename = f"{identifier}_{timestamp_str}{file_extension}"
-        photo_path = os.path.join(PHOTO_DIR, photo_filename)
-        with open(photo_path, "wb") as f:
-            f.write(photo_file.getbuffer())
+        photo_digest = get_blob_store().put(photo_file.getvalue(), photo_filename)
         row_data["photo_filename"] = photo_filename
 
-    df_new_entry = pd.DataFrame([row_data])
-
-    # Append to CSV without overwriting
-    file_exists = os.path.exists(DATA_FILE)
-    df_new_entry.to_csv(DATA_FILE, mode='a', header=not file_exists, index=False)
-
-    # Update session state DataFrame for real-time display
-    if not st.session_state.all_submissions_df.empty:
-        st.session_state.all_submissions_df = pd.concat([st.session_state.all_submissions_df, df_new_entry], ignore_index=True)
-    else:
-        st.session_state.all_submissions_df = df_new_entry
-
-def get_all_photos_paths():
-    if os.path.exists(PHOTO_DIR):
-        image_files = [f for f in os.listdir(PHOTO_DIR) if f.lower().endswith((
-            '.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tiff'))]
-        return [os.path.join(PHOTO_DIR, f) for f in image_files]
-    return []
+    # Durably append to the submission log; concurrent submits are group-committed
+    try:
+        record_id, saved = submit(DATASET, row_data), True
+    except SubmissionPending as e:
+        # Queued and certain to be committed under this ID.
+        record_id, saved = e.record_ids[0], False
+    if photo_digest is not None:
+        get_blob_store().link(photo_digest, PHOTO_COLLECTION, row_data["photo_filename"], submission_id=record_id)
+    return record_id, saved
+
+def show_filtered_submissions(store):
+    """
+    Submissions matching the chosen dates, trainers and HPCs. The secondary
+    indexes pick the matching rows; only the visible page is read from the store.
+    """
+    index = get_index(DATASET)
+    col_dates, col_trainers, col_hpcs = st.columns(3)
+    with col_dates:
+        dates = st.date_input("Training date", value=(), key="filter_dates")
+    with col_trainers:
+        trainers = st.multiselect("Trainer", index.keys("person"), key="filter_trainers")
+    with col_hpcs:
+        hpcs = st.multiselect("HPC code", index.keys("hpc"), key="filter_hpcs")
+    with span("index_filter", dataset=store.name):
+        positions = index.filter(
+            start=dates[0] if dates else None,
+            end=dates[-1] if dates else None,
+            people=trainers,
+            hpcs=hpcs
+        )
+    if len(positions) == 0:
+        st.info("No training submissions match the selected filters.")
+        return
+    page_count = (len(positions) - 1) // SUBMISSIONS_PAGE_SIZE + 1
+    page = st.number_input("Page", min_value=1, max_value=page_count, key="filter_page")
+    page_positions = positions[(page - 1) * SUBMISSIONS_PAGE_SIZE:page * SUBMISSIONS_PAGE_SIZE]
+    rows = store.take(page_positions)
+    rows.index = page_positions
+    with span("dataframe_render", table="training_submissions"):
+        st.dataframe(rows, use_container_width=True)
+    st.caption(f"Page {page} of {page_count} ({len(positions)} matching submissions)")
+
+def get_all_photos():
+    return [photo for photo in get_blob_store().photos(PHOTO_COLLECTION) if photo["name"].lower().endswith(PHOTO_EXTENSIONS)]
 
 st.title("Training Tracker")
 
@@ -105,12 +118,8 @@ with tabs[0]:
         date = st.date_input("Date", key="date_input")
         hpc_code = st.text_input("HPC Code", key="hpc_code_input")
         hpc_name = st.text_input("HPC Name", key="hpc_name_input")
-        trainer = st.selectbox("Training conducted by", ["Guru", "Balaji"], key="trainer_select")
-        available_topics = [
-            "Balanced Nutrition", "Fodder Enrichment", "EVM for Mastitis",
-            "Diarrhea", "Repeat breeding"
-        ]
-        topics = st.multiselect("Training Topic (Select all that apply)", available_topics, key="topics_select")
+        trainer = st.selectbox("Training conducted by", TRAINERS, key="trainer_select")
+        topics = st.multiselect("Training Topic (Select all that apply)", TRAINING_TOPICS, key="topics_select")
         volume = st.text_input("Volume (LPD)", key="volume_input")
         avg_fat = st.text_input("Average Fat (%)", key="avg_fat_input")
         avg_snf = st.text_input("Average SNF (%)", key="avg_snf_input")
@@ -155,7 +164,10 @@ with tabs[0]:
             "email": st.session_state.user_email
         }
         st.session_state.uploaded_photo = photo_file
-        st.session_state.show_review = True
+        validation_errors = TRAINING_PLAN.messages(TRAINING_PLAN.validate_record(st.session_state.form_data))
+        for error in validation_errors:
+            st.error(error)
+        st.session_state.show_review = not validation_errors
 
     if st.session_state.show_review:
         st.subheader("Review Your Entry")
@@ -166,9 +178,14 @@ with tabs[0]:
             st.image(st.session_state.uploaded_photo, caption="Uploaded Photo", use_column_width=True)
         confirm_checkbox = st.checkbox("I confirm that the above information is correct.", key="confirm_checkbox_final")
         if confirm_checkbox and st.button("Confirm & Submit Entry Now", key="final_submit_entry_button"):
-            save_submission(st.session_state.form_data, st.session_state.uploaded_photo)
-            st.success("Your training submission has been saved successfully!")
-            st.balloons()
+            record_id, saved = save_submission(st.session_state.form_data, st.session_state.uploaded_photo)
+            if saved:
+                st.success(f"Your training submission has been saved successfully! Reference ID: {record_id}")
+                st.balloons()
+            else:
+                # Cleared like a saved entry below, so it is not submitted twice.
+                st.info(f"Your training submission is still being saved and will be recorded shortly. "
+                        f"Reference ID: {record_id}. Please do not submit it again.")
             st.session_state.show_review = False
             st.session_state.form_data = {}
             st.session_state.uploaded_photo = None
@@ -179,27 +196,43 @@ with tabs[1]:
     if is_admin:
         st.success("Admin Access Granted")
         st.subheader("Submitted Training Data")
-        if not st.session_state.all_submissions_df.empty:
-            st.dataframe(st.session_state.all_submissions_df, use_container_width=True)
-            csv_data = st.session_state.all_submissions_df.to_csv(index=False).encode('utf-8')
-            st.download_button("Download All Data (CSV)", csv_data, "training_submissions.csv", "text/csv")
+        store = open_store(DATASET)
+        if store.row_count():
+            show_filtered_submissions(store)
+            csv_path = cached_csv_export(store)
+            if csv_path is None and st.button("Prepare CSV Download", key="prepare_training_csv"):
+                with st.spinner("Preparing CSV file..."):
+                    csv_path = csv_export(store)
+            if csv_path:
+                st.download_button("Download All Data (CSV)", deferred_export(csv_export, store), "training_submissions.csv", "text/csv")
         else:
             st.info("No training submissions recorded yet.")
 
         st.subheader("Uploaded Photos")
-        photo_paths = get_all_photos_paths()
-        if photo_paths:
-            zip_buffer = BytesIO()
-            with zipfile.ZipFile(zip_buffer, "w") as zf:
-                for photo_path in photo_paths:
-                    zf.write(photo_path, os.path.basename(photo_path))
-            st.download_button("Download All Photos (ZIP)", zip_buffer.getvalue(), "training_photos.zip", "application/zip")
+        photos = get_all_photos()
+        if photos:
+            photo_archive = get_archive("training_photos", PHOTO_COLLECTION, PHOTO_EXTENSIONS)
+            if photo_archive.refresh():
+                st.download_button("Download All Photos (ZIP)", photo_archive.read, "training_photos.zip", "application/zip")
             st.write("#### Individual Photos:")
+            viewing = next((photo for photo in photos if photo["digest"] == st.session_state.viewing_photo), None)
+            if viewing is not None:
+                st.image(viewing["path"], caption=viewing["name"], use_column_width="always")
+                if st.button("Close original", key="close_original_photo"):
+                    st.session_state.viewing_photo = None
+                    st.rerun()
             num_cols = 4
             cols = st.columns(num_cols)
-            for i, photo_path in enumerate(photo_paths):
+            for i, photo in enumerate(photos):
                 with cols[i % num_cols]:
-                    st.image(photo_path, caption=os.path.basename(photo_path), use_column_width="always")
+                    try:
+                        st.image(get_thumbnail(photo["path"], "small", digest=photo["digest"]), caption=photo["name"])
+                    except Exception as e:
+                        st.warning(f"Unable to display image {photo['name']}: {e}")
+                        continue
+                    if st.button("View original", key=f"view_original_{i}"):
+                        st.session_state.viewing_photo = photo["digest"]
+                        st.rerun()
         else:
             st.info("No photos uploaded yet.")
     else:
@@ -0,0 +1,15 @@
+import pytest
+
+from heritage import discrepancies, hierarchy, indexes, rollups, timeseries
+
+
+@pytest.fixture
+def store_dir(tmp_path, monkeypatch):
+    """Run in an empty directory, so open_store() creates fresh stores, with no derived state cached."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(rollups, "_cache", {})
+    monkeypatch.setattr(indexes, "_indexes", {})
+    monkeypatch.setattr(hierarchy, "_hierarchies", {})
+    monkeypatch.setattr(timeseries, "_series", {})
+    monkeypatch.setattr(discrepancies, "_index", None)
+    return tmp_path
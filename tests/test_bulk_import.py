@@ -0,0 +1,43 @@
+import time
+
+import pandas as pd
+
+from heritage.bulk_import import commit_import, prepare_import
+from heritage.forms import TRAINERS, TRAINING_TOPICS
+from heritage.hierarchy import get_hierarchy
+from heritage.indexes import get_index
+from heritage.rollups import get_rollups
+from heritage.storage import open_store
+from heritage.timeseries import get_activity_series
+from heritage.writer import SUBMIT_TIMEOUT, submit, submit_many
+
+
+def _upload(rows):
+    return pd.DataFrame({
+        "Date": [f"2025-01-{i % 28 + 1:02d}" for i in range(rows)],
+        "HPC Code": [f"H{i % 40}" for i in range(rows)],
+        "Training conducted by": [TRAINERS[i % len(TRAINERS)] for i in range(rows)],
+        "Training Topic": [TRAINING_TOPICS[i % len(TRAINING_TOPICS)] for i in range(rows)],
+        "Pourers at HPC (Total)": ["12"] * rows,
+    })
+
+
+def test_submit_stays_fast_after_a_large_import(store_dir):
+    submit_many("training", [{"date": "2025-01-01", "trainer": TRAINERS[0], "hpc_code": "H0"}] * 5000)
+    # Everything the writer keeps up to date on commit is loaded, as on a running server.
+    get_rollups("training")
+    get_index("training")
+    get_hierarchy("training")
+    get_activity_series("training")
+
+    prepared = prepare_import("Training Tracker", _upload(20_000))
+    assert len(prepared["accepted"]) == 20_000
+    commit_import("Training Tracker", prepared["accepted"])
+
+    start = time.perf_counter()
+    submit("training", {"date": "2025-02-01", "trainer": TRAINERS[0], "hpc_code": "H1"})
+    assert time.perf_counter() - start < SUBMIT_TIMEOUT / 10
+
+    assert open_store("training").row_count() == 25_001
+    assert get_rollups("training")["rows"] == 25_001
+    assert get_index("training").rows == 25_001
@@ -0,0 +1,87 @@
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from heritage.forms import DATASET_PLANS
+from heritage.storage import SegmentStore
+
+
+def _records(count):
+    return [
+        {"record_id": uuid.uuid4().hex, "date": "2025-01-01", "trainer": f"T{i % 5}",
+         "hpc_code": "H", "pourers_total": i}
+        for i in range(count)
+    ]
+
+
+def test_take_matches_read(tmp_path):
+    store = SegmentStore("training", root=str(tmp_path), schema=DATASET_PLANS["training"])
+    records = _records(25_300)
+    # One segment of several row groups, plus rows still in the write-ahead buffer.
+    store.append(records[:25_000])
+    store.append(records[25_000:])
+    df = store.read()
+    positions = np.random.default_rng(0).integers(0, len(df), 3000)
+    positions = np.concatenate([positions, [5, 5, len(df) - 1, 0]])
+
+    pd.testing.assert_frame_equal(store.take(positions), df.iloc[positions].reset_index(drop=True))
+    pd.testing.assert_frame_equal(store.take(np.arange(20_000)), df.iloc[:20_000].reset_index(drop=True))
+    assert store.take([len(df) + 3, 1])["record_id"].tolist() == [df["record_id"].iloc[1]]
+
+
+def test_read_range_matches_read(tmp_path):
+    store = SegmentStore("training", root=str(tmp_path), schema=DATASET_PLANS["training"])
+    records = _records(25_300)
+    store.append(records[:25_000])
+    store.append(records[25_000:])
+    df = store.read()
+
+    for start, stop in [(0, None), (9_999, 10_001), (24_990, 25_010), (25_100, None)]:
+        expected = df.iloc[start:stop].reset_index(drop=True)
+        # Rows only in the buffer keep its string dtype, which read() widens when concatenating.
+        pd.testing.assert_frame_equal(store.read_range(start, stop), expected, check_dtype=False)
+    assert store.read_range(len(df)).empty
+
+
+class _Crash(Exception):
+    pass
+
+
+def _crash(*args, **kwargs):
+    raise _Crash
+
+
+def test_flush_interrupted_after_manifest_keeps_rows_once(tmp_path, monkeypatch):
+    store = SegmentStore("training", root=str(tmp_path), schema=DATASET_PLANS["training"])
+    store.append(_records(10))
+    monkeypatch.setattr("os.remove", _crash)
+    try:
+        store.flush()
+    except _Crash:
+        pass
+    monkeypatch.undo()
+
+    reopened = SegmentStore("training", root=str(tmp_path), schema=DATASET_PLANS["training"])
+    assert reopened.row_count() == 10
+    assert reopened.read()["record_id"].is_unique
+    reopened.append(_records(5))
+    reopened.flush()
+    assert reopened.row_count() == 15
+
+
+def test_flush_interrupted_before_manifest_keeps_rows_once(tmp_path, monkeypatch):
+    store = SegmentStore("training", root=str(tmp_path), schema=DATASET_PLANS["training"])
+    store.append(_records(10))
+    monkeypatch.setattr(SegmentStore, "_save_manifest", _crash)
+    try:
+        store.flush()
+    except _Crash:
+        pass
+    monkeypatch.undo()
+
+    reopened = SegmentStore("training", root=str(tmp_path), schema=DATASET_PLANS["training"])
+    assert reopened.row_count() == 10
+    reopened.flush()
+    assert reopened.row_count() == 10
+    assert len(reopened.manifest()["segments"]) == 1
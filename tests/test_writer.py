@@ -0,0 +1,22 @@
+import pytest
+
+from heritage import writer
+from heritage.storage import open_store
+
+
+def test_failing_batch_does_not_stop_the_writer(store_dir, monkeypatch):
+    real_open_store = writer.open_store
+
+    def open_store_or_fail(dataset):
+        if dataset == "broken":
+            raise OSError("corrupt manifest")
+        return real_open_store(dataset)
+
+    monkeypatch.setattr(writer, "open_store", open_store_or_fail)
+    submission_writer = writer.SubmissionWriter()
+
+    with pytest.raises(OSError, match="corrupt manifest"):
+        submission_writer.submit("broken", {"trainer": "T1"}, timeout=5)
+    record_ids = submission_writer.submit_many("training", [{"trainer": "T1"}, {"trainer": "T2"}], timeout=5)
+
+    assert open_store("training").read()["record_id"].tolist() == record_ids